@@ -3,10 +3,16 @@
 API لجلب أوقات الإشعارات القادمة للعداد الزمني
 """
 
+import hashlib
 import json
 import os
-from datetime import datetime, date, timedelta
-from typing import Dict, List, Optional
+import threading
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from itertools import islice, takewhile
+import time as time_module
+from datetime import datetime, date, time, timedelta, timezone
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
 from flask import Flask, jsonify, request
 from flask_cors import CORS
 
@@ -15,482 +21,603 @@ import sys
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from logic import FarmLogic
+from notifications import NotificationCache, build_notification, file_digest
 from weather import WeatherFetcher
 
 app = Flask(__name__)
 CORS(app)  # للسماح بطلبات من صفحات HTML
 
-class NotificationScheduler:
-    def __init__(self):
-        self.logic = FarmLogic()
-
-    def get_next_notifications(self, days_ahead: int = 30) -> List[Dict]:
-        """جلب الإشعارات القادمة خلال فترة محددة"""
-        notifications = []
-        today = date.today()
-
-        for i in range(days_ahead):
-            check_date = today + timedelta(days=i)
-            day_notifications = self._get_notifications_for_date(check_date)
-            notifications.extend(day_notifications)
-
-        # ترتيب حسب التاريخ والوقت
-        notifications.sort(key=lambda x: x['datetime'])
-        return notifications
-
-    def _get_notifications_for_date(self, check_date: date) -> List[Dict]:
-        """جلب إشعارات يوم محدد"""
-        notifications = []
-
-        # فحص دواء الديدان
-        if self._should_deworm_on_date(check_date):
-            drug = self._get_deworm_drug_for_date(check_date)
-            notifications.append({
-                'type': 'deworming',
-                'title_ar': f'دواء الديدان - {drug}',
-                'title_bn': f'কৃমির ঔষধ - {drug}',
-                'date': check_date.isoformat(),
-                'time': '08:00',  # وقت افتراضي
-                'datetime': datetime.combine(check_date, datetime.strptime('08:00', '%H:%M').time()),
-                'priority': 'high',
-                'icon': '🪱'
-            })
-
-        # فحص تطهير الحظيرة
-        if self._should_sanitize_on_date(check_date):
-            notifications.append({
-                'type': 'sanitization',
-                'title_ar': 'تطهير الحظيرة',
-                'title_bn': 'খামার জীবাণুমুক্তকরণ',
-                'date': check_date.isoformat(),
-                'time': '09:00',
-                'datetime': datetime.combine(check_date, datetime.strptime('09:00', '%H:%M').time()),
-                'priority': 'medium',
-                'icon': '🧹'
-            })
-
-        # فحص تنظيف محطة الماء
-        if self._should_clean_water_station_on_date(check_date):
-            notifications.append({
-                'type': 'water_station',
-                'title_ar': 'تنظيف محطة الماء',
-                'title_bn': 'পানি স্টেশন পরিষ্কার',
-                'date': check_date.isoformat(),
-                'time': '10:00',
-                'datetime': datetime.combine(check_date, datetime.strptime('10:00', '%H:%M').time()),
-                'priority': 'medium',
-                'icon': '💧'
-            })
-
-        # فحص التنظيف الأسبوعي
-        if self._should_clean_weekly_on_date(check_date):
-            notifications.append({
-                'type': 'weekly_cleaning',
-                'title_ar': 'التنظيف الأسبوعي',
-                'title_bn': 'সাপ্তাহিক পরিষ্কার',
-                'date': check_date.isoformat(),
-                'time': '11:00',
-                'datetime': datetime.combine(check_date, datetime.strptime('11:00', '%H:%M').time()),
-                'priority': 'medium',
-                'icon': '🧽'
-            })
-
-        # فحص تقليب التراب
-        if self._should_turn_soil_on_date(check_date):
-            notifications.append({
-                'type': 'soil_turning',
-                'title_ar': 'تقليب التراب',
-                'title_bn': 'মাটি নাড়াচাড়া',
-                'date': check_date.isoformat(),
-                'time': '12:00',
-                'datetime': datetime.combine(check_date, datetime.strptime('12:00', '%H:%M').time()),
-                'priority': 'low',
-                'icon': '🌱'
-            })
-
-        # فحص التهوية
-        if self._should_check_ventilation_on_date(check_date):
-            notifications.append({
-                'type': 'ventilation',
-                'title_ar': 'فحص التهوية',
-                'title_bn': 'বায়ুচলাচল পরীক্ষা',
-                'date': check_date.isoformat(),
-                'time': '13:00',
-                'datetime': datetime.combine(check_date, datetime.strptime('13:00', '%H:%M').time()),
-                'priority': 'medium',
-                'icon': '💨'
-            })
-
-        # فحص غسيل المعالف
-        if self._should_clean_feeders_on_date(check_date):
-            notifications.append({
-                'type': 'feeder_cleaning',
-                'title_ar': 'غسيل المعالف',
-                'title_bn': 'খাবার পাত্র পরিষ্কার',
-                'date': check_date.isoformat(),
-                'time': '14:00',
-                'datetime': datetime.combine(check_date, datetime.strptime('14:00', '%H:%M').time()),
-                'priority': 'medium',
-                'icon': '🪣'
-            })
-
-        # فحص السقاية الأنبوبية
-        pipe_tasks = self._get_pipe_waterer_tasks_for_date(check_date)
-        for task in pipe_tasks:
-            notifications.append({
-                'type': f'pipe_waterer_{task}',
-                'title_ar': f'السقاية الأنبوبية - {self._get_pipe_task_name_ar(task)}',
-                'title_bn': f'পাইপ ওয়াটারার - {self._get_pipe_task_name_bn(task)}',
-                'date': check_date.isoformat(),
-                'time': '15:00',
-                'datetime': datetime.combine(check_date, datetime.strptime('15:00', '%H:%M').time()),
-                'priority': 'medium',
-                'icon': '🚰'
-            })
-
-        # فحص تسميد الأشجار
-        fertilizer_tasks = self._get_fertilizer_tasks_for_date(check_date)
-        for task in fertilizer_tasks:
-            notifications.append({
-                'type': 'fertilizer',
-                'title_ar': f'تسميد {task["tree_name_ar"]}',
-                'title_bn': f'{task["tree_name_bn"]} সার প্রয়োগ',
-                'date': check_date.isoformat(),
-                'time': '16:00',
-                'datetime': datetime.combine(check_date, datetime.strptime('16:00', '%H:%M').time()),
-                'priority': 'medium',
-                'icon': '🌳',
-                'tree': task['tree_key'],
-                'fertilizer': task['fertilizer']
-            })
-
-        return notifications
-
-    def _should_deworm_on_date(self, check_date: date) -> bool:
-        """فحص دواء الديدان لتاريخ محدد"""
-        try:
-            check_date_str = check_date.strftime("%m-%d")
-            deworming_config = self.logic.config['chicken_schedule']['deworming']
-            seasonal_schedule = deworming_config.get('seasonal_schedule', [])
-
-            for schedule_item in seasonal_schedule:
-                if schedule_item['date'] == check_date_str:
-                    return True
-            return False
-        except:
-            return False
-
-    def _get_deworm_drug_for_date(self, check_date: date) -> str:
-        """جلب دواء الديدان لتاريخ محدد"""
-        try:
-            check_date_str = check_date.strftime("%m-%d")
-            deworming_config = self.logic.config['chicken_schedule']['deworming']
-            seasonal_schedule = deworming_config.get('seasonal_schedule', [])
-
-            for schedule_item in seasonal_schedule:
-                if schedule_item['date'] == check_date_str:
-                    return schedule_item['drug']
-            return "Fenbendazole"
-        except:
-            return "Fenbendazole"
-
-    def _should_sanitize_on_date(self, check_date: date) -> bool:
-        """فحص تطهير الحظيرة لتاريخ محدد"""
-        try:
-            start_date_str = self.logic.config['chicken_schedule']['sanitization']['start_date']
-            start_date = datetime.strptime(start_date_str, "%Y-%m-%d").date()
-            interval = self.logic.config['chicken_schedule']['sanitization']['interval_days']
+# الفاصل بين فحوص config.json بالثواني
+CONFIG_POLL_SECONDS = 2.0
+
+# عدد أيام الخط الزمني المحسوب مسبقاً (يُعاد بناؤه عند منتصف الليل أو تغير الإعدادات)
+TIMELINE_DAYS = 400
+
+# أقصى مدة تخزين للردود في المتصفح (إعادة تحميل الإعدادات قد تغير الإشعارات)
+CACHE_MAX_AGE = 60
+
+# صيغ رد /api/notifications/next: رد واحد، أو بث سطر JSON لكل إشعار، أو بث مصفوفة JSON
+RESPONSE_FORMATS = ('json', 'ndjson', 'json-stream')
+
+# حقول الإشعار المفهرسة في الخط الزمني (فلاتر /api/notifications)
+INDEXED_FIELDS = ('type', 'tree', 'priority')
+
+# أطول فترة يقبلها /api/notifications (بالأيام) - ما بعد الخط الزمني يُحسب من الجدول
+MAX_QUERY_DAYS = 3660
+
+def parse_cursor(cursor: str) -> Tuple[datetime, int]:
+    """cursor = "<ثواني Unix لآخر إشعار مُرسل>.<عدد الإشعارات المُرسلة في نفس الوقت>" """
+    epoch, _, sent = cursor.partition('.')
+    return datetime.fromtimestamp(int(epoch)), int(sent or 0)
+
+def make_cursor(last: datetime, sent: int) -> str:
+    return f"{int(last.timestamp())}.{sent}"
+
+def matches_filters(notification: Dict, filters: Dict[str, str]) -> bool:
+    return all(notification.get(field) == value for field, value in filters.items())
+
+class NotificationPage:
+    """صفحة من تدفق إشعارات بحد أقصى limit - next_cursor يُعرف بعد استهلاك الصفحة"""
+
+    def __init__(self, stream: Iterator[Dict], limit: Optional[int] = None,
+                 position: Optional[Tuple[datetime, int]] = None):
+        self.stream = stream
+        self.limit = limit
+        self.position = position
+        self.count = 0
+        self.next_cursor: Optional[str] = None
+
+    def __iter__(self) -> Iterator[Dict]:
+        last, sent = self.position or (None, 0)
+        for notification in self.stream:
+            if self.limit is not None and self.count >= self.limit:
+                # يوجد إشعار بعد الصفحة: المؤشر يبدأ بعد آخر إشعار مُرسل
+                if last is not None:
+                    self.next_cursor = make_cursor(last, sent)
+                return
+            when = notification['datetime']
+            sent = sent + 1 if when == last else 1
+            last = when
+            self.count += 1
+            yield notification
+
+class Timeline(NamedTuple):
+    """إشعارات TIMELINE_DAYS يوماً مرتبة زمنياً - كل طلب يُخدم كشريحة منها"""
+    first_day: date
+    days: int
+    notifications: Tuple[Dict, ...]
+    epochs: Tuple[float, ...]       # وقت كل إشعار بثواني Unix مرتبة (للبحث الثنائي)
+    day_starts: Tuple[int, ...]     # فهرس أول إشعار في كل يوم (days + 1 عنصراً)
+    version: str                    # بصمة الإعدادات + أول يوم (أساس ETag)
+    built_at: datetime
+    index: Dict[Tuple[str, str], Tuple[Tuple[float, ...], Tuple[int, ...]]]  # (حقل، قيمة) -> (أوقات، مواقع) مرتبة
+
+    @property
+    def end(self) -> datetime:
+        return datetime.combine(self.first_day + timedelta(days=self.days), time.min)
+
+    def covers(self, first_day: date, days: int) -> bool:
+        return days >= 0 and self.first_day <= first_day and (first_day - self.first_day).days + days <= self.days
+
+    def days_slice(self, first_day: date, days: int) -> List[Dict]:
+        offset = (first_day - self.first_day).days
+        return list(self.notifications[self.day_starts[offset]:self.day_starts[offset + days]])
+
+    def next_after(self, now: datetime, until: datetime) -> Optional[Dict]:
+        """أول إشعار بعد now وقبل until - بحث ثنائي O(log n) في مصفوفة الأوقات"""
+        index = bisect_right(self.epochs, now.timestamp())
+        if index < len(self.epochs) and self.epochs[index] < until.timestamp():
+            return self.notifications[index]
+        return None
+
+    def query(self, start: datetime, end: datetime, filters: Dict[str, str],
+              limit: Optional[int] = None) -> List[Dict]:
+        """إشعارات [start, end) المطابقة لكل الفلاتر - بحث ثنائي في أضيق فهرس ثم فحص الباقي: O(log n + k)"""
+        ranges = []
+        for field, value in filters.items():
+            epochs, positions = self.index.get((field, value), ((), ()))
+            ranges.append(positions[bisect_left(epochs, start.timestamp()):bisect_left(epochs, end.timestamp())])
+        if ranges:
+            positions = min(ranges, key=len)
+        else:
+            positions = range(bisect_left(self.epochs, start.timestamp()), bisect_left(self.epochs, end.timestamp()))
+
+        matches = (self.notifications[position] for position in positions
+                   if matches_filters(self.notifications[position], filters))
+        return list(islice(matches, limit))
+
+    def last_event_before(self, now: datetime) -> Optional[datetime]:
+        """وقت آخر إشعار حان قبل now (أو None)"""
+        index = bisect_right(self.epochs, now.timestamp())
+        return datetime.fromtimestamp(self.epochs[index - 1]) if index else None
+
+    def max_age(self, now: datetime) -> int:
+        """ثواني صلاحية الرد: حتى أقرب موعد أو منتصف الليل، وبحد أقصى CACHE_MAX_AGE"""
+        limit = datetime.combine(now.date() + timedelta(days=1), time.min).timestamp()
+        index = bisect_right(self.epochs, now.timestamp())
+        if index < len(self.epochs):
+            limit = min(limit, self.epochs[index])
+        return max(0, min(CACHE_MAX_AGE, int(limit - now.timestamp())))
+
+
+def build_timeline(logic: FarmLogic, first_day: date, config_hash: str, days: int = TIMELINE_DAYS) -> Timeline:
+    """حساب الخط الزمني دفعة واحدة من مصفوفة المواعيد"""
+    start = datetime.combine(first_day, time.min)
+    notifications = []
+    for event in logic.events_between(start, start + timedelta(days=days)):
+        notification = build_notification(event)
+        if notification:
+            notifications.append(notification)
+    epochs = tuple(notification['datetime'].timestamp() for notification in notifications)
+    day_starts = tuple(bisect_left(epochs, (start + timedelta(days=offset)).timestamp()) for offset in range(days + 1))
+
+    # فهارس ثانوية: لكل قيمة حقل مواقع إشعاراتها بالترتيب الزمني
+    postings = defaultdict(list)
+    for position, notification in enumerate(notifications):
+        for field in INDEXED_FIELDS:
+            if field in notification:
+                postings[(field, notification[field])].append(position)
+    index = {key: (tuple(epochs[position] for position in positions), tuple(positions))
+             for key, positions in postings.items()}
+
+    return Timeline(first_day, days, tuple(notifications), epochs, day_starts,
+                    f"{config_hash[:16]}:{first_day.isoformat()}", datetime.now(), index)
+
+
+class ScheduleSnapshot(NamedTuple):
+    """لقطة غير قابلة للتبديل من الإعدادات: الجدول المُجمَّع وخطه الزمني وذاكرة إشعاراته معاً"""
+    logic: FarmLogic
+    cache: NotificationCache
+    config_hash: str
+    loaded_at: datetime
+    timeline: Timeline
 
-            days_diff = (check_date - start_date).days
-            return days_diff >= 0 and days_diff % interval == 0
-        except:
-            return False
 
-    def _should_clean_water_station_on_date(self, check_date: date) -> bool:
-        """فحص تنظيف محطة الماء لتاريخ محدد"""
+class NotificationScheduler:
+    """يقرأ كل طلب اللقطة الحالية مرة واحدة ويكمل عليها؛ إعادة التحميل تبني لقطة جديدة ثم تستبدلها دفعة واحدة"""
+
+    def __init__(self, config_path: str = 'config.json', poll_seconds: float = CONFIG_POLL_SECONDS):
+        self.config_path = config_path
+        self.poll_seconds = poll_seconds
+        self.reloads = 0
+        self._config_stat = self._stat()
+        self._reload_lock = threading.Lock()  # للكاتب فقط - القراءة بدون أقفال
+        self._watcher: Optional[threading.Thread] = None
+        self.snapshot = self._build_snapshot()
+
+    @property
+    def logic(self) -> FarmLogic:
+        return self.snapshot.logic
+
+    @property
+    def cache(self) -> NotificationCache:
+        return self.snapshot.cache
+
+    def _stat(self) -> Optional[Tuple[int, int]]:
         try:
-            config = self.logic.config['chicken_schedule'].get('water_station', {})
-            if not config:
+            stat = os.stat(self.config_path)
+            return stat.st_mtime_ns, stat.st_size
+        except OSError:
+            return None
+
+    def _build_snapshot(self) -> ScheduleSnapshot:
+        """تجميع الإعدادات في لقطة جديدة (خارج مسار الطلبات)"""
+        # البصمة تُحسب قبل التحميل: إذا تغير الملف أثناءه يلاحظ الفحص التالي الفرق
+        config_hash = file_digest(self.config_path)
+        logic = FarmLogic(self.config_path)
+        return ScheduleSnapshot(logic, NotificationCache(self.config_path), config_hash, datetime.now(),
+                                build_timeline(logic, date.today(), config_hash))
+
+    def roll_over_if_new_day(self) -> bool:
+        """بعد منتصف الليل المحلي: خط زمني جديد يبدأ من اليوم (نفس الجدول والذاكرة)"""
+        with self._reload_lock:
+            snapshot, today = self.snapshot, date.today()
+            if snapshot.timeline.first_day == today:
                 return False
-
-            start_date = datetime.strptime(config['start_date'], "%Y-%m-%d").date()
-            interval = config['interval_days']
-            days_diff = (check_date - start_date).days
-
-            return days_diff >= 0 and days_diff % interval == 0
-        except:
-            return False
-
-    def _should_clean_weekly_on_date(self, check_date: date) -> bool:
-        """فحص التنظيف الأسبوعي لتاريخ محدد"""
-        try:
-            config = self.logic.config['chicken_schedule'].get('weekly_cleaning', {})
-            if not config:
+            self.snapshot = snapshot._replace(timeline=build_timeline(snapshot.logic, today, snapshot.config_hash))
+            print(f"[API] خط زمني جديد من {today}")
+            return True
+
+    def reload_if_changed(self) -> bool:
+        """فحص config.json (الوقت والحجم ثم البصمة) وتبديل اللقطة إذا تغير محتواه"""
+        with self._reload_lock:
+            stat = self._stat()
+            if stat is None or stat == self._config_stat:
                 return False
-
-            start_date = datetime.strptime(config['start_date'], "%Y-%m-%d").date()
-            interval = config['interval_days']
-            days_diff = (check_date - start_date).days
-
-            return days_diff >= 0 and days_diff % interval == 0
-        except:
-            return False
-
-    def _should_turn_soil_on_date(self, check_date: date) -> bool:
-        """فحص تقليب التراب لتاريخ محدد"""
-        try:
-            config = self.logic.config['chicken_schedule'].get('soil_turning', {})
-            if not config:
+            self._config_stat = stat
+
+            try:
+                if file_digest(self.config_path) == self.snapshot.config_hash:
+                    return False
+                snapshot = self._build_snapshot()
+            except Exception as e:
+                # إعدادات غير صالحة: تبقى اللقطة القديمة حتى يُصلح الملف
+                print(f"❌ فشل إعادة تحميل {self.config_path} - الإبقاء على الإعدادات السابقة: {e}")
                 return False
 
-            start_date = datetime.strptime(config['start_date'], "%Y-%m-%d").date()
-            interval = config['interval_days']
-            days_diff = (check_date - start_date).days
-
-            return days_diff >= 0 and days_diff % interval == 0
-        except:
-            return False
-
-    def _should_check_ventilation_on_date(self, check_date: date) -> bool:
-        """فحص التهوية لتاريخ محدد"""
-        try:
-            config = self.logic.config['chicken_schedule'].get('ventilation', {})
-            if not config:
-                return False
+            # تبديل ذري: الطلبات الجارية تكمل على اللقطة القديمة، والجديدة تقرأ هذه
+            self.snapshot = snapshot
+            self.reloads += 1
+            print(f"[API] تم تحميل الإعدادات الجديدة ({snapshot.config_hash[:12]})")
+            return True
+
+    def start_watching(self):
+        """مراقبة config.json في خيط خلفي"""
+        if self._watcher is not None:
+            return
+        self._watcher = threading.Thread(target=self._watch, name='config-watcher', daemon=True)
+        self._watcher.start()
+
+    def _watch(self):
+        while True:
+            time_module.sleep(self.poll_seconds)
+            try:
+                self.reload_if_changed() or self.roll_over_if_new_day()
+            except Exception as e:
+                print(f"❌ خطأ في تحديث الخط الزمني: {e}")
+
+    def iter_notifications(self, start: datetime, end: Optional[datetime] = None,
+                           snapshot: Optional[ScheduleSnapshot] = None) -> Iterator[Dict]:
+        """الإشعارات بترتيب زمني - فترة محددة تُقيَّم دفعة واحدة، وبدون نهاية تُبث تدفقاً"""
+        logic = (snapshot or self.snapshot).logic
+        events = logic.iter_events(start) if end is None else logic.events_between(start, end)
+        for event in events:
+            notification = build_notification(event)
+            if notification:
+                yield notification
+
+    def iter_next_notifications(self, days_ahead: int = 30, position: Optional[Tuple[datetime, int]] = None,
+                                snapshot: Optional[ScheduleSnapshot] = None) -> Iterator[Dict]:
+        """الإشعارات القادمة واحداً تلو الآخر بدون بناء القائمة - بعد position (من parse_cursor) إن وُجد"""
+        snapshot = snapshot or self.snapshot
+        first_day = date.today()
+        start = datetime.combine(first_day, time.min)
+        end = start + timedelta(days=days_ahead)
+        after, sent = position or (start, 0)
+
+        timeline = snapshot.timeline
+        if timeline.covers(first_day, days_ahead):
+            offset = (first_day - timeline.first_day).days
+            index, stop = timeline.day_starts[offset], timeline.day_starts[offset + days_ahead]
+            if position:
+                epoch = after.timestamp()
+                index = max(index, min(bisect_left(timeline.epochs, epoch) + sent, bisect_right(timeline.epochs, epoch)))
+            for i in range(index, stop):
+                yield timeline.notifications[i]
+            return
+
+        # خارج الخط الزمني: تدفق كسول من الجدول يتوقف عند نهاية الفترة
+        for notification in self.iter_notifications(max(start, after), snapshot=snapshot):
+            if notification['datetime'] >= end:
+                return
+            if position and sent and notification['datetime'] == after:
+                sent -= 1
+                continue
+            yield notification
+
+    def query_notifications(self, start: datetime, end: datetime, filters: Dict[str, str],
+                            limit: Optional[int] = None, snapshot: Optional[ScheduleSnapshot] = None) -> List[Dict]:
+        """إشعارات [start, end) المطابقة للفلاتر: من فهارس الخط الزمني، أو بالمرور على الجدول خارج مداه"""
+        snapshot = snapshot or self.snapshot
+        timeline = snapshot.timeline
+        if datetime.combine(timeline.first_day, time.min) <= start and end <= timeline.end:
+            return timeline.query(start, end, filters, limit)
+
+        # خارج الخط الزمني: تدفق كسول من الجدول يتوقف عند نهاية الفترة أو عند limit
+        matches = (notification for notification in
+                   takewhile(lambda n: n['datetime'] < end, self.iter_notifications(start, snapshot=snapshot))
+                   if matches_filters(notification, filters))
+        return list(islice(matches, limit))
 
-            start_date = datetime.strptime(config['start_date'], "%Y-%m-%d").date()
-            interval = config['interval_days']
-            days_diff = (check_date - start_date).days
+    def get_next_notifications(self, days_ahead: int = 30) -> List[Dict]:
+        """جلب الإشعارات القادمة خلال فترة محددة (مرتبة زمنياً)"""
+        return self._get_notifications_for_days(date.today(), days_ahead)
+
+    def get_next_notification(self, now: datetime, days_ahead: int = 7) -> Optional[Dict]:
+        """أقرب إشعار بعد اللحظة now خلال days_ahead يوماً"""
+        timeline = self.snapshot.timeline
+        if timeline.covers(now.date(), days_ahead):
+            return timeline.next_after(now, datetime.combine(now.date() + timedelta(days=days_ahead), time.min))
+
+        for notification in self._get_notifications_for_days(now.date(), days_ahead):
+            if notification['datetime'] > now:
+                return notification
+        return None
+
+    def _get_notifications_for_days(self, first_day: date, days: int) -> List[Dict]:
+        """إشعارات أيام متتالية: شريحة من الخط الزمني، أو من ذاكرة الأيام خارج مداه"""
+        snapshot = self.snapshot
+        if snapshot.timeline.covers(first_day, days):
+            return snapshot.timeline.days_slice(first_day, days)
+
+        start = datetime.combine(first_day, time.min)
+        end = start + timedelta(days=days)
+        return snapshot.cache.get_days(first_day, days, lambda d: self._evaluate_date(d, snapshot),
+                                       prepare=lambda: snapshot.logic.events_between(start, end))
+
+    def get_rollup(self, days_ahead: int = 30) -> Dict:
+        """ملخص الإشعارات القادمة (حسب النوع/الشجرة/السماد/الأسبوع/الشهر) محفوظ بجانب أيامها"""
+        snapshot = self.snapshot
+        first_day = date.today()
+        start = datetime.combine(first_day, time.min)
+        end = start + timedelta(days=days_ahead)
+        prepare = None if snapshot.timeline.covers(first_day, days_ahead) else \
+            (lambda: snapshot.logic.events_between(start, end))
+        return snapshot.cache.get_rollup(first_day, days_ahead, lambda d: self._evaluate_date(d, snapshot),
+                                         prepare=prepare)
 
-            return days_diff >= 0 and days_diff % interval == 0
-        except:
-            return False
+    def _get_notifications_for_date(self, check_date: date) -> List[Dict]:
+        """جلب إشعارات يوم محدد"""
+        snapshot = self.snapshot
+        if snapshot.timeline.covers(check_date, 1):
+            return snapshot.timeline.days_slice(check_date, 1)
+        return snapshot.cache.get_or_compute(check_date, lambda d: self._evaluate_date(d, snapshot))
+
+    def _evaluate_date(self, check_date: date, snapshot: ScheduleSnapshot) -> List[Dict]:
+        if snapshot.timeline.covers(check_date, 1):
+            return snapshot.timeline.days_slice(check_date, 1)
+        start = datetime.combine(check_date, time.min)
+        return list(self.iter_notifications(start, start + timedelta(days=1), snapshot))
+
+# إنشاء مثيل من المجدول ومراقبة config.json (التعديلات تُطبق بدون إعادة تشغيل الخادم)
+scheduler = NotificationScheduler()
+scheduler.start_watching()
 
-    def _should_clean_feeders_on_date(self, check_date: date) -> bool:
-        """فحص غسيل المعالف لتاريخ محدد"""
+def _error_response(e: Exception):
+    return jsonify({
+        'success': False,
+        'error': str(e)
+    }), 500
+
+def _invalid_days(days_ahead: int):
+    return jsonify({'success': False, 'error': f"عدد أيام غير صالح: {days_ahead}"}), 400
+
+def _invalid_limit(limit: int):
+    return jsonify({'success': False, 'error': f"limit يجب أن يكون 1 أو أكثر: {limit}"}), 400
+
+def _conditional_response(snapshot: ScheduleSnapshot, key: Tuple, build: Callable,
+                          last_modified: Optional[datetime] = None, respond: Callable = jsonify):
+    """رد شرطي: ETag قوي من إصدار الخط الزمني ومعاملات الطلب، و304 بدون بناء الرد أو تسلسل JSON عند التطابق"""
+    now = datetime.now()
+    timeline = snapshot.timeline
+    etag = hashlib.sha1(repr((timeline.version,) + key).encode('utf-8')).hexdigest()
+    last_modified = (last_modified or timeline.built_at).replace(microsecond=0).astimezone(timezone.utc)
+
+    # If-None-Match له الأولوية؛ If-Modified-Since يُعتبر فقط في غيابه
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains(etag)
+    else:
+        not_modified = request.if_modified_since is not None and last_modified <= request.if_modified_since
+
+    response = app.response_class(status=304) if not_modified else respond(build())
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.headers['Cache-Control'] = f'public, max-age={timeline.max_age(now)}'
+    return response
+
+def _ndjson_lines(page: NotificationPage) -> Iterator[str]:
+    for notification in page:
+        yield app.json.dumps(notification) + '\n'
+    if page.next_cursor:
+        yield app.json.dumps({'next_cursor': page.next_cursor}) + '\n'
+
+def _json_array_chunks(page: NotificationPage) -> Iterator[str]:
+    yield '{"success": true, "notifications": ['
+    for index, notification in enumerate(page):
+        yield (',' if index else '') + app.json.dumps(notification)
+    yield f'], "count": {page.count}, "next_cursor": {app.json.dumps(page.next_cursor)}}}'
+
+def _parse_bound(value: Optional[str], default: datetime, end_of_day: bool = False) -> datetime:
+    """تاريخ (YYYY-MM-DD، نهاية الفترة تشمل اليوم كاملاً) أو وقت ISO"""
+    if not value:
+        return default
+    if len(value) == 10:
+        day = date.fromisoformat(value)
+        if end_of_day:
+            return datetime.combine(day, time.max) if day == date.max else datetime.combine(day + timedelta(days=1), time.min)
+        return datetime.combine(day, time.min)
+    return datetime.fromisoformat(value)
+
+@app.route('/api/notifications', methods=['GET'])
+def query_notifications():
+    """API لاستعلام الإشعارات في فترة مع الفلترة حسب النوع/الشجرة/الأولوية
+
+    مثلاً: ?type=fertilizer&tree=mango_large&from=2026-01-01&to=2026-03-31 أو ?type=sanitization&limit=1
+    (from الافتراضي: الآن، to الافتراضي: نهاية الخط الزمني)
+    """
+    try:
+        now = datetime.now()
+        snapshot = scheduler.snapshot
         try:
-            config = self.logic.config['chicken_schedule'].get('feeder_cleaning', {})
-            if not config:
-                return False
+            start = _parse_bound(request.args.get('from'), now)
+            end = _parse_bound(request.args.get('to'), snapshot.timeline.end, end_of_day=True)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': f"تاريخ غير صالح: {e}"}), 400
+        if end < start:
+            return jsonify({'success': False, 'error': f"نهاية الفترة {end} قبل بدايتها {start}"}), 400
+
+        filters = {field: request.args[field] for field in INDEXED_FIELDS if field in request.args}
+        limit = request.args.get('limit', type=int)
+        if limit is not None and limit < 1:
+            return _invalid_limit(limit)
+        if end - start > timedelta(days=MAX_QUERY_DAYS):
+            return jsonify({'success': False, 'error': f"الفترة أطول من {MAX_QUERY_DAYS} يوماً"}), 400
+
+        def build() -> Dict:
+            notifications = scheduler.query_notifications(start, end, filters, limit, snapshot)
+            return {
+                'success': True,
+                'notifications': notifications,
+                'count': len(notifications),
+                'to': end.isoformat(),
+                'filters': filters
+            }
 
-            start_date = datetime.strptime(config['start_date'], "%Y-%m-%d").date()
-            interval = config['interval_days']
-            days_diff = (check_date - start_date).days
+        # بدون from تتغير النتيجة فقط عند حلول إشعار (وليس مع كل ثانية)، لذلك لا يُعاد "الآن" في الرد
+        origin = start if request.args.get('from') else snapshot.timeline.last_event_before(now)
+        key = ('query', origin, end, sorted(filters.items()), limit)
+        last_modified = None if request.args.get('from') else max(filter(None, (snapshot.timeline.built_at, origin)))
+        return _conditional_response(snapshot, key, build, last_modified)
+    except OverflowError as e:
+        # قرب حدود التقويم (السنة 1 أو 9999) تتجاوز حسابات المواعيد مدى التواريخ
+        return jsonify({'success': False, 'error': f"تاريخ خارج المدى المدعوم: {e}"}), 400
+    except Exception as e:
+        return _error_response(e)
 
-            return days_diff >= 0 and days_diff % interval == 0
-        except:
-            return False
+@app.route('/api/notifications/next', methods=['GET'])
+def get_next_notifications():
+    """API لجلب الإشعارات القادمة
 
-    def _get_pipe_waterer_tasks_for_date(self, check_date: date) -> List[str]:
-        """جلب مهام السقاية الأنبوبية لتاريخ محدد"""
-        tasks = []
-        try:
-            config = self.logic.config['chicken_schedule'].get('pipe_waterer', {})
-            if not config:
-                return []
-
-            start_date = datetime.strptime(config['start_date'], "%Y-%m-%d").date()
-            intervals = config.get('intervals', {})
-            days_diff = (check_date - start_date).days
-
-            if days_diff < 0:
-                return []
-
-            # فحص كل نوع صيانة (بنفس ترتيب الأولوية في logic.py)
-            if days_diff % intervals.get('deep_clean', 30) == 0:
-                tasks.append('deep_clean')
-            elif days_diff % intervals.get('sanitize', 15) == 0:
-                tasks.append('sanitize')
-            elif days_diff % intervals.get('rinse', 7) == 0:
-                tasks.append('rinse')
-            elif days_diff % intervals.get('change_water', 3) == 0:
-                tasks.append('change_water')
-
-            return tasks
-        except:
-            return []
-
-    def _get_pipe_task_name_ar(self, task: str) -> str:
-        """أسماء مهام السقاية بالعربية"""
-        names = {
-            'change_water': 'تغيير الماء',
-            'rinse': 'شطف',
-            'sanitize': 'تعقيم',
-            'deep_clean': 'تنظيف عميق'
-        }
-        return names.get(task, task)
-
-    def _get_pipe_task_name_bn(self, task: str) -> str:
-        """أسماء مهام السقاية بالبنغالية"""
-        names = {
-            'change_water': 'পানি পরিবর্তন',
-            'rinse': 'ধোয়া',
-            'sanitize': 'জীবাণুমুক্তকরণ',
-            'deep_clean': 'গভীর পরিষ্কার'
-        }
-        return names.get(task, task)
-
-    def _get_fertilizer_tasks_for_date(self, check_date: date) -> List[Dict]:
-        """جلب مهام التسميد لتاريخ محدد"""
-        tasks = []
+    format=ndjson أو json-stream يبث الإشعارات فور حسابها بذاكرة ثابتة مهما طالت الفترة،
+    و limit/cursor يقسمان النتيجة إلى صفحات (next_cursor في آخر الرد يطلب الصفحة التالية).
+    """
+    try:
+        days_ahead = request.args.get('days', 30, type=int)
+        if days_ahead < 0:
+            return _invalid_days(days_ahead)
+        limit = request.args.get('limit', type=int)
+        if limit is not None and limit < 1:
+            return _invalid_limit(limit)
+        cursor = request.args.get('cursor')
+        output = request.args.get('format', 'json')
+        if output not in RESPONSE_FORMATS:
+            return jsonify({'success': False, 'error': f"صيغة غير معروفة: {output}"}), 400
         try:
-            trees_schedule = self.logic.config.get('trees_fertilizer_schedule', {})
-
-            # أسماء الأشجار
-            tree_names_ar = {
-                'henna': 'الحناء', 'fig': 'التين', 'banana': 'الموز',
-                'mango_small': 'مانجو صغيرة', 'mango_large': 'مانجو كبيرة',
-                'jackfruit_young': 'جاك فروت صغير', 'mint_basil': 'النعناع والحبق',
-                'pomegranate': 'الرمان', 'acacia': 'الأكاسيا', 'bougainvillea': 'الجهنمية',
-                'grape': 'العنب', 'custard_apple': 'القشطة', 'ornamental': 'أشجار الزينة',
-                'moringa': 'المورينجا'
-            }
-
-            tree_names_bn = {
-                'henna': 'মেহেদি', 'fig': 'ডুমুর', 'banana': 'কলা',
-                'mango_small': 'ছোট আম', 'mango_large': 'বড় আম',
-                'jackfruit_young': 'ছোট কাঁঠাল', 'mint_basil': 'পুদিনা ও তুলসী',
-                'pomegranate': 'ডালিম', 'acacia': 'বাবলা', 'bougainvillea': 'বাগানবিলাস',
-                'grape': 'আঙ্গুর', 'custard_apple': 'আতা', 'ornamental': 'শোভাবর্ধনকারী গাছ',
-                'moringa': 'সজনে'
+            position = parse_cursor(cursor) if cursor else None
+        except (ValueError, OverflowError, OSError):
+            return jsonify({'success': False, 'error': f"مؤشر غير صالح: {cursor}"}), 400
+
+        snapshot = scheduler.snapshot
+        key = ('next', date.today(), days_ahead, output, limit, cursor)
+
+        def page() -> NotificationPage:
+            return NotificationPage(scheduler.iter_next_notifications(days_ahead, position, snapshot),
+                                    limit, position)
+
+        if output == 'ndjson':
+            return _conditional_response(snapshot, key, page, respond=lambda p: app.response_class(
+                _ndjson_lines(p), mimetype='application/x-ndjson'))
+        if output == 'json-stream':
+            return _conditional_response(snapshot, key, page, respond=lambda p: app.response_class(
+                _json_array_chunks(p), mimetype='application/json'))
+
+        def build() -> Dict:
+            if limit is None and position is None:
+                notifications = scheduler.get_next_notifications(days_ahead)
+                return {
+                    'success': True,
+                    'notifications': notifications,
+                    'count': len(notifications)
+                }
+            paged = page()
+            notifications = list(paged)
+            return {
+                'success': True,
+                'notifications': notifications,
+                'count': len(notifications),
+                'next_cursor': paged.next_cursor
             }
 
-            for tree_key, tree_config in trees_schedule.items():
-                should_fertilize = False
-
-                # فحص التواريخ المحددة
-                if 'dates' in tree_config:
-                    check_date_str = check_date.strftime("%Y-%m-%d")
-                    if check_date_str in tree_config['dates']:
-                        should_fertilize = True
-
-                # فحص المواسم (مبسط - يحتاج تحسين)
-                elif 'seasons' in tree_config:
-                    # هنا يمكن إضافة منطق فحص المواسم
-                    # للبساطة، سنفحص فقط التواريخ المحددة
-                    pass
-
-                if should_fertilize:
-                    fertilizer = tree_config.get('fertilizer', 'غير محدد')
-                    if 'fertilizers' in tree_config:
-                        # اختيار السماد الأول للبساطة
-                        fertilizer = tree_config['fertilizers'][0]
-
-                    tasks.append({
-                        'tree_key': tree_key,
-                        'tree_name_ar': tree_names_ar.get(tree_key, tree_key),
-                        'tree_name_bn': tree_names_bn.get(tree_key, tree_key),
-                        'fertilizer': fertilizer
-                    })
-
-            return tasks
-        except:
-            return []
-
-# إنشاء مثيل من المجدول
-scheduler = NotificationScheduler()
+        return _conditional_response(snapshot, key, build)
+    except Exception as e:
+        return _error_response(e)
 
-@app.route('/api/notifications/next', methods=['GET'])
-def get_next_notifications():
-    """API لجلب الإشعارات القادمة"""
+@app.route('/api/notifications/rollup', methods=['GET'])
+def get_notifications_rollup():
+    """API لملخص الإشعارات القادمة: مثلاً كمية كل سماد خلال 90 يوماً أو أثقل أسبوع"""
     try:
         days_ahead = request.args.get('days', 30, type=int)
-        notifications = scheduler.get_next_notifications(days_ahead)
+        if days_ahead < 0:
+            return _invalid_days(days_ahead)
+
+        def build() -> Dict:
+            return {
+                'success': True,
+                'days': days_ahead,
+                'rollup': scheduler.get_rollup(days_ahead)
+            }
 
-        return jsonify({
-            'success': True,
-            'notifications': notifications,
-            'count': len(notifications)
-        })
+        # الملخص يبدأ من اليوم: يتغير عند منتصف الليل حتى قبل أن يُعاد بناء الخط الزمني
+        snapshot, today = scheduler.snapshot, date.today()
+        last_modified = max(snapshot.timeline.built_at, datetime.combine(today, time.min))
+        return _conditional_response(snapshot, ('rollup', today, days_ahead), build, last_modified)
     except Exception as e:
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+        return _error_response(e)
 
 @app.route('/api/notifications/today', methods=['GET'])
 def get_today_notifications():
     """API لجلب إشعارات اليوم"""
     try:
         today = date.today()
-        notifications = scheduler._get_notifications_for_date(today)
-
-        return jsonify({
-            'success': True,
-            'notifications': notifications,
-            'count': len(notifications),
-            'date': today.isoformat()
-        })
+
+        def build() -> Dict:
+            notifications = scheduler._get_notifications_for_date(today)
+            return {
+                'success': True,
+                'notifications': notifications,
+                'count': len(notifications),
+                'date': today.isoformat()
+            }
+
+        return _conditional_response(scheduler.snapshot, ('today', today), build)
     except Exception as e:
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+        return _error_response(e)
 
 @app.route('/api/notifications/countdown', methods=['GET'])
 def get_countdown_data():
-    """API لجلب بيانات العداد التنازلي"""
-    try:
-        notifications = scheduler.get_next_notifications(7)  # أسبوع قادم
-
-        if not notifications:
-            return jsonify({
-                'success': True,
-                'next_notification': None,
-                'message_ar': 'لا توجد إشعارات مجدولة خلال الأسبوع القادم',
-                'message_bn': 'আগামী সপ্তাহে কোনো বিজ্ঞপ্তি নির্ধারিত নেই'
-            })
+    """API لجلب بيانات العداد التنازلي
 
-        next_notification = notifications[0]
+    الرد لا يتغير حتى يحين الموعد: يحمل وقت الهدف المطلق (target_epoch بثواني Unix)
+    ويحسب المتصفح الوقت المتبقي محلياً، لذلك يمكن تخزينه حتى ذلك الحين.
+    """
+    try:
         now = datetime.now()
-        time_diff = next_notification['datetime'] - now
-
-        # حساب الوقت المتبقي
-        if time_diff.total_seconds() <= 0:
-            # الإشعار قد مضى، ابحث عن التالي
-            future_notifications = [n for n in notifications if n['datetime'] > now]
-            if future_notifications:
-                next_notification = future_notifications[0]
-                time_diff = next_notification['datetime'] - now
-            else:
-                return jsonify({
+        snapshot = scheduler.snapshot
+        next_notification = scheduler.get_next_notification(now, 7)  # أسبوع قادم
+        target_epoch = int(next_notification['datetime'].timestamp()) if next_notification else None
+
+        def build() -> Dict:
+            if not next_notification:
+                return {
                     'success': True,
                     'next_notification': None,
-                    'message_ar': 'لا توجد إشعارات قادمة',
-                    'message_bn': 'কোনো আসন্ন বিজ্ঞপ্তি নেই'
-                })
-
-        total_seconds = int(time_diff.total_seconds())
-        days = total_seconds // 86400
-        hours = (total_seconds % 86400) // 3600
-        minutes = (total_seconds % 3600) // 60
-        seconds = total_seconds % 60
-
-        return jsonify({
-            'success': True,
-            'next_notification': next_notification,
-            'countdown': {
-                'total_seconds': total_seconds,
-                'days': days,
-                'hours': hours,
-                'minutes': minutes,
-                'seconds': seconds
-            },
-            'current_time': now.isoformat()
-        })
+                    'target_epoch': None,
+                    'message_ar': 'لا توجد إشعارات مجدولة خلال الأسبوع القادم',
+                    'message_bn': 'আগামী সপ্তাহে কোনো বিজ্ঞপ্তি নির্ধারিত নেই'
+                }
+            return {
+                'success': True,
+                'next_notification': {**next_notification, 'datetime': next_notification['datetime'].isoformat()},
+                'target_epoch': target_epoch
+            }
+
+        # الرد يتغير عند بناء الخط الزمني أو عند حلول الموعد السابق
+        last_modified = max(filter(None, (snapshot.timeline.built_at, snapshot.timeline.last_event_before(now))))
+        key = ('countdown', target_epoch if target_epoch else now.date())
+        return _conditional_response(snapshot, key, build, last_modified)
     except Exception as e:
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+        return _error_response(e)
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """فحص صحة API"""
+    snapshot = scheduler.snapshot
     return jsonify({
         'success': True,
         'message': 'Farm Notifier API is running',
-        'timestamp': datetime.now().isoformat()
+        'timestamp': datetime.now().isoformat(),
+        'config': {
+            'hash': snapshot.config_hash[:12],
+            'loaded_at': snapshot.loaded_at.isoformat(),
+            'reloads': scheduler.reloads
+        },
+        'timeline': {
+            'first_day': snapshot.timeline.first_day.isoformat(),
+            'days': snapshot.timeline.days,
+            'count': len(snapshot.timeline.notifications),
+            'indexes': len(snapshot.timeline.index)
+        },
+        'cache': snapshot.cache.stats()
     })
 
 if __name__ == '__main__':
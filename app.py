@@ -17,26 +17,16 @@ from typing import Dict, List, Optional
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from weather import WeatherFetcher
-from logic import FarmLogic
+from logic import EvaluationContext, FarmLogic
+from notifications import TREE_NAMES_AR, build_notification
 from telegram_notifier import TelegramNotifier
+from generate_notifications import StaticNotificationGenerator, write_notifications_json
 
-# قاموس أسماء الأشجار بالعربية
-TREE_NAMES_MAP = {
-    'henna': 'الحناء',
-    'fig': 'التين',
-    'banana': 'الموز',
-    'mango_small': 'مانجو صغيرة',
-    'mango_large': 'مانجو كبيرة',
-    'jackfruit_young': 'جاك فروت صغير',
-    'mint_basil': 'النعناع والحبق',
-    'pomegranate': 'الرمان',
-    'acacia': 'الأكاسيا',
-    'bougainvillea': 'الجهنمية',
-    'grape': 'العنب',
-    'custard_apple': 'القشطة',
-    'ornamental': 'أشجار الزينة',
-    'moringa': 'المورينجا'
-}
+# قاموس أسماء الأشجار بالعربية (مشترك مع الإشعارات)
+TREE_NAMES_MAP = TREE_NAMES_AR
+
+# أقصى عدد أسطر في رسالة المهام الفائتة (حد طول رسالة Telegram)
+MISSED_TASKS_MAX_LINES = 30
 
 def _create_safe_filename(name: str) -> str:
     """يحول اسم المنتج إلى اسم ملف آمن (أحرف صغيرة، شرطات سفلية)."""
@@ -137,6 +127,18 @@ def get_messages_templates() -> Dict:
             'bn': lambda d: f"🌬️ *বায়ুচলাচল பরীক্ষা সতর্কতা* 💨\n\n{escape_markdown_v2('বায়ুচলাচل পরীক্ষা করুন।')}\n\n[🔍 আরও বিস্তारিত]({BASE_URL}/ventilation.html){documentation_request_bn}",
             'image': 'ventilation.jpg'
         },
+        # قالب عام لقواعد قسم rules في config.json (العنوان والنص والصورة من الإعدادات)
+        'rule': {
+            'ar': lambda d: f"{d.get('icon', '📌')} *{escape_markdown_v2(d.get('title_ar', d.get('rule', '')))}*\n\n" + (f"{escape_markdown_v2(d['message_ar'])}\n\n" if d.get('message_ar') else '') + (f"[🔍 المزيد من التفاصيل]({BASE_URL}/{d['page']})" if d.get('page') else '') + documentation_request_ar,
+            'bn': lambda d: f"{d.get('icon', '📌')} *{escape_markdown_v2(d.get('title_bn', d.get('rule', '')))}*\n\n" + (f"{escape_markdown_v2(d['message_bn'])}\n\n" if d.get('message_bn') else '') + (f"[🔍 আরও বিস্তারিত]({BASE_URL}/{d['page']})" if d.get('page') else '') + documentation_request_bn,
+            'image': lambda d: d.get('image')
+        },
+        # رسالة واحدة مجمعة لكل المهام الفائتة منذ آخر تشغيل ناجح
+        'missed_tasks': {
+            'ar': lambda d: f"⏰ *مهام فائتة منذ آخر تشغيل* ⏰\n\n{_missed_tasks_lines(d['notifications'], 'title_ar', 'و {} مهام أخرى')}\n\n{escape_markdown_v2('يرجى تنفيذها في أقرب وقت إن لم تُنفذ بعد.')}{documentation_request_ar}",
+            'bn': lambda d: f"⏰ *শেষ চালানোর পর মিস হওয়া কাজ* ⏰\n\n{_missed_tasks_lines(d['notifications'], 'title_bn', 'আরও {}টি কাজ')}\n\n{escape_markdown_v2('এখনও না করা হলে যত তাড়াতাড়ি সম্ভব করুন।')}{documentation_request_bn}",
+            'image': None
+        },
         'feeder_cleaning': {
             'ar': lambda d: f"🍽️ *تنبيه غسيل المعالف العميق* 🧼\n\n{escape_markdown_v2('تنظيف وتطهير المعالف.')}\n\n[🔍 المزيد من التفاصيل]({BASE_URL}/feeder_cleaning.html){documentation_request_ar}",
             'bn': lambda d: f"🍽️ *খাবার পাত্রের গভীর পরিষ্কার* 🧼\n\n{escape_markdown_v2('খাবার পাত্র পরিষ্কার করুন।')}\n\n[🔍 আরও بਿস্তারিত]({BASE_URL}/feeder_cleaning.html){documentation_request_bn}",
@@ -144,6 +146,14 @@ def get_messages_templates() -> Dict:
         }
     }
 
+def _missed_tasks_lines(notifications: List[Dict], title_key: str, more_template: str) -> str:
+    """سطر لكل مهمة فائتة (التاريخ + العنوان) مع اختصار القوائم الطويلة"""
+    lines = [escape_markdown_v2(f"• {n['date']} - {n.get('icon', '')} {n[title_key]}")
+             for n in notifications[:MISSED_TASKS_MAX_LINES]]
+    if len(notifications) > MISSED_TASKS_MAX_LINES:
+        lines.append(escape_markdown_v2(more_template.format(len(notifications) - MISSED_TASKS_MAX_LINES)))
+    return '\n'.join(lines)
+
 def create_task_from_logic(logic_result: Dict, task_type: str, messages_templates: Dict) -> Dict:
     """إنشاء مهمة من نتيجة logic (مع دعم الصور الديناميكية)"""
     template = messages_templates.get(task_type)
@@ -163,13 +173,67 @@ def create_task_from_logic(logic_result: Dict, task_type: str, messages_template
             image_filename = None
 
     return {
-        'type': f"{task_type}_{logic_result.get('tree', '') or logic_result.get('drug', '')}",
+        'type': f"{task_type}_{logic_result.get('tree', '') or logic_result.get('drug', '') or logic_result.get('rule', '')}",
+        'task_type': task_type,
         'ar': template['ar'](logic_result),
         'bn': template['bn'](logic_result),
         'image': image_filename
     }
 
-def main():
+def build_daily_tasks(logic: FarmLogic, ctx: EvaluationContext, messages_templates: Dict) -> List[Dict]:
+    """بناء رسائل مهام يوم واحد من سياق التقييم (مشترك بين التشغيل اليومي والمحاكاة)"""
+    tasks_to_send = []
+
+    # 1. مهمة دواء الديدان + رسالة الدليل
+    if ctx.should_deworm:
+        drug_name = ctx.deworm_drug
+        print(f"  ➕ إضافة مهمة دواء الديدان: {drug_name}")
+
+        # المهمة الأساسية مع الصورة
+        deworm_task_details = {'type': 'deworming', 'drug': drug_name}
+        task_data = create_task_from_logic(deworm_task_details, 'deworming', messages_templates)
+        if task_data:
+            tasks_to_send.append(task_data)
+
+        # ✅ إضافة رسالة الدليل المنفصلة (بدون صورة)
+        print("  ➕ إضافة رسالة رابط الدليل التفاعلي")
+        guide_task = {
+            'type': 'deworming_guide',
+            'task_type': 'deworming_guide',
+            'ar': "🛑 <b>مهم جداً - <a href='https://smsmy.github.io/farm-smart-notifier/deworming.html'>دليل استخدام أدوية الديدان للدواجن</a></b>",
+            'bn': "<b><a href='https://smsmy.github.io/farm-smart-notifier/deworming.html'>পোল্ট্রি বা মুরগি কৃমিনাশক ঔষধ ব্যবহারের নির্দেশিকা</a></b>",
+            'image': None  # لا توجد صورة لهذه الرسالة
+        }
+        tasks_to_send.append(guide_task)
+
+    # 2. المهام المعتمدة على الطقس والشروط الأخرى
+    weather_dependent_tasks = logic.get_weather_dependent_tasks(ctx=ctx)
+    for task in weather_dependent_tasks:
+        print(f"  ➕ إضافة مهمة الطقس: {task['type']}")
+        task_data = create_task_from_logic(task, task['type'], messages_templates)
+        if task_data:
+            tasks_to_send.append(task_data)
+
+    # 3. مهام تسميد الأشجار
+    if ctx.weather_report:
+        fertilization_tasks = logic.get_all_fertilization_tasks(ctx=ctx)
+        for tree_task in fertilization_tasks:
+            print(f"  ➕ إضافة مهمة تسميد: {tree_task['tree']}")
+            task_data = create_task_from_logic(tree_task, 'fertilizer', messages_templates)
+            if task_data:
+                tasks_to_send.append(task_data)
+
+    # 4. مهام قسم rules في الإعدادات (قالب خاص إن وجد، وإلا القالب العام)
+    for rule_task in logic.get_rule_tasks(ctx=ctx):
+        print(f"  ➕ إضافة مهمة من القواعد: {rule_task['rule']}")
+        template_type = rule_task['type'] if rule_task['type'] in messages_templates else 'rule'
+        task_data = create_task_from_logic(rule_task, template_type, messages_templates)
+        if task_data:
+            tasks_to_send.append(task_data)
+
+    return tasks_to_send
+
+def main(publish_notifications: bool = False):
     """الدالة الرئيسية"""
     print("=" * 60)
     print(f"🌱 نظام التنبيه الذكي للمزرعة - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
@@ -216,51 +280,24 @@ def main():
         # تحميل قوالب الرسائل
         messages_templates = get_messages_templates()
 
-        # بناء قائمة المهام
+        # بناء قائمة المهام (سياق واحد لكل التشغيل: كل شرط يُحسب مرة واحدة)
         print("\n📋 بناء قائمة المهام...")
-        tasks_to_send = []
-
-        # 1. مهمة دواء الديدان + رسالة الدليل
-        if logic.should_deworm_today():
-            drug_name = logic.get_current_deworm_drug()
-            print(f"  ➕ إضافة مهمة دواء الديدان: {drug_name}")
-
-            # المهمة الأساسية مع الصورة
-            deworm_task_details = {'type': 'deworming', 'drug': drug_name}
-            task_data = create_task_from_logic(deworm_task_details, 'deworming', messages_templates)
-            if task_data:
-                tasks_to_send.append(task_data)
-
-            # ✅ إضافة رسالة الدليل المنفصلة (بدون صورة)
-            print("  ➕ إضافة رسالة رابط الدليل التفاعلي")
-            guide_task = {
-                'type': 'deworming_guide',
-                'ar': "🛑 <b>مهم جداً - <a href='https://smsmy.github.io/farm-smart-notifier/deworming.html'>دليل استخدام أدوية الديدان للدواجن</a></b>",
-                'bn': "<b><a href='https://smsmy.github.io/farm-smart-notifier/deworming.html'>পোল্ট্রি বা মুরগি কৃমিনাশক ঔষধ ব্যবহারের নির্দেশিকা</a></b>",
-                'image': None  # لا توجد صورة لهذه الرسالة
-            }
-            tasks_to_send.append(guide_task)
-
-        # 2. المهام المعتمدة على الطقس والشروط الأخرى
-        weather_dependent_tasks = logic.get_weather_dependent_tasks(weather_report)
-        for task in weather_dependent_tasks:
-            print(f"  ➕ إضافة مهمة الطقس: {task['type']}")
-            task_data = create_task_from_logic(task, task['type'], messages_templates)
+        ctx = logic.evaluation_context(weather_report)
+        tasks_to_send = build_daily_tasks(logic, ctx, messages_templates)
+
+        # 5. المهام الفائتة منذ آخر تشغيل ناجح (كل الأيام باستعلام واحد، ورسالة واحدة مجمعة في البداية)
+        missed = [n for n in (build_notification(event) for event in logic.get_missed_events()) if n]
+        if missed:
+            print(f"  ➕ إضافة رسالة المهام الفائتة: {len(missed)} مهمة")
+            task_data = create_task_from_logic({'type': 'missed_tasks', 'notifications': missed},
+                                               'missed_tasks', messages_templates)
             if task_data:
-                tasks_to_send.append(task_data)
-
-        # 3. مهام تسميد الأشجار
-        if weather_report:
-            fertilization_tasks = logic.get_all_fertilization_tasks(weather_report)
-            for tree_task in fertilization_tasks:
-                print(f"  ➕ إضافة مهمة تسميد: {tree_task['tree']}")
-                task_data = create_task_from_logic(tree_task, 'fertilizer', messages_templates)
-                if task_data:
-                    tasks_to_send.append(task_data)
+                tasks_to_send.insert(0, task_data)
 
         # تقرير نهائي
         print(f"\n📊 تم إعداد {len(tasks_to_send)} مهمة للإرسال")
 
+        success = True
         if not tasks_to_send:
             print("✅ لا توجد مهام مجدولة لليوم")
 
@@ -278,8 +315,16 @@ def main():
             else:
                 print("❌ فشل في إرسال بعض التنبيهات")
 
-        # حفظ وقت التشغيل
-        logic.save_last_run()
+        # حفظ وقت التشغيل (فقط بعد إرسال ناجح، وإلا تُعوَّض المهام في التشغيل القادم)
+        if success:
+            logic.save_last_run()
+        else:
+            print("⚠️ لم يتم تحديث .last_run - سيتم إرسال مهام اليوم كمهام فائتة في التشغيل القادم")
+
+        # تحديث docs/notifications.json بنفس FarmLogic (المواعيد تُحسب مرة واحدة)
+        if publish_notifications:
+            data = write_notifications_json(StaticNotificationGenerator(logic))
+            print(f"🗓️ تم تحديث docs/notifications.json - {data['total_count']} إشعار")
         print(f"\n🕐 تم الانتهاء بنجاح - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
 
     except Exception as e:
@@ -340,6 +385,8 @@ if __name__ == "__main__":
     if len(sys.argv) > 1:
         if sys.argv[1] == 'test':
             quick_test()
+        elif sys.argv[1] == 'publish':
+            main(publish_notifications=True)
         elif sys.argv[1] == 'help':
             print("""
 🌱 Farm Notifier System
@@ -347,6 +394,7 @@ if __name__ == "__main__":
 Usage:
   python main.py           # تشغيل النظام العادي
   python main.py test      # اختبار سريع
+  python main.py publish   # تشغيل النظام ثم تحديث docs/notifications.json
   python main.py help      # عرض المساعدة
 
 Required Environment Variables:
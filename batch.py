@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+تقييم عدة مزارع دفعة واحدة على كل أنوية المعالج
+Multi-farm batch evaluation on a process pool
+
+كل مزرعة ملف إعدادات JSON في مجلد واحد (اسم الملف = اسم المزرعة).
+لكل مزرعة تُحسب مهام اليوم ومواعيد الأيام القادمة، وتُوزَّع المزارع على عمليات منفصلة.
+
+الجدول المُجمَّع لا يُنقل بين العمليات: كل عملية تجمّع إعداداتها بنفسها، والأقسام
+المتطابقة (نفس المواسم أو نفس جدول دواء الديدان أو الأشجار...) تُجمَّع مرة واحدة في
+العملية وتتشارك المزارع نفس الكائنات (انظر _interned في schedule.py).
+
+الاستخدام:
+  python batch.py farms/                      # ملخص لكل مزرعة
+  python batch.py farms/ --days 30 --out out/ # ملف JSON لكل مزرعة
+  python batch.py farms/ --weather            # مع جلب الطقس الحالي لكل مزرعة
+"""
+
+import argparse
+import contextlib
+import glob
+import io
+import json
+import math
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from logic import FarmLogic
+from notifications import build_notification
+from schedule import section_pool_size
+from weather import WeatherFetcher
+
+# عدد أيام المواعيد القادمة الافتراضي لكل مزرعة
+DEFAULT_HORIZON_DAYS = 30
+
+
+
+def discover_farms(directory: str) -> Dict[str, str]:
+    """ملفات الإعدادات في المجلد: {اسم المزرعة: المسار} مرتبة بالاسم"""
+    paths = sorted(glob.glob(os.path.join(directory, '*.json')))
+    return {os.path.splitext(os.path.basename(path))[0]: path for path in paths}
+
+
+def _fetch_weather(logic: FarmLogic) -> Optional[Dict]:
+    api_key = os.getenv('OPENWEATHER_API_KEY') or logic.config['weather']['api_key']
+    weather = WeatherFetcher(api_key, logic.config['weather']['city'], logic.config['weather']['country'])
+    return weather.analyze_conditions(weather.get_weather_data())
+
+
+def evaluate_farm(farm: str, config_path: str, now: datetime,
+                  horizon_days: int = DEFAULT_HORIZON_DAYS, fetch_weather: bool = False) -> Dict:
+    """مهام اليوم ومواعيد horizon_days يوماً لمزرعة واحدة (نتيجة قابلة للنقل بين العمليات)"""
+    result = {'farm': farm, 'config': config_path, 'date': now.date().isoformat(),
+              'weather': None, 'tasks': [], 'upcoming': [], 'error': None}
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            # بدون ملف الجدول المحفوظ: التجميع داخل العملية هو ما يشارك الأقسام المتطابقة بين المزارع
+            logic = FarmLogic(config_path, clock=lambda: now, schedule_cache=False)
+            weather_report = _fetch_weather(logic) if fetch_weather else None
+            ctx = logic.evaluation_context(weather_report)
+
+            tasks = logic.get_tasks_for_today(ctx=ctx)
+            tasks += logic.get_weather_dependent_tasks(ctx=ctx)
+            if ctx.weather_report:
+                tasks += logic.get_all_fertilization_tasks(ctx=ctx)
+            tasks += logic.get_rule_tasks(ctx=ctx)
+
+            upcoming = []
+            for event in logic.events_between(now, now + timedelta(days=horizon_days)):
+                notification = build_notification(event)
+                if notification:
+                    notification['datetime'] = event.when.isoformat()
+                    upcoming.append(notification)
+
+        result.update(weather=weather_report, tasks=tasks, upcoming=upcoming)
+    except Exception as e:
+        result['error'] = str(e)
+    return result
+
+
+def _evaluate_chunk(chunk: List[Dict], now: datetime, horizon_days: int, fetch_weather: bool) -> List[Dict]:
+    results = [evaluate_farm(item['farm'], item['config'], now, horizon_days, fetch_weather) for item in chunk]
+    for result in results:
+        result['shared_sections'] = section_pool_size()
+    return results
+
+
+def evaluate_farms(farms: Dict[str, str], now: Optional[datetime] = None,
+                   horizon_days: int = DEFAULT_HORIZON_DAYS, workers: Optional[int] = None,
+                   fetch_weather: bool = False, farms_per_chunk: Optional[int] = None) -> List[Dict]:
+    """تقييم كل المزارع بالتوازي (workers=1 أو مزرعة واحدة: في نفس العملية) - النتائج بترتيب الأسماء
+
+    workers الافتراضي عدد الأنوية، والمزارع تُقسم بالتساوي على العمليات. farms_per_chunk اختياري:
+    دفعات أكبر تعني مشاركة أكثر للأقسام المتطابقة داخل العملية لكن عدد مهام أقل في المجمع.
+    """
+    now = now or datetime.now()
+    items = [{'farm': farm, 'config': path} for farm, path in sorted(farms.items())]
+    workers = workers or os.cpu_count() or 1
+    size = farms_per_chunk or max(1, math.ceil(len(items) / workers))
+    chunks = [items[i:i + size] for i in range(0, len(items), size)]
+
+    if workers == 1 or len(items) <= 1:
+        return [result for chunk in chunks for result in _evaluate_chunk(chunk, now, horizon_days, fetch_weather)]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_evaluate_chunk, chunk, now, horizon_days, fetch_weather) for chunk in chunks]
+        return [result for future in futures for result in future.result()]
+
+
+def print_summary(results: List[Dict]):
+    """طباعة ملخص سطر لكل مزرعة"""
+    print("=" * 60)
+    print(f"🚜 تقييم {len(results)} مزرعة")
+    print("=" * 60)
+    for result in results:
+        if result['error']:
+            print(f"❌ {result['farm']}: {result['error']}")
+            continue
+        types = ', '.join(task['type'] for task in result['tasks']) or '-'
+        print(f"✅ {result['farm']}: {len(result['tasks'])} مهمة اليوم ({types})، "
+              f"{len(result['upcoming'])} موعد قادم")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="تقييم عدة مزارع دفعة واحدة")
+    parser.add_argument('directory', help="مجلد ملفات إعدادات المزارع (*.json)")
+    parser.add_argument('--days', type=int, default=DEFAULT_HORIZON_DAYS, help="عدد أيام المواعيد القادمة")
+    parser.add_argument('--workers', type=int, default=None, help="عدد العمليات (الافتراضي: عدد الأنوية)")
+    parser.add_argument('--chunk', type=int, default=None,
+                        help="عدد المزارع في كل مهمة (الافتراضي: المزارع ÷ العمليات)")
+    parser.add_argument('--weather', action='store_true', help="جلب الطقس الحالي لكل مزرعة")
+    parser.add_argument('--out', help="مجلد لحفظ نتيجة كل مزرعة في ملف JSON")
+    args = parser.parse_args(argv)
+
+    farms = discover_farms(args.directory)
+    if not farms:
+        print(f"❌ لا توجد ملفات إعدادات في {args.directory}")
+        sys.exit(1)
+
+    results = evaluate_farms(farms, horizon_days=args.days, workers=args.workers, fetch_weather=args.weather,
+                             farms_per_chunk=args.chunk)
+
+    if args.out:
+        os.makedirs(args.out, exist_ok=True)
+        for result in results:
+            with open(os.path.join(args.out, f"{result['farm']}.json"), 'w', encoding='utf-8') as f:
+                json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"💾 تم حفظ النتائج في {args.out}")
+
+    print_summary(results)
+    if any(result['error'] for result in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+تعابير التقويم بصيغة cron - حساب الموعد التالي بالقفز المباشر
+Cron-style calendar expressions with direct next-fire computation
+
+الصيغة: "دقيقة ساعة يوم_الشهر الشهر يوم_الأسبوع"
+- أرقام، نطاقات a-b، خطوات */n و a-b/n، وقوائم مفصولة بفواصل
+- أسماء الأشهر JAN..DEC وأيام الأسبوع SUN..SAT (0 أو 7 = الأحد)
+- L في يوم الشهر = آخر يوم في الشهر
+- FRI#2 = ثاني جمعة في الشهر، FRIL أو 5L = آخر جمعة في الشهر
+- الدقيقة والساعة * * تعني الوقت الافتراضي للمهمة
+- إذا قُيّد يوم الشهر ويوم الأسبوع معاً يكفي تحقق أحدهما (كما في cron)
+"""
+
+from bisect import bisect_left
+from calendar import monthrange
+from dataclasses import dataclass
+from datetime import date, time
+from functools import lru_cache
+from typing import FrozenSet, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # numpy اختياري - mask يتطلبه فقط
+    np = None
+
+MONTH_NAMES = {name: index for index, name in enumerate(
+    ['JAN', 'FEB', 'MAR', 'APR', 'MAY', 'JUN', 'JUL', 'AUG', 'SEP', 'OCT', 'NOV', 'DEC'], start=1)}
+WEEKDAY_NAMES = {name: index for index, name in enumerate(['SUN', 'MON', 'TUE', 'WED', 'THU', 'FRI', 'SAT'])}
+
+MACROS = {
+    '@daily': '* * * * *',
+    '@weekly': '* * * * SUN',
+    '@monthly': '* * 1 * *',
+    '@yearly': '* * 1 1 *',
+    '@annually': '* * 1 1 *',
+}
+
+# أقصى عدد أشهر للبحث عن موعد (يكفي لدورة 29 فبراير)
+MAX_SEARCH_MONTHS = 8 * 12
+
+LAST = -1
+
+# أطوال الأشهر في سنة عادية (للحساب المتجه)
+MONTH_LENGTHS = (31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+
+
+def _value(text: str, names: dict) -> int:
+    text = text.strip().upper()
+    if text in names:
+        return names[text]
+    return int(text)
+
+
+def _parse_field(text: str, low: int, high: int, names: Optional[dict] = None) -> FrozenSet[int]:
+    """تحليل حقل cron عادي إلى مجموعة قيم"""
+    names = names or {}
+    values = set()
+    for part in text.split(','):
+        step = 1
+        if '/' in part:
+            part, step_text = part.split('/', 1)
+            step = int(step_text)
+            if step <= 0:
+                raise ValueError(f"خطوة غير صالحة في '{text}'")
+
+        if part == '*':
+            start, end = low, high
+        elif '-' in part:
+            start_text, end_text = part.split('-', 1)
+            start, end = _value(start_text, names), _value(end_text, names)
+        else:
+            start = _value(part, names)
+            end = high if step > 1 else start
+
+        if not low <= start <= end <= high:
+            raise ValueError(f"قيمة خارج النطاق {low}-{high} في '{text}'")
+        values.update(range(start, end + 1, step))
+    return frozenset(values)
+
+
+@dataclass(frozen=True)
+class CronExpression:
+    """تعبير cron مُحلَّل - المطابقة والموعد التالي بدون فحص كل يوم"""
+    source: str
+    time_of_day: Optional[time]
+    months: FrozenSet[int]
+    days: FrozenSet[int]
+    last_day: bool
+    weekdays: FrozenSet[int]                   # 0 = الأحد
+    nth_weekdays: FrozenSet[Tuple[int, int]]   # (يوم الأسبوع، الترتيب) والترتيب LAST = الأخير
+    dom_restricted: bool
+    dow_restricted: bool
+
+    def month_days(self, year: int, month: int) -> Tuple[int, ...]:
+        """أيام الشهر المطابقة مرتبة - تُحسب حسابياً لكل شهر مرة واحدة"""
+        return _month_days(self, year, month)
+
+    def matches(self, check_date: date) -> bool:
+        return (check_date.month in self.months
+                and check_date.day in self.month_days(check_date.year, check_date.month))
+
+    def next_on_or_after(self, check_date: date) -> Optional[date]:
+        """أول تاريخ مطابق في أو بعد check_date: القفز مباشرة بين الأشهر المسموحة"""
+        year, month, day = check_date.year, check_date.month, check_date.day
+        for _ in range(MAX_SEARCH_MONTHS):
+            if month in self.months:
+                days = self.month_days(year, month)
+                index = bisect_left(days, day)
+                if index < len(days):
+                    return date(year, month, days[index])
+            month, day = month + 1, 1
+            if month > 12:
+                month, year = 1, year + 1
+        return None
+
+    def mask(self, ordinals, year, month, day):
+        """قناع متجه (numpy) لمصفوفات الأيام"""
+        leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+        length = np.array(MONTH_LENGTHS, dtype=np.int64)[month - 1] + ((month == 2) & leap)
+        weekday = ordinals % 7  # toordinal: الاثنين = 1، الأحد = 0
+
+        dom = np.isin(day, np.array(sorted(self.days), dtype=np.int64))
+        if self.last_day:
+            dom |= day == length
+
+        dow = np.isin(weekday, np.array(sorted(self.weekdays), dtype=np.int64))
+        for weekday_value, nth in self.nth_weekdays:
+            if nth == LAST:
+                dow |= (weekday == weekday_value) & (day + 7 > length)
+            else:
+                dow |= (weekday == weekday_value) & ((day - 1) // 7 + 1 == nth)
+
+        if self.dom_restricted and self.dow_restricted:
+            days_ok = dom | dow
+        elif self.dom_restricted:
+            days_ok = dom
+        elif self.dow_restricted:
+            days_ok = dow
+        else:
+            days_ok = np.ones(len(ordinals), dtype=bool)
+        return days_ok & np.isin(month, np.array(sorted(self.months), dtype=np.int64))
+
+
+@lru_cache(maxsize=2048)
+def _month_days(expression: CronExpression, year: int, month: int) -> Tuple[int, ...]:
+    first_weekday, length = monthrange(year, month)
+    first_weekday = (first_weekday + 1) % 7  # monthrange: الاثنين = 0
+
+    dom = {d for d in expression.days if d <= length}
+    if expression.last_day:
+        dom.add(length)
+
+    dow = set()
+    for weekday in expression.weekdays:
+        dow.update(range((weekday - first_weekday) % 7 + 1, length + 1, 7))
+    for weekday, nth in expression.nth_weekdays:
+        first = (weekday - first_weekday) % 7 + 1
+        day = first + 7 * ((length - first) // 7) if nth == LAST else first + 7 * (nth - 1)
+        if day <= length:
+            dow.add(day)
+
+    if expression.dom_restricted and expression.dow_restricted:
+        result = dom | dow
+    elif expression.dom_restricted:
+        result = dom
+    elif expression.dow_restricted:
+        result = dow
+    else:
+        result = range(1, length + 1)
+    return tuple(sorted(result))
+
+
+def _parse_time(minute_text: str, hour_text: str, source: str) -> Optional[time]:
+    if minute_text == '*' and hour_text == '*':
+        return None
+    minutes = _parse_field(minute_text, 0, 59)
+    hours = _parse_field(hour_text, 0, 23)
+    if len(minutes) != 1 or len(hours) != 1:
+        raise ValueError(f"التعبير '{source}' يجب أن يحدد وقتاً واحداً في اليوم")
+    return time(next(iter(hours)), next(iter(minutes)))
+
+
+def _parse_weekdays(text: str) -> Tuple[FrozenSet[int], FrozenSet[Tuple[int, int]]]:
+    plain, nth = [], set()
+    for part in text.split(','):
+        upper = part.strip().upper()
+        if '#' in upper:
+            weekday_text, nth_text = upper.split('#', 1)
+            weekday = _value(weekday_text, WEEKDAY_NAMES) % 7
+            position = LAST if nth_text == 'L' else int(nth_text)
+            if position != LAST and not 1 <= position <= 5:
+                raise ValueError(f"ترتيب غير صالح في '{part}'")
+            nth.add((weekday, position))
+        elif upper.endswith('L') and upper != 'L':
+            nth.add((_value(upper[:-1], WEEKDAY_NAMES) % 7, LAST))
+        else:
+            plain.append(upper)
+    weekdays = frozenset(d % 7 for d in _parse_field(','.join(plain), 0, 7, WEEKDAY_NAMES)) if plain else frozenset()
+    return weekdays, frozenset(nth)
+
+
+def parse_cron(source: str) -> CronExpression:
+    """تحليل تعبير cron (أو @daily/@weekly/@monthly/@yearly) - يرفع ValueError عند الخطأ"""
+    fields = MACROS.get(source.strip().lower(), source).split()
+    if len(fields) != 5:
+        raise ValueError(f"تعبير cron يحتاج 5 حقول: '{source}'")
+    minute_text, hour_text, dom_text, month_text, dow_text = fields
+
+    dom_parts = [part for part in dom_text.split(',') if part.upper() != 'L']
+    last_day = len(dom_parts) != len(dom_text.split(','))
+    days = _parse_field(','.join(dom_parts), 1, 31) if dom_parts else frozenset()
+
+    weekdays, nth_weekdays = _parse_weekdays(dow_text)
+
+    return CronExpression(
+        source=source,
+        time_of_day=_parse_time(minute_text, hour_text, source),
+        months=_parse_field(month_text, 1, 12, MONTH_NAMES),
+        days=days,
+        last_day=last_day,
+        weekdays=weekdays,
+        nth_weekdays=nth_weekdays,
+        dom_restricted=dom_text != '*',
+        dow_restricted=dow_text != '*',
+    )
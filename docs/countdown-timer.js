@@ -204,6 +204,8 @@ class FarmNotifierCountdown {
 
             if (data.success) {
                 this.nextNotification = data.next_notification;
+                // الوقت المطلق للموعد (ثواني Unix) - الوقت المتبقي يُحسب محلياً
+                this.targetEpoch = data.target_epoch || null;
                 this.updateDisplay();
             } else {
                 this.showError(data.error || 'خطأ في جلب البيانات');
@@ -235,7 +237,7 @@ class FarmNotifierCountdown {
         if (!this.nextNotification) return;
 
         const now = new Date();
-        const targetTime = new Date(this.nextNotification.datetime);
+        const targetTime = this.targetEpoch ? new Date(this.targetEpoch * 1000) : new Date(this.nextNotification.datetime);
         const timeDiff = targetTime - now;
 
         if (timeDiff <= 0) {
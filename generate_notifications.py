@@ -4,30 +4,72 @@
 Generate notifications JSON file for GitHub Pages
 """
 
+import heapq
 import json
 import os
-from datetime import datetime, date, timedelta
-from typing import Dict, List
+import sys
+from calendar import monthrange
+from datetime import datetime, date, time, timedelta
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 
 # استيراد منطق المزرعة
+import cronexpr
+import notifications
+import schedule
 from logic import FarmLogic
+from notifications import NotificationCache, build_notification, file_digest, rollup_notifications
+from schedule import RecurringRule, ScheduledEvent, parse_time, rule_fingerprints
+
+# أوقات مهام الأمثلة التي لا تأتي من config.json (المهام المشتقة تأتي من derived_tasks)
+VITAMINS_TIME = parse_time('09:00')
+COCCIDIOSIS_TIME = parse_time('09:30')
+
+# ترتيب التدفقات عند تساوي الوقت: مهام الأمثلة قبل مهام FarmLogic
+VITAMINS_RANK = 2
+COCCIDIOSIS_RANK = 3
+LOGIC_RANK = 10
+
+# بصمات القواعد وإشعارات كل قاعدة بجانب docs/notifications.json (للتحديث التزايدي)
+FINGERPRINTS_FILE = 'docs/notifications.fingerprints.json'
+FINGERPRINTS_VERSION = 1
+
+
+def code_digest() -> str:
+    """بصمة ملفات الكود التي تحدد المواعيد والإشعارات - تغيرها يلغي البصمات المحفوظة"""
+    paths = [module.__file__ for module in (schedule, cronexpr, notifications)] + [__file__]
+    return ':'.join(file_digest(path)[:16] for path in paths)
+
+class DayOfMonthRule(RecurringRule):
+    """قاعدة مثال: الأيام التي يقبل رقمها القسمة على step في كل شهر"""
+
+    def __init__(self, step: int):
+        self.step = step
+
+    def next_on_or_after(self, check_date: date) -> Optional[date]:
+        day = -(-check_date.day // self.step) * self.step
+        days_in_month = monthrange(check_date.year, check_date.month)[1]
+        if day <= days_in_month:
+            return check_date.replace(day=day)
+        # الانتقال إلى أول مضاعف في الشهر التالي
+        if check_date.month == 12:
+            return date(check_date.year + 1, 1, self.step)
+        return date(check_date.year, check_date.month + 1, self.step)
+
 
 class StaticNotificationGenerator:
-    def __init__(self):
-        self.logic = FarmLogic()
+    def __init__(self, logic: Optional[FarmLogic] = None):
+        # يمكن تمرير FarmLogic من app.py لإعادة استخدام المواعيد المحسوبة في نفس التشغيل
+        self.logic = logic or FarmLogic()
+        # بصمة الذاكرة من ملف إعدادات نفس المزرعة (وليس config.json الافتراضي)
+        self.cache = NotificationCache(self.logic.config_path)
 
     def generate_notifications_json(self, days_ahead: int = 30) -> Dict:
         """إنشاء ملف JSON للإشعارات القادمة"""
-        notifications = []
-        today = date.today()
-
-        for i in range(days_ahead):
-            check_date = today + timedelta(days=i)
-            day_notifications = self._get_notifications_for_date(check_date)
-            notifications.extend(day_notifications)
-
-        # ترتيب حسب التاريخ والوقت
-        notifications.sort(key=lambda x: x['datetime'])
+        first_day = date.today()
+        start = datetime.combine(first_day, time.min)
+        end = start + timedelta(days=days_ahead)
+        notifications = self.cache.get_days(first_day, days_ahead, self._evaluate_date,
+                                            prepare=lambda: self.logic.events_between(start, end))
 
         # إنشاء بيانات العداد التنازلي
         countdown_data = self._generate_countdown_data(notifications)
@@ -36,182 +78,154 @@ class StaticNotificationGenerator:
             'generated_at': datetime.now().isoformat(),
             'upcoming_notifications': notifications,
             'countdown': countdown_data,
-            'total_count': len(notifications)
+            'total_count': len(notifications),
+            'rollup': rollup_notifications(notifications)
         }
 
+    def generate_incremental(self, previous: Optional[Dict],
+                             days_ahead: int = 30) -> Tuple[Dict, Dict, List[str]]:
+        """مثل generate_notifications_json لكن بإعادة حساب القواعد المتغيرة فقط.
+
+        previous: محتوى ملف البصمات من التشغيل السابق (أو None). إشعارات القواعد التي لم تتغير
+        بصمتها تُنقل كما هي للأيام المشتركة بين الفترتين، ولا يُحسب لها إلا الأيام الجديدة.
+        يعيد (البيانات، محتوى ملف البصمات الجديد، أسماء القواعد المعاد حسابها بالكامل).
+        """
+        first_day = self.logic.today()
+        start = datetime.combine(first_day, time.min)
+        end = start + timedelta(days=days_ahead)
+        fingerprints = rule_fingerprints(self.logic.config, self.logic.schedule)
+
+        cached = {}
+        if previous and previous.get('version') == FINGERPRINTS_VERSION and previous.get('code') == code_digest():
+            cached = previous.get('rules', {})
+            old_start = datetime.fromisoformat(previous['start'])
+            old_end = datetime.fromisoformat(previous['end'])
+
+        changed = [key for key, fingerprint in fingerprints.items()
+                   if cached.get(key, {}).get('fingerprint') != fingerprint]
+        unchanged = [key for key in fingerprints if key not in changed]
+        per_rule: Dict[str, List[Dict]] = {key: [] for key in fingerprints}
+        windows = [(start, end, changed)]
+
+        if unchanged:
+            # الجزء المشترك يُنقل من التشغيل السابق، والأيام خارج الفترة السابقة تُحسب
+            kept_start, kept_end = max(start, old_start), min(end, old_end)
+            for key in unchanged:
+                per_rule[key] = [n for n in cached[key]['notifications']
+                                 if kept_start <= datetime.fromisoformat(n['datetime']) < kept_end]
+            windows.append((start, min(end, max(start, old_start)), unchanged))
+            windows.append((max(start, min(end, old_end)), end, unchanged))
+
+        for window_start, window_end, keys in windows:
+            if keys and window_start < window_end:
+                for event in self.logic.schedule.events_between(window_start, window_end, keys):
+                    notification = self._build_notification(event)
+                    if notification:
+                        per_rule[event.rule_key].append(notification)
+
+        order = {rule.key: index for index, rule in enumerate(self.logic.schedule.rules())}
+        logic_items = sorted(((datetime.fromisoformat(n['datetime']), LOGIC_RANK + order[key], n)
+                              for key, items in per_rule.items() for n in items), key=lambda item: item[:2])
+        notifications = [n for _, _, n in self._merge(iter(logic_items), start, end)]
+
+        data = {
+            'generated_at': datetime.now().isoformat(),
+            'upcoming_notifications': notifications,
+            'countdown': self._generate_countdown_data(notifications),
+            'total_count': len(notifications),
+            'rollup': rollup_notifications(notifications)
+        }
+        state = {
+            'version': FINGERPRINTS_VERSION,
+            'code': code_digest(),
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'rules': {key: {'fingerprint': fingerprints[key], 'notifications': per_rule[key]}
+                      for key in fingerprints},
+        }
+        return data, state, changed
+
+    def iter_notifications(self, start: datetime, end: Optional[datetime] = None) -> Iterator[Dict]:
+        """تدفق الإشعارات بترتيب زمني: دمج مهام FarmLogic مع المهام المشتقة عبر كومة"""
+        # فترة محددة: تقييم مهام FarmLogic دفعة واحدة عبر مصفوفة المواعيد
+        events = self.logic.iter_events(start) if end is None else self.logic.events_between(start, end)
+        for _, _, notification in self._merge(self._logic_stream(events), start, end):
+            yield notification
+
+    def _merge(self, logic_stream: Iterator[Tuple[datetime, int, Dict]], start: datetime,
+               end: Optional[datetime]) -> Iterator[Tuple[datetime, int, Dict]]:
+        streams = [logic_stream]
+
+        # فيتامينات وكوكسيديا (أمثلة كل 15 و 20 يوماً من الشهر)
+        streams.append(self._day_of_month_stream(
+            DayOfMonthRule(15), VITAMINS_TIME, VITAMINS_RANK, self._vitamins_notification, start))
+        streams.append(self._day_of_month_stream(
+            DayOfMonthRule(20), COCCIDIOSIS_TIME, COCCIDIOSIS_RANK, self._coccidiosis_notification, start))
+
+        for item in heapq.merge(*streams, key=lambda item: item[:2]):
+            when = item[0]
+            if end is not None and when >= end:
+                return
+            yield item
+
     def _get_notifications_for_date(self, check_date: date) -> List[Dict]:
         """جلب إشعارات يوم محدد"""
-        notifications = []
-
-        # فحص دواء الديدان
-        if self._should_deworm_on_date(check_date):
-            drug = self._get_deworm_drug_for_date(check_date)
-            notifications.append({
-                'type': 'deworming',
-                'title_ar': f'دواء الديدان - {drug}',
-                'title_bn': f'কৃমির ঔষধ - {drug}',
-                'date': check_date.isoformat(),
-                'time': '08:00',
-                'datetime': datetime.combine(check_date, datetime.strptime('08:00', '%H:%M').time()).isoformat(),
-                'priority': 'high',
-                'icon': '🪱',
-                'drug': drug
-            })
-
-            # إضافة الفيتامينات بعد يوم من دواء الديدان
-            next_day = check_date + timedelta(days=1)
-            notifications.append({
-                'type': 'vitamins',
-                'title_ar': 'فيتامينات وإلكتروليت - دعم بعد دواء الديدان',
-                'title_bn': 'ভিটামিন ও ইলেক্ট্রোলাইট - কৃমির ঔষধের পর সহায়তা',
-                'date': next_day.isoformat(),
-                'time': '08:30',
-                'datetime': datetime.combine(next_day, datetime.strptime('08:30', '%H:%M').time()).isoformat(),
-                'priority': 'medium',
-                'icon': '💊',
-                'reason_ar': 'دعم بعد دواء الديدان',
-                'reason_bn': 'কৃমির ঔষধের পর সহায়তা'
-            })
-
+        return self.cache.get_or_compute(check_date, self._evaluate_date)
+
+    def _evaluate_date(self, check_date: date) -> List[Dict]:
+        start = datetime.combine(check_date, time.min)
+        return list(self.iter_notifications(start, start + timedelta(days=1)))
+
+    def _logic_stream(self, events: Iterable[ScheduledEvent]) -> Iterator[Tuple[datetime, int, Dict]]:
+        for event in events:
+            notification = self._build_notification(event)
+            if notification:
+                yield event.when, LOGIC_RANK + event.order, notification
+
+    def _day_of_month_stream(self, rule: RecurringRule, at: time, rank: int,
+                             build: Callable[[datetime], Dict],
+                             start: datetime) -> Iterator[Tuple[datetime, int, Dict]]:
+        for check_date in rule.occurrences(start.date()):
+            when = datetime.combine(check_date, at)
+            if when >= start:
+                yield when, rank, build(when)
+
+    def _build_notification(self, event: ScheduledEvent) -> Optional[Dict]:
+        """تحويل موعد من FarmLogic إلى إشعار للعرض (التاريخ كنص ISO لملف JSON)"""
+        notification = build_notification(event)
+        if notification:
+            notification['datetime'] = event.when.isoformat()
+        return notification
+
+    def _vitamins_notification(self, when: datetime) -> Dict:
         # إضافة فيتامينات في حالات الطقس القاسي (مثال)
-        if check_date.day % 15 == 0:  # كل 15 يوم كمثال
-            notifications.append({
-                'type': 'vitamins',
-                'title_ar': 'فيتامينات وإلكتروليت - دعم وقائي',
-                'title_bn': 'ভিটামিন ও ইলেক্ট্রোলাইট - প্রতিরোধমূলক সহায়তা',
-                'date': check_date.isoformat(),
-                'time': '09:00',
-                'datetime': datetime.combine(check_date, datetime.strptime('09:00', '%H:%M').time()).isoformat(),
-                'priority': 'medium',
-                'icon': '💊',
-                'reason_ar': 'دعم وقائي',
-                'reason_bn': 'প্রতিরোধমূলক সহায়তা'
-            })
+        return {
+            'type': 'vitamins',
+            'title_ar': 'فيتامينات وإلكتروليت - دعم وقائي',
+            'title_bn': 'ভিটামিন ও ইলেক্ট্রোলাইট - প্রতিরোধমূলক সহায়তা',
+            'date': when.date().isoformat(),
+            'time': when.strftime('%H:%M'),
+            'datetime': when.isoformat(),
+            'priority': 'medium',
+            'icon': '💊',
+            'reason_ar': 'دعم وقائي',
+            'reason_bn': 'প্রতিরোধমূলক সহায়তা'
+        }
 
+    def _coccidiosis_notification(self, when: datetime) -> Dict:
         # إضافة الكوكسيديا في الأيام الرطبة (مثال)
-        if check_date.day % 20 == 0:  # كل 20 يوم كمثال
-            notifications.append({
-                'type': 'coccidiosis',
-                'title_ar': 'وقاية من الكوكسيديا - رطوبة عالية',
-                'title_bn': 'কক্সিডিওসিস প্রতিরোধ - উচ্চ আর্দ্রতা',
-                'date': check_date.isoformat(),
-                'time': '09:30',
-                'datetime': datetime.combine(check_date, datetime.strptime('09:30', '%H:%M').time()).isoformat(),
-                'priority': 'high',
-                'icon': '🦠',
-                'reason_ar': 'رطوبة عالية',
-                'reason_bn': 'উচ্চ আর্দ্রতা'
-            })
-
-        # فحص تطهير الحظيرة
-        if self._should_sanitize_on_date(check_date):
-            notifications.append({
-                'type': 'sanitization',
-                'title_ar': 'تطهير الحظيرة',
-                'title_bn': 'খামার জীবাণুমুক্তকরণ',
-                'date': check_date.isoformat(),
-                'time': '09:00',
-                'datetime': datetime.combine(check_date, datetime.strptime('09:00', '%H:%M').time()).isoformat(),
-                'priority': 'medium',
-                'icon': '🧹'
-            })
-
-        # فحص تنظيف محطة الماء
-        if self._should_clean_water_station_on_date(check_date):
-            notifications.append({
-                'type': 'water_station',
-                'title_ar': 'تنظيف محطة الماء',
-                'title_bn': 'পানি স্টেশন পরিষ্কার',
-                'date': check_date.isoformat(),
-                'time': '10:00',
-                'datetime': datetime.combine(check_date, datetime.strptime('10:00', '%H:%M').time()).isoformat(),
-                'priority': 'medium',
-                'icon': '💧'
-            })
-
-        # فحص التنظيف الأسبوعي
-        if self._should_clean_weekly_on_date(check_date):
-            notifications.append({
-                'type': 'weekly_cleaning',
-                'title_ar': 'التنظيف الأسبوعي',
-                'title_bn': 'সাপ্তাহিক পরিষ্কার',
-                'date': check_date.isoformat(),
-                'time': '11:00',
-                'datetime': datetime.combine(check_date, datetime.strptime('11:00', '%H:%M').time()).isoformat(),
-                'priority': 'medium',
-                'icon': '🧽'
-            })
-
-        # فحص تقليب التراب
-        if self._should_turn_soil_on_date(check_date):
-            notifications.append({
-                'type': 'soil_turning',
-                'title_ar': 'تقليب التراب',
-                'title_bn': 'মাটি নাড়াচাড়া',
-                'date': check_date.isoformat(),
-                'time': '12:00',
-                'datetime': datetime.combine(check_date, datetime.strptime('12:00', '%H:%M').time()).isoformat(),
-                'priority': 'low',
-                'icon': '🌱'
-            })
-
-        # فحص التهوية
-        if self._should_check_ventilation_on_date(check_date):
-            notifications.append({
-                'type': 'ventilation',
-                'title_ar': 'فحص التهوية',
-                'title_bn': 'বায়ুচলাচল পরীক্ষা',
-                'date': check_date.isoformat(),
-                'time': '13:00',
-                'datetime': datetime.combine(check_date, datetime.strptime('13:00', '%H:%M').time()).isoformat(),
-                'priority': 'medium',
-                'icon': '💨'
-            })
-
-        # فحص غسيل المعالف
-        if self._should_clean_feeders_on_date(check_date):
-            notifications.append({
-                'type': 'feeder_cleaning',
-                'title_ar': 'غسيل المعالف',
-                'title_bn': 'খাবার পাত্র পরিষ্কার',
-                'date': check_date.isoformat(),
-                'time': '14:00',
-                'datetime': datetime.combine(check_date, datetime.strptime('14:00', '%H:%M').time()).isoformat(),
-                'priority': 'medium',
-                'icon': '🪣'
-            })
-
-        # فحص السقاية الأنبوبية
-        pipe_tasks = self._get_pipe_waterer_tasks_for_date(check_date)
-        for task in pipe_tasks:
-            notifications.append({
-                'type': f'pipe_waterer_{task}',
-                'title_ar': f'السقاية الأنبوبية - {self._get_pipe_task_name_ar(task)}',
-                'title_bn': f'পাইপ ওয়াটারার - {self._get_pipe_task_name_bn(task)}',
-                'date': check_date.isoformat(),
-                'time': '15:00',
-                'datetime': datetime.combine(check_date, datetime.strptime('15:00', '%H:%M').time()).isoformat(),
-                'priority': 'medium',
-                'icon': '🚰'
-            })
-
-        # فحص تسميد الأشجار
-        fertilizer_tasks = self._get_fertilizer_tasks_for_date(check_date)
-        for task in fertilizer_tasks:
-            notifications.append({
-                'type': 'fertilizer',
-                'title_ar': f'تسميد {task["tree_name_ar"]}',
-                'title_bn': f'{task["tree_name_bn"]} সার প্রয়োগ',
-                'date': check_date.isoformat(),
-                'time': '16:00',
-                'datetime': datetime.combine(check_date, datetime.strptime('16:00', '%H:%M').time()).isoformat(),
-                'priority': 'medium',
-                'icon': '🌳',
-                'tree': task['tree_key'],
-                'fertilizer': task['fertilizer']
-            })
-
-        return notifications
+        return {
+            'type': 'coccidiosis',
+            'title_ar': 'وقاية من الكوكسيديا - رطوبة عالية',
+            'title_bn': 'কক্সিডিওসিস প্রতিরোধ - উচ্চ আর্দ্রতা',
+            'date': when.date().isoformat(),
+            'time': when.strftime('%H:%M'),
+            'datetime': when.isoformat(),
+            'priority': 'high',
+            'icon': '🦠',
+            'reason_ar': 'رطوبة عالية',
+            'reason_bn': 'উচ্চ আর্দ্রতা'
+        }
 
     def _generate_countdown_data(self, notifications: List[Dict]) -> Dict:
         """إنشاء بيانات العداد التنازلي"""
@@ -259,241 +273,77 @@ class StaticNotificationGenerator:
             'current_time': now.isoformat()
         }
 
-    # نسخ الدوال المساعدة من api.py
-    def _should_deworm_on_date(self, check_date: date) -> bool:
-        try:
-            check_date_str = check_date.strftime("%m-%d")
-            deworming_config = self.logic.config['chicken_schedule']['deworming']
-            seasonal_schedule = deworming_config.get('seasonal_schedule', [])
-
-            for schedule_item in seasonal_schedule:
-                if schedule_item['date'] == check_date_str:
-                    return True
-            return False
-        except:
-            return False
-
-    def _get_deworm_drug_for_date(self, check_date: date) -> str:
-        try:
-            check_date_str = check_date.strftime("%m-%d")
-            deworming_config = self.logic.config['chicken_schedule']['deworming']
-            seasonal_schedule = deworming_config.get('seasonal_schedule', [])
-
-            for schedule_item in seasonal_schedule:
-                if schedule_item['date'] == check_date_str:
-                    return schedule_item['drug']
-            return "Fenbendazole"
-        except:
-            return "Fenbendazole"
-
-    def _should_sanitize_on_date(self, check_date: date) -> bool:
-        try:
-            start_date_str = self.logic.config['chicken_schedule']['sanitization']['start_date']
-            start_date = datetime.strptime(start_date_str, "%Y-%m-%d").date()
-            interval = self.logic.config['chicken_schedule']['sanitization']['interval_days']
-
-            days_diff = (check_date - start_date).days
-            return days_diff >= 0 and days_diff % interval == 0
-        except:
-            return False
-
-    def _should_clean_water_station_on_date(self, check_date: date) -> bool:
-        try:
-            config = self.logic.config['chicken_schedule'].get('water_station', {})
-            if not config:
-                return False
-
-            start_date = datetime.strptime(config['start_date'], "%Y-%m-%d").date()
-            interval = config['interval_days']
-            days_diff = (check_date - start_date).days
-
-            return days_diff >= 0 and days_diff % interval == 0
-        except:
-            return False
-
-    def _should_clean_weekly_on_date(self, check_date: date) -> bool:
-        try:
-            config = self.logic.config['chicken_schedule'].get('weekly_cleaning', {})
-            if not config:
-                return False
-
-            start_date = datetime.strptime(config['start_date'], "%Y-%m-%d").date()
-            interval = config['interval_days']
-            days_diff = (check_date - start_date).days
-
-            return days_diff >= 0 and days_diff % interval == 0
-        except:
-            return False
-
-    def _should_turn_soil_on_date(self, check_date: date) -> bool:
-        try:
-            config = self.logic.config['chicken_schedule'].get('soil_turning', {})
-            if not config:
-                return False
-
-            start_date = datetime.strptime(config['start_date'], "%Y-%m-%d").date()
-            interval = config['interval_days']
-            days_diff = (check_date - start_date).days
-
-            return days_diff >= 0 and days_diff % interval == 0
-        except:
-            return False
-
-    def _should_check_ventilation_on_date(self, check_date: date) -> bool:
-        try:
-            config = self.logic.config['chicken_schedule'].get('ventilation', {})
-            if not config:
-                return False
-
-            start_date = datetime.strptime(config['start_date'], "%Y-%m-%d").date()
-            interval = config['interval_days']
-            days_diff = (check_date - start_date).days
-
-            return days_diff >= 0 and days_diff % interval == 0
-        except:
-            return False
-
-    def _should_clean_feeders_on_date(self, check_date: date) -> bool:
-        try:
-            config = self.logic.config['chicken_schedule'].get('feeder_cleaning', {})
-            if not config:
-                return False
-
-            start_date = datetime.strptime(config['start_date'], "%Y-%m-%d").date()
-            interval = config['interval_days']
-            days_diff = (check_date - start_date).days
-
-            return days_diff >= 0 and days_diff % interval == 0
-        except:
-            return False
-
-    def _should_quarantine_on_date(self, check_date: date) -> bool:
-        try:
-            config = self.logic.config['chicken_schedule'].get('quarantine', {})
-            if not config:
-                return False
-
-            start_date = datetime.strptime(config['start_date'], "%Y-%m-%d").date()
-            interval = config['interval_days']
-            days_diff = (check_date - start_date).days
-
-            return days_diff >= 0 and days_diff % interval == 0
-        except:
-            return False
-
-    def _get_pipe_waterer_tasks_for_date(self, check_date: date) -> List[str]:
-        tasks = []
-        try:
-            config = self.logic.config['chicken_schedule'].get('pipe_waterer', {})
-            if not config:
-                return []
-
-            start_date = datetime.strptime(config['start_date'], "%Y-%m-%d").date()
-            intervals = config.get('intervals', {})
-            days_diff = (check_date - start_date).days
-
-            if days_diff < 0:
-                return []
-
-            if days_diff % intervals.get('deep_clean', 30) == 0:
-                tasks.append('deep_clean')
-            elif days_diff % intervals.get('sanitize', 15) == 0:
-                tasks.append('sanitize')
-            elif days_diff % intervals.get('rinse', 7) == 0:
-                tasks.append('rinse')
-            elif days_diff % intervals.get('change_water', 3) == 0:
-                tasks.append('change_water')
-
-            return tasks
-        except:
-            return []
-
-    def _get_pipe_task_name_ar(self, task: str) -> str:
-        names = {
-            'change_water': 'تغيير الماء',
-            'rinse': 'شطف',
-            'sanitize': 'تعقيم',
-            'deep_clean': 'تنظيف عميق'
-        }
-        return names.get(task, task)
-
-    def _get_pipe_task_name_bn(self, task: str) -> str:
-        names = {
-            'change_water': 'পানি পরিবর্তন',
-            'rinse': 'ধোয়া',
-            'sanitize': 'জীবাণুমুক্তকরণ',
-            'deep_clean': 'গভীর পরিষ্কার'
-        }
-        return names.get(task, task)
-
-    def _get_fertilizer_tasks_for_date(self, check_date: date) -> List[Dict]:
-        tasks = []
-        try:
-            tree_names_ar = {
-                'henna': 'الحناء', 'fig': 'التين', 'banana': 'الموز',
-                'mango_small': 'مانجو صغيرة', 'mango_large': 'مانجو كبيرة',
-                'jackfruit_young': 'جاك فروت صغير', 'mint_basil': 'النعناع والحبق',
-                'pomegranate': 'الرمان', 'acacia': 'الأكاسيا', 'bougainvillea': 'الجهنمية',
-                'grape': 'العنب', 'custard_apple': 'القشطة', 'ornamental': 'أشجار الزينة',
-                'moringa': 'المورينجا'
-            }
-
-            tree_names_bn = {
-                'henna': 'মেহেদি', 'fig': 'ডুমুর', 'banana': 'কলা',
-                'mango_small': 'ছোট আম', 'mango_large': 'বড় আম',
-                'jackfruit_young': 'ছোট কাঁঠাল', 'mint_basil': 'পুদিনা ও তুলসী',
-                'pomegranate': 'ডালিম', 'acacia': 'বাবলা', 'bougainvillea': 'বাগানবিলাস',
-                'grape': 'আঙ্গুর', 'custard_apple': 'আতা', 'ornamental': 'শোভাবর্ধনকারী গাছ',
-                'moringa': 'সজনে'
-            }
-
-            # إضافة جدولة تسميد مبسطة للأشجار
-            # تواريخ بداية محسوبة لتظهر خلال الـ30 يوماً القادمة
-            fertilizer_schedule = {
-                'henna': {'interval': 45, 'start_date': date(2025, 10, 15), 'fertilizer': 'NPK 20-20-20'},
-                'fig': {'interval': 60, 'start_date': date(2025, 12, 6), 'fertilizer': 'NPK متوازن'},
-                'banana': {'interval': 30, 'start_date': date(2025, 11, 1), 'fertilizer': 'NPK 30-10-10'},
-                'mango_small': {'interval': 30, 'start_date': date(2025, 11, 29), 'fertilizer': 'NPK 20-20-20'},
-                'mango_large': {'interval': 30, 'start_date': date(2025, 12, 3), 'fertilizer': 'NPK 15-15-15'},
-                'pomegranate': {'interval': 80, 'start_date': date(2025, 12, 5), 'fertilizer': 'NPK 15-15-15'},
-                'grape': {'interval': 70, 'start_date': date(2025, 12, 8), 'fertilizer': 'NPK 12-12-17'},
-                'jackfruit_young': {'interval': 120, 'start_date': date(2025, 12, 10), 'fertilizer': 'NPK 20-20-20'},
-                'acacia': {'interval': 180, 'start_date': date(2025, 12, 12), 'fertilizer': 'Organic'},
-                'bougainvillea': {'interval': 50, 'start_date': date(2025, 10, 25), 'fertilizer': 'High Phosphorus'},
-                'mint_basil': {'interval': 25, 'start_date': date(2025, 11, 18), 'fertilizer': 'NPK 20-20-20'},
-                'moringa': {'interval': 90, 'start_date': date(2025, 12, 15), 'fertilizer': 'Low Nitrogen'},
-                'custard_apple': {'interval': 18, 'start_date': date(2025, 11, 13), 'fertilizer': 'NPK 20-20-20'}
-            }
-
-            # فحص كل شجرة
-            for tree_key, schedule in fertilizer_schedule.items():
-                start_date = schedule['start_date']
-                days_diff = (check_date - start_date).days
-                if days_diff >= 0 and days_diff % schedule['interval'] == 0:
-                    tasks.append({
-                        'tree_key': tree_key,
-                        'tree_name_ar': tree_names_ar.get(tree_key, tree_key),
-                        'tree_name_bn': tree_names_bn.get(tree_key, tree_key),
-                        'fertilizer': schedule['fertilizer']
-                    })
-
-            return tasks
-        except Exception as e:
-            print(f"خطأ في جلب مهام التسميد: {e}")
-            return []
+def _load_json(path: str) -> Optional[Dict]:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"⚠️ تعذر قراءة {path}: {e}")
+        return None
+
+
+def write_notifications_json(generator: StaticNotificationGenerator,
+                             output_file: str = 'docs/notifications.json',
+                             fingerprints_file: Optional[str] = FINGERPRINTS_FILE) -> Dict:
+    """إنشاء بيانات الإشعارات وحفظها في مجلد docs
+
+    مع fingerprints_file يكون التحديث تزايدياً: تُعاد القواعد المتغيرة فقط، ولا يُكتب
+    output_file إذا لم تتغير قائمة الإشعارات ولا موعد العداد التالي (فلا يظهر فرق في git).
+    """
+    if not fingerprints_file:
+        data = generator.generate_notifications_json()
+        with open(output_file, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        return data
+
+    previous_state = _load_json(fingerprints_file)
+    data, state, changed = generator.generate_incremental(previous_state)
+    print(f"[Notifications] قواعد أعيد حسابها: {len(changed)} من {len(state['rules'])}"
+          + (f" ({', '.join(changed)})" if changed and len(changed) < len(state['rules']) else ""))
+
+    if state != previous_state:
+        with open(fingerprints_file, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False, indent=1)
+
+    # الموعد الذي يعد له العداد جزء من المقارنة: بعد حلوله يجب كتابة الموعد التالي
+    previous = _load_json(output_file)
+    if previous and previous.get('upcoming_notifications') == data['upcoming_notifications'] \
+            and previous.get('rollup') == data['rollup'] \
+            and (previous.get('countdown') or {}).get('next_notification') == data['countdown']['next_notification']:
+        print(f"[Notifications] لا تغيير في {output_file} - لم تتم الكتابة")
+        return previous
+
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    return data
+
+def print_rollup(days_ahead: int = 90):
+    """طباعة ملخص الإشعارات القادمة: كمية كل سماد، الأيام لكل نوع في كل شهر، وأثقل أسبوع"""
+    generator = StaticNotificationGenerator()
+    start = datetime.combine(generator.logic.today(), time.min)
+    rollup = rollup_notifications(generator.iter_notifications(start, start + timedelta(days=days_ahead)))
+
+    print(f"\n📊 ملخص {days_ahead} يوماً: {rollup['total']} إشعار، {rollup['amount_kg']} كغ سماد")
+    print("\n🧪 السماد:")
+    for fertilizer, bucket in sorted(rollup['by_fertilizer'].items()):
+        print(f"   - {fertilizer}: {bucket['amount_kg']} كغ ({bucket['count']} مرة)")
+    print("\n📅 حسب الشهر:")
+    for month, bucket in rollup['by_month'].items():
+        types = '، '.join(f"{task_type}×{count}" for task_type, count in bucket['by_type'].items())
+        print(f"   - {month}: {bucket['count']} ({types})")
+    if rollup['heaviest_week']:
+        heaviest = rollup['heaviest_week']
+        print(f"\n🏋️ أثقل أسبوع: {heaviest['week']} ({heaviest['count']} إشعار، {heaviest['amount_kg']} كغ)")
 
 def main():
     """الدالة الرئيسية"""
     print("إنشاء ملف الإشعارات للاستخدام على GitHub Pages...")
 
     try:
-        generator = StaticNotificationGenerator()
-        data = generator.generate_notifications_json()
-
-        # حفظ الملف في مجلد docs
         output_file = 'docs/notifications.json'
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        data = write_notifications_json(StaticNotificationGenerator(), output_file)
 
         print(f"تم إنشاء {output_file} بنجاح!")
         print(f"عدد الإشعارات: {data['total_count']}")
@@ -509,4 +359,8 @@ def main():
         print(f"خطأ: {e}")
 
 if __name__ == "__main__":
-    main()
+    if len(sys.argv) > 1 and sys.argv[1] == 'rollup':
+        # python generate_notifications.py rollup [عدد الأيام]
+        print_rollup(int(sys.argv[2]) if len(sys.argv) > 2 else 90)
+    else:
+        main()
@@ -1,12 +1,92 @@
-from datetime import datetime, date, timedelta
+from datetime import datetime, date, time, timedelta
+from functools import cached_property
 import json
 import os
-from typing import Dict, List, Optional, Any
+import time as time_module
+from typing import Callable, Dict, Iterator, List, Optional, Any, Union
+
+from schedule import (EventHorizon, OccurrenceMatrix, RecurringRule, ScheduledEvent,
+                      load_or_compile_schedule, schedule_cache_path)
+
+# أقصى عدد أيام فائتة يُعوَّض عند التشغيل (ملف .last_run قديم جداً لا يعني إرسال سنة من المهام)
+CATCH_UP_MAX_DAYS = 14
+
+class EvaluationContext:
+    """سياق تقييم لتشغيل واحد (تاريخ + تقرير طقس): كل شرط يُحسب مرة واحدة ثم يُعاد من الذاكرة"""
+
+    def __init__(self, logic: 'FarmLogic', check_date: Optional[date] = None,
+                 weather_report: Optional[Dict] = None):
+        self.logic = logic
+        self.check_date = check_date or logic.today()
+        self.weather_report = weather_report
+
+    @cached_property
+    def scheduled_deworm(self) -> bool:
+        return self.logic.should_deworm_today(self.check_date)
+
+    @cached_property
+    def should_deworm(self) -> bool:
+        # الموعد الموسمي أو جرعة مشتقة (مثل تكرار الجرعة بعد 14 يوماً)
+        return self.scheduled_deworm or self.derived_deworming is not None
+
+    @cached_property
+    def deworm_drug(self) -> str:
+        if not self.scheduled_deworm and self.derived_deworming and self.derived_deworming.get('drug'):
+            return self.derived_deworming['drug']
+        return self.logic.get_current_deworm_drug(self.check_date)
+
+    @cached_property
+    def derived_tasks(self) -> List[Dict[str, Any]]:
+        return self.logic.get_derived_tasks(self.check_date)
+
+    @cached_property
+    def derived_vitamins(self) -> Optional[Dict[str, Any]]:
+        return next((task for task in self.derived_tasks if task['type'] == 'vitamins'), None)
+
+    @cached_property
+    def derived_deworming(self) -> Optional[Dict[str, Any]]:
+        return next((task for task in self.derived_tasks if task['type'] == 'deworming'), None)
+
+    @cached_property
+    def feed_changed_today(self) -> bool:
+        # قراءة ملف العلامة مرة واحدة فقط في كل تشغيل
+        return self.logic._was_feed_changed_today(self.check_date)
+
+    @cached_property
+    def current_season(self) -> str:
+        return self.logic._get_current_season(self.check_date)
+
+    @cached_property
+    def should_send_vitamins(self) -> bool:
+        return self.logic.should_send_vitamins(self.weather_report, ctx=self)
+
+    @cached_property
+    def should_prevent_coccidiosis(self) -> bool:
+        return bool(self.weather_report) and self.logic.should_prevent_coccidiosis(self.weather_report,
+                                                                                  self.check_date)
+
 
 class FarmLogic:
-    def __init__(self, config_path: str = 'config.json'):
+    def __init__(self, config_path: str = 'config.json', clock: Optional[Callable[[], datetime]] = None,
+                 schedule_cache: bool = True):
+        # الساعة قابلة للحقن (المحاكاة والاختبارات تمرر ساعة خاصة بدل الوقت الحقيقي)
+        self.clock = clock or datetime.now
+        started = time_module.perf_counter()
+        self.config_path = config_path
         self.config = self._load_config(config_path)
+
+        # الجدول المُجمَّع يُحفظ بجانب الإعدادات ويُعاد استخدامه ما دامت بصمتها لم تتغير
+        cache_path = schedule_cache_path(config_path) if schedule_cache else None
+        self.schedule, self.schedule_from_cache = load_or_compile_schedule(self.config, cache_path)
+        self.startup_ms = (time_module.perf_counter() - started) * 1000
+        source = "من الملف المحفوظ" if self.schedule_from_cache else "بتجميع كامل"
+        print(f"[Logic] الجدول جاهز {source} في {self.startup_ms:.1f} ms")
         self.last_run_file = '.last_run'
+        self._horizon: Optional[EventHorizon] = None
+
+    def today(self) -> date:
+        """تاريخ اليوم حسب ساعة المنطق"""
+        return self.clock().date()
 
     def _load_config(self, path: str) -> Dict:
         """تحميل ملف الإعدادات"""
@@ -23,38 +103,61 @@ class FarmLogic:
     def is_date_in_season(self, season_name: str, check_date: Optional[date] = None) -> bool:
         """هل التاريخ داخل الموسم؟"""
         if check_date is None:
-            check_date = date.today()
-
-        season_ranges = self.config['seasons'].get(season_name, [])
-
-        for start_str, end_str in season_ranges:
-            try:
-                start = datetime.strptime(start_str, "%Y-%m-%d").date()
-                end = datetime.strptime(end_str, "%Y-%m-%d").date()
-
-                if start <= check_date <= end:
-                    return True
-            except ValueError as e:
-                print(f"⚠️ خطأ في تحليل تواريخ الموسم {season_name}: {e}")
-                continue
-
-        return False
-
-    def should_deworm_today(self) -> bool:
+            check_date = self.today()
+
+        return self.schedule.in_season(season_name, check_date)
+
+    def next_occurrences(self, rule: Union[str, RecurringRule], after: Optional[date] = None,
+                         n: int = 1) -> List[date]:
+        """أقرب n مواعيد للقاعدة في أو بعد التاريخ after (حساب مباشر دون فحص كل يوم)"""
+        if after is None:
+            after = self.today()
+
+        if isinstance(rule, str):
+            rule_key, rule = rule, self.schedule.rule(rule)
+            if rule is None:
+                print(f"⚠️ القاعدة {rule_key} غير موجودة في الإعدادات")
+                return []
+
+        return rule.next_occurrences(after, n)
+
+    def iter_events(self, start: Optional[datetime] = None) -> Iterator[ScheduledEvent]:
+        """كل المواعيد القادمة بترتيب زمني، تُحسب عند الطلب فقط (تدفق لا نهائي)"""
+        if start is None:
+            start = self.clock()
+        return self.schedule.iter_events(start)
+
+    def events_between(self, start: datetime, end: datetime) -> List[ScheduledEvent]:
+        """كل المواعيد في الفترة [start, end) مرتبة زمنياً (تقييم دفعة واحدة للفترات الطويلة)
+
+        آخر فترة محسوبة تُحفظ، فأي طلب لفترة داخلها (اليوم، العداد، ملف الإشعارات) لا يعيد الحساب.
+        """
+        horizon = self._horizon
+        if horizon is None or not horizon.covers(start, end):
+            events = self.schedule.events_between(start, end)
+            horizon = self._horizon = EventHorizon(start, end, events, [event.when for event in events])
+        return horizon.between(start, end)
+
+    def occurrence_matrix(self, start: Optional[date] = None, days: int = 365) -> OccurrenceMatrix:
+        """مصفوفة (قواعد × أيام) لكل المهام والمواسم - للتخطيط والاختبار على سنوات"""
+        if start is None:
+            start = self.today()
+        return self.schedule.occurrence_matrix(start, days)
+
+    def evaluation_context(self, weather_report: Optional[Dict] = None,
+                           check_date: Optional[date] = None) -> EvaluationContext:
+        """إنشاء سياق تقييم لتشغيل واحد - يُمرَّر إلى دوال تجميع المهام"""
+        return EvaluationContext(self, check_date, weather_report)
+
+    def should_deworm_today(self, check_date: Optional[date] = None) -> bool:
         """هل اليوم هو أحد المواعيد الموسمية المحددة لدواء الديدان؟"""
         try:
-            today = date.today()
-            today_str = today.strftime("%m-%d")
-
-            deworming_config = self.config['chicken_schedule']['deworming']
-            seasonal_schedule = deworming_config.get('seasonal_schedule', [])
+            rule = self.schedule.deworming
+            drug = rule.drug_on(check_date or self.today()) if rule else None
 
-            # البحث عن موعد اليوم في الجدول الموسمي
-            for schedule_item in seasonal_schedule:
-                if schedule_item['date'] == today_str:
-                    drug = schedule_item['drug']
-                    print(f"[Logic] موعد دواء الديدان اليوم - الدواء: {drug}")
-                    return True
+            if drug:
+                print(f"[Logic] موعد دواء الديدان اليوم - الدواء: {drug}")
+                return True
 
             return False
 
@@ -62,61 +165,51 @@ class FarmLogic:
             print(f"❌ خطأ في حساب دواء الديدان: {e}")
             return False
 
-    def get_current_deworm_drug(self) -> str:
+    def get_current_deworm_drug(self, check_date: Optional[date] = None) -> str:
         """يعيد الدواء المحدد لليوم الحالي من الجدول الموسمي"""
         try:
-            today = date.today()
-            today_str = today.strftime("%m-%d")
-
-            deworming_config = self.config['chicken_schedule']['deworming']
-            seasonal_schedule = deworming_config.get('seasonal_schedule', [])
+            rule = self.schedule.deworming
+            if not rule:
+                return "Fenbendazole"  # قيمة افتراضية نهائية
 
             # البحث عن الدواء المطابق لاليوم
-            for schedule_item in seasonal_schedule:
-                if schedule_item['date'] == today_str:
-                    drug = schedule_item['drug']
-                    print(f"[Logic] الدواء الحالي: {drug}")
-                    return drug
+            drug = rule.drug_on(check_date or self.today())
+            if drug:
+                print(f"[Logic] الدواء الحالي: {drug}")
+                return drug
 
             # إذا لم يوجد، إرجع الدواء الأول (قيمة افتراضية)
-            if seasonal_schedule:
-                default_drug = seasonal_schedule[0]['drug']
-                print(f"[Logic] لم يوجد دواء لليوم، الدواء الافتراضي: {default_drug}")
-                return default_drug
-
-            return "Fenbendazole"  # قيمة افتراضية نهائية
+            print(f"[Logic] لم يوجد دواء لليوم، الدواء الافتراضي: {rule.default_drug}")
+            return rule.default_drug
 
         except Exception as e:
             print(f"❌ خطأ في اختيار الدواء: {e}")
             return "Fenbendazole"
 
-    def should_fertilize_tree(self, tree_key: str, weather_report: Optional[Dict] = None) -> bool:
+    def should_fertilize_tree(self, tree_key: str, weather_report: Optional[Dict] = None,
+                              check_date: Optional[date] = None) -> bool:
         """هل يجب تسميد الشجرة اليوم؟"""
         try:
-            tree = self.config['trees_fertilizer_schedule'].get(tree_key)
+            check_date = check_date or self.today()
+            tree = self.schedule.trees.get(tree_key)
             if not tree:
                 print(f"⚠️ شجرة {tree_key} غير موجودة في الإعدادات")
                 return False
 
             print(f"[Logic] فحص تسميد {tree_key}...")
 
-            # شرط 1: الفاصل الزمني (Interval)
-            date_ok = False
-            if 'start_date' in tree and 'interval_days' in tree:
-                start_date = datetime.strptime(tree['start_date'], "%Y-%m-%d").date()
-                interval = tree['interval_days']
-                days_diff = (date.today() - start_date).days
-
-                if days_diff >= 0 and days_diff % interval == 0:
-                    date_ok = True
-                    print(f"[Logic] {tree_key} موعد التسميد الدوري (كل {interval} يوم)")
-
-            # دعم التواريخ المحددة يدوياً (Legacy)
-            elif 'dates' in tree:
-                today_str = date.today().strftime("%Y-%m-%d")
-                if today_str in tree['dates']:
-                    date_ok = True
-                    print(f"[Logic] {tree_key} في التاريخ المحدد: {today_str}")
+            # شرط 1: الفاصل الزمني (Interval) أو التواريخ المحددة يدوياً (Legacy)
+            date_ok = tree.occurs_on(check_date)
+            if date_ok:
+                stage = tree.stage_on(check_date)
+                if stage:
+                    print(f"[Logic] {tree_key} موعد التسميد - مرحلة {stage.name} (كل {stage.interval_days} يوم)")
+                elif tree.cron:
+                    print(f"[Logic] {tree_key} موعد التسميد حسب الجدول {tree.cron.source}")
+                elif tree.interval_days:
+                    print(f"[Logic] {tree_key} موعد التسميد الدوري (كل {tree.interval_days} يوم)")
+                else:
+                    print(f"[Logic] {tree_key} في التاريخ المحدد: {check_date}")
 
             # شرط 2: ظروف الطقس
             weather_ok = True
@@ -126,11 +219,11 @@ class FarmLogic:
 
             # شرط 3: درجة الحرارة القصوى
             temp_ok = True
-            if 'max_temp' in tree and weather_report:
+            if tree.max_temp is not None and weather_report:
                 max_temp = weather_report.get('max_temp_48h', 0)
-                if max_temp > tree['max_temp']:
+                if max_temp > tree.max_temp:
                     temp_ok = False
-                    print(f"[Logic] درجة الحرارة {max_temp}°C أعلى من الحد المسموح {tree['max_temp']}°C")
+                    print(f"[Logic] درجة الحرارة {max_temp}°C أعلى من الحد المسموح {tree.max_temp}°C")
 
             # نتيجة نهائية
             result = date_ok and weather_ok and temp_ok
@@ -146,28 +239,37 @@ class FarmLogic:
             print(f"❌ خطأ في فحص تسميد {tree_key}: {e}")
             return False
 
-    def get_fertilizer_details(self, tree_key: str) -> Dict:
+    def get_fertilizer_details(self, tree_key: str, ctx: Optional[EvaluationContext] = None) -> Dict:
         """جلب تفاصيل السماد للشجرة"""
-        tree = self.config['trees_fertilizer_schedule'].get(tree_key, {})
+        tree = self.schedule.trees.get(tree_key)
+        if not tree:
+            return {}
+
+        result = dict(tree.details)
 
         # إرجاع السماد المناسب
-        if 'fertilizer' in tree:
-            return tree
-        elif 'fertilizers' in tree:
+        if not tree.fertilizer and tree.fertilizers:
             # اختيار السماد بناءً على الموسم الحالي
-            current_season = self._get_current_season()
+            current_season = ctx.current_season if ctx else self._get_current_season()
             fertilizer_index = {'spring_season': 0, 'summer': 1, 'autumn_season': 2}.get(current_season, 0)
-            selected_fertilizer = tree['fertilizers'][fertilizer_index % len(tree['fertilizers'])]
-
-            result = tree.copy()
-            result['fertilizer'] = selected_fertilizer
-            return result
-
-        return tree
-
-    def _get_current_season(self) -> str:
+            result['fertilizer'] = tree.fertilizers[fertilizer_index % len(tree.fertilizers)]
+
+        # مرحلة النمو تحدد الفاصل والسماد والكمية حسب عمر الشجرة
+        stage = tree.stage_on(ctx.check_date if ctx else self.today())
+        if stage:
+            result.pop('stages', None)
+            result['stage'] = stage.name
+            result['interval_days'] = stage.interval_days
+            if stage.fertilizer:
+                result['fertilizer'] = stage.fertilizer
+            if stage.amount_kg is not None:
+                result['amount_kg'] = stage.amount_kg
+
+        return result
+
+    def _get_current_season(self, check_date: Optional[date] = None) -> str:
         """تحديد الموسم الحالي"""
-        today = date.today()
+        today = check_date or self.today()
 
         if self.is_date_in_season('spring_season', today):
             return 'spring_season'
@@ -180,14 +282,16 @@ class FarmLogic:
         else:
             return 'unknown'
 
-    def should_send_vitamins(self, weather_report: Optional[Dict] = None) -> bool:
+    def should_send_vitamins(self, weather_report: Optional[Dict] = None,
+                             ctx: Optional[EvaluationContext] = None) -> bool:
         """هل نرسل تنبيه الفيتامينات؟ (تعمل حتى بدون بيانات طقس)"""
         try:
-            triggers = self.config['chicken_schedule']['vitamins']['trigger_conditions']
+            ctx = ctx or self.evaluation_context(weather_report)
+            triggers = self.schedule.vitamin_triggers
             reasons = []
 
-            # التحقق من الشروط التي تعتمد على الطقس (فقط إذا توفر التقرير)
-            if weather_report:
+            # التحقق من الشروط التي تعتمد على الطقس (فقط إذا توفر التقرير وخارج فترات التوقف)
+            if weather_report and not self._blocked_by_blackout(ctx.check_date, 'الفيتامينات'):
                 if 'heat_wave' in triggers and weather_report.get('heat_wave'):
                     reasons.append("heat_wave")
                     print("[Logic] تم كشف موجة حر")
@@ -196,13 +300,13 @@ class FarmLogic:
                     reasons.append("cold_wave")
                     print("[Logic] تم كشف موجة برد")
 
-            # التحقق من الشروط التي لا تعتمد على الطقس
-            if 'post_deworming' in triggers and self._was_deworming_yesterday():
+            # التحقق من الشروط التي لا تعتمد على الطقس (فيتامينات مشتقة من مهمة أخرى، مثل ما بعد دواء الديدان)
+            if 'post_deworming' in triggers and ctx.derived_vitamins:
                 reasons.append("post_deworming")
-                print("[Logic] أمس كان موعد دواء الديدان")
+                print(f"[Logic] فيتامينات مشتقة من {ctx.derived_vitamins['derived_from']} ({ctx.derived_vitamins['source_date']})")
 
             # التحقق من شرط تغيير الغذاء (الجديد والمكتمل)
-            if 'feed_change' in triggers and self._was_feed_changed_today():
+            if 'feed_change' in triggers and ctx.feed_changed_today:
                 reasons.append("feed_change")
                 print("[Logic] تم تسجيل تغيير الغذاء اليوم")
 
@@ -216,38 +320,46 @@ class FarmLogic:
             print(f"❌ خطأ في فحص الفيتامينات: {e}")
             return False
 
-    def _was_deworming_yesterday(self) -> bool:
-        """هل أمس كان موعد دواء الديدان؟"""
+    def get_derived_tasks(self, check_date: Optional[date] = None) -> List[Dict[str, Any]]:
+        """المهام المشتقة المستحقة في التاريخ (قسم derived_tasks في الإعدادات)"""
+        check_date = check_date or self.today()
+        tasks = []
         try:
-            yesterday = date.today() - timedelta(days=1)
-            yesterday_str = yesterday.strftime("%m-%d")
-
-            deworming_config = self.config['chicken_schedule']['deworming']
-            seasonal_schedule = deworming_config.get('seasonal_schedule', [])
-
-            # البحث عن موعد أمس في الجدول الموسمي
-            for schedule_item in seasonal_schedule:
-                if schedule_item['date'] == yesterday_str:
-                    print(f"[Logic] أمس كان موعد دواء الديدان: {schedule_item['drug']}")
-                    return True
+            for rule in self.schedule.derived.values():
+                if rule.occurs_on(check_date):
+                    task_type, details = rule.describe(check_date)
+                    print(f"[Logic] مهمة مشتقة {rule.key} اليوم (من {details['derived_from']} بتاريخ {details['source_date']})")
+                    tasks.append({'type': task_type, 'derived': rule.key, **details})
+        except Exception as e:
+            print(f"⚠️ خطأ في حساب المهام المشتقة: {e}")
+        return tasks
 
-            return False
+    def _blocked_by_blackout(self, check_date: date, task_name: str) -> bool:
+        """هل تمنع فترة توقف عامة مهمة يطلقها الطقس اليوم؟
 
-        except Exception as e:
-            print(f"⚠️ خطأ في التحقق من دواء الديدان بالأمس: {e}")
-            return False
+        هذه المهام لا موعد أصلي لها يُنقل، لذلك تُلغى داخل الفترة مهما كانت سياستها
+        وتُفحص شروطها من جديد بعد انتهائها.
+        """
+        window = self.schedule.blackout_on(check_date)
+        if window is not None:
+            print(f"[Logic] {task_name}: فترة توقف ({window.policy}) حتى {window.end} - لا تنبيه بسبب الطقس")
+        return window is not None
 
-    def _was_feed_changed_today(self) -> bool:
+    def _was_feed_changed_today(self, check_date: Optional[date] = None) -> bool:
         """هل تم تسجيل تغيير الغذاء لليوم الحالي؟"""
         try:
             flag_file = '.feed_changed_today'
             if os.path.exists(flag_file):
                 with open(flag_file, 'r') as f:
-                    last_change_date = f.read().strip()
+                    last_change_date = date.fromisoformat(f.read().strip())
 
                 # يتحقق إذا كان التاريخ المسجل هو تاريخ اليوم
-                if last_change_date == date.today().strftime('%Y-%m-%d'):
-                    return True
+                today = check_date or self.today()
+                window = self.schedule.blackout_on(last_change_date)
+                if window is None:
+                    return last_change_date == today and self.schedule.blackout_on(today) is None
+                # تغيير مسجل داخل فترة توقف: shift_next ينقل التنبيه لأول يوم بعدها، وباقي السياسات تلغيه
+                return window.policy == 'shift_next' and today == window.end + timedelta(days=1)
         except Exception as e:
             print(f"⚠️ خطأ في التحقق من تغيير الغذاء: {e}")
         return False
@@ -257,18 +369,19 @@ class FarmLogic:
         try:
             flag_file = '.feed_changed_today'
             with open(flag_file, 'w') as f:
-                f.write(date.today().strftime('%Y-%m-%d'))
+                f.write(self.today().strftime('%Y-%m-%d'))
             print(f"[Logic] تم تسجيل تغيير الغذاء بتاريخ اليوم.")
         except Exception as e:
             print(f"❌ خطأ في تسجيل تغيير الغذاء: {e}")
 
-    def should_prevent_coccidiosis(self, weather_report: Optional[Dict] = None) -> bool:
+    def should_prevent_coccidiosis(self, weather_report: Optional[Dict] = None,
+                                   check_date: Optional[date] = None) -> bool:
         """هل يجب الوقاية من الكوكسيديا؟"""
         try:
-            if not weather_report:
+            if not weather_report or self._blocked_by_blackout(check_date or self.today(), 'الكوكسيديا'):
                 return False
 
-            triggers = self.config['chicken_schedule']['coccidiosis']['trigger_conditions']
+            triggers = self.schedule.coccidiosis_triggers
 
             # فحص الرطوبة العالية
             if 'high_humidity' in triggers and weather_report.get('high_humidity'):
@@ -288,20 +401,14 @@ class FarmLogic:
             print(f"❌ خطأ في فحص الكوكسيديا: {e}")
             return False
 
-    def should_sanitize_coop(self) -> bool:
+    def should_sanitize_coop(self, check_date: Optional[date] = None) -> bool:
         """هل اليوم موعد تطهير الحظيرة؟"""
         try:
-            start_date_str = self.config['chicken_schedule']['sanitization']['start_date']
-            start_date = datetime.strptime(start_date_str, "%Y-%m-%d").date()
-            interval = self.config['chicken_schedule']['sanitization']['interval_days']
-
-            today = date.today()
-            days_diff = (today - start_date).days
-
-            should_sanitize = days_diff % interval == 0
+            rule = self.schedule.intervals.get('sanitization')
+            should_sanitize = rule is not None and rule.occurs_on(check_date or self.today())
 
             if should_sanitize:
-                print(f"[Logic] موعد تطهير الحظيرة اليوم - آخر مرة: {start_date}, الفاصل: {interval} يوم")
+                print(f"[Logic] موعد تطهير الحظيرة اليوم ({rule.summary})")
 
             return should_sanitize
 
@@ -309,24 +416,21 @@ class FarmLogic:
             print(f"❌ خطأ في حساب تطهير الحظيرة: {e}")
             return False
 
-    def should_clean_water_station(self, weather_report: Optional[Dict] = None) -> bool:
+    def should_clean_water_station(self, weather_report: Optional[Dict] = None,
+                                   check_date: Optional[date] = None) -> bool:
         """هل يجب تنظيف محطة الماء؟"""
         try:
-            config = self.config['chicken_schedule'].get('water_station', {})
-            if not config: return False
+            rule = self.schedule.intervals.get('water_station')
+            if not rule: return False
 
             # شرط 1: الفاصل الزمني
-            start_date = datetime.strptime(config['start_date'], "%Y-%m-%d").date()
-            interval = config['interval_days']
-            days_diff = (date.today() - start_date).days
-            is_time = days_diff % interval == 0
-
-            if is_time:
-                print(f"[Logic] موعد تنظيف محطة الماء (كل {interval} يوم)")
+            if rule.occurs_on(check_date or self.today()):
+                print(f"[Logic] موعد تنظيف محطة الماء ({rule.summary})")
                 return True
 
-            # شرط 2: موجة حر قوية (طحالب)
-            if weather_report and weather_report.get('heat_wave'):
+            # شرط 2: موجة حر قوية (طحالب) - إلا داخل فترة توقف
+            if weather_report and weather_report.get('heat_wave') \
+                    and not self._blocked_by_blackout(check_date or self.today(), 'محطة الماء'):
                 print("[Logic] موجة حر - تنظيف محطة الماء ضروري (طحالب)")
                 return True
 
@@ -335,49 +439,33 @@ class FarmLogic:
             print(f"❌ خطأ في فحص محطة الماء: {e}")
             return False
 
-    def get_pipe_waterer_maintenance(self) -> List[str]:
+    def get_pipe_waterer_maintenance(self, check_date: Optional[date] = None) -> List[str]:
         """ما هي صيانة السقاية الأنبوبية اليوم؟"""
-        tasks = []
         try:
-            config = self.config['chicken_schedule'].get('pipe_waterer', {})
-            if not config: return []
-
-            start_date = datetime.strptime(config['start_date'], "%Y-%m-%d").date()
-            intervals = config.get('intervals', {})
-            days_diff = (date.today() - start_date).days
-
-            # فحص كل نوع صيانة
-            if days_diff % intervals.get('deep_clean', 30) == 0:
-                tasks.append('deep_clean')
-            elif days_diff % intervals.get('sanitize', 15) == 0:
-                tasks.append('sanitize')
-            elif days_diff % intervals.get('rinse', 7) == 0:
-                tasks.append('rinse')
-            elif days_diff % intervals.get('change_water', 3) == 0:
-                tasks.append('change_water')
-
-            return tasks
+            rule = self.schedule.pipe_waterer
+            if not rule: return []
+
+            # فحص كل نوع صيانة (الأولوية للأعلى)
+            task = rule.task_on(check_date or self.today())
+            return [task] if task else []
         except Exception as e:
             print(f"❌ خطأ في فحص السقاية الأنبوبية: {e}")
             return []
 
-    def should_clean_coop_weekly(self, weather_report: Optional[Dict] = None) -> bool:
+    def should_clean_coop_weekly(self, weather_report: Optional[Dict] = None,
+                                 check_date: Optional[date] = None) -> bool:
         """هل يجب التنظيف الأسبوعي للحظيرة؟"""
         try:
-            config = self.config['chicken_schedule'].get('weekly_cleaning', {})
-            if not config: return False
+            rule = self.schedule.intervals.get('weekly_cleaning')
+            if not rule: return False
 
             # إلغاء إذا كانت الرطوبة عالية جداً (طين)
             if weather_report and weather_report.get('high_humidity'):
                 print("[Logic] تأجيل التنظيف الأسبوعي بسبب الرطوبة العالية")
                 return False
 
-            start_date = datetime.strptime(config['start_date'], "%Y-%m-%d").date()
-            interval = config['interval_days']
-            days_diff = (date.today() - start_date).days
-
-            if days_diff % interval == 0:
-                print(f"[Logic] موعد التنظيف الأسبوعي (كل {interval} يوم)")
+            if rule.occurs_on(check_date or self.today()):
+                print(f"[Logic] موعد التنظيف الأسبوعي ({rule.summary})")
                 return True
 
             return False
@@ -385,112 +473,106 @@ class FarmLogic:
             print(f"❌ خطأ في فحص التنظيف الأسبوعي: {e}")
             return False
 
-    def should_turn_soil(self) -> bool:
+    def should_turn_soil(self, check_date: Optional[date] = None) -> bool:
         """هل يجب تقليب التراب؟"""
         try:
-            config = self.config['chicken_schedule'].get('soil_turning', {})
-            if not config: return False
-
-            start_date = datetime.strptime(config['start_date'], "%Y-%m-%d").date()
-            interval = config['interval_days']
-            days_diff = (date.today() - start_date).days
+            rule = self.schedule.intervals.get('soil_turning')
+            if not rule: return False
 
-            if days_diff % interval == 0:
-                print(f"[Logic] موعد تقليب التراب (كل {interval} يوم)")
+            if rule.occurs_on(check_date or self.today()):
+                print(f"[Logic] موعد تقليب التراب ({rule.summary})")
                 return True
             return False
         except Exception as e:
             print(f"❌ خطأ في فحص تقليب التراب: {e}")
             return False
 
-    def should_check_ventilation(self, weather_report: Optional[Dict] = None) -> bool:
+    def should_check_ventilation(self, weather_report: Optional[Dict] = None,
+                                 check_date: Optional[date] = None) -> bool:
         """هل يجب فحص التهوية؟"""
         try:
-            config = self.config['chicken_schedule'].get('ventilation', {})
-            if not config: return False
+            rule = self.schedule.intervals.get('ventilation')
+            if not rule: return False
 
-            # شرط الطقس الحار جداً أو البارد جداً (إغلاق/فتح)
-            if weather_report and (weather_report.get('heat_wave') or weather_report.get('cold_wave')):
+            # شرط الطقس الحار جداً أو البارد جداً (إغلاق/فتح) - إلا داخل فترة توقف
+            if weather_report and (weather_report.get('heat_wave') or weather_report.get('cold_wave')) \
+                    and not self._blocked_by_blackout(check_date or self.today(), 'التهوية'):
                 print("[Logic] فحص التهوية ضروري بسبب الطقس المتطرف")
                 return True
 
-            start_date = datetime.strptime(config['start_date'], "%Y-%m-%d").date()
-            interval = config['interval_days']
-            days_diff = (date.today() - start_date).days
-
-            if days_diff % interval == 0:
-                print(f"[Logic] موعد فحص التهوية الدوري (كل {interval} يوم)")
+            if rule.occurs_on(check_date or self.today()):
+                print(f"[Logic] موعد فحص التهوية الدوري ({rule.summary})")
                 return True
             return False
         except Exception as e:
             print(f"❌ خطأ في فحص التهوية: {e}")
             return False
 
-    def should_deep_clean_feeders(self) -> bool:
+    def should_deep_clean_feeders(self, check_date: Optional[date] = None) -> bool:
         """هل يجب غسيل المعالف العميق؟"""
         try:
-            config = self.config['chicken_schedule'].get('feeder_cleaning', {})
-            if not config: return False
-
-            start_date = datetime.strptime(config['start_date'], "%Y-%m-%d").date()
-            interval = config['interval_days']
-            days_diff = (date.today() - start_date).days
+            rule = self.schedule.intervals.get('feeder_cleaning')
+            if not rule: return False
 
-            if days_diff % interval == 0:
-                print(f"[Logic] موعد غسيل المعالف العميق (كل {interval} يوم)")
+            if rule.occurs_on(check_date or self.today()):
+                print(f"[Logic] موعد غسيل المعالف العميق ({rule.summary})")
                 return True
             return False
         except Exception as e:
             print(f"❌ خطأ في فحص غسيل المعالف: {e}")
             return False
 
-    def get_tasks_for_today(self, weather_report: Optional[Dict] = None) -> List[Dict[str, Any]]:
+    def get_tasks_for_today(self, weather_report: Optional[Dict] = None,
+                            ctx: Optional[EvaluationContext] = None) -> List[Dict[str, Any]]:
         """تجميع جميع المهام لليوم"""
+        ctx = ctx or self.evaluation_context(weather_report)
+        weather_report, check_date = ctx.weather_report, ctx.check_date
         tasks = []
 
+        blackout = self.schedule.blackout_on(check_date)
+        if blackout:
+            print(f"[Logic] فترة توقف ({blackout.policy}) من {blackout.start} إلى {blackout.end} {blackout.reason}")
+
         # مهمة دواء الديدان
-        if self.should_deworm_today():
+        if ctx.should_deworm:
             tasks.append({
                 'type': 'deworming',
-                'drug': self.get_current_deworm_drug()
+                'drug': ctx.deworm_drug
             })
 
-        # مهمة الفيتامينات
-        # تأخير إرسال الفيتامينات حتى يوم بعد دواء الديدان
-        if not self.should_deworm_today() and self._was_deworming_yesterday():
-            # سيتم إرسال الفيتامينات بناءً على ظروف الأمس
-            pass
+        # الفيتامينات بعد دواء الديدان مهمة مشتقة (derived_tasks) تُرسل مع مهام الطقس
 
         # المهام الجديدة
-        if self.should_clean_water_station(weather_report):
+        if self.should_clean_water_station(weather_report, check_date):
             tasks.append({'type': 'water_station'})
 
-        pipe_tasks = self.get_pipe_waterer_maintenance()
+        pipe_tasks = self.get_pipe_waterer_maintenance(check_date)
         for p_task in pipe_tasks:
             tasks.append({'type': f'pipe_waterer_{p_task}'})
 
-        if self.should_clean_coop_weekly(weather_report):
+        if self.should_clean_coop_weekly(weather_report, check_date):
             tasks.append({'type': 'weekly_cleaning'})
 
-        if self.should_turn_soil():
+        if self.should_turn_soil(check_date):
             tasks.append({'type': 'soil_turning'})
 
-        if self.should_check_ventilation(weather_report):
+        if self.should_check_ventilation(weather_report, check_date):
             tasks.append({'type': 'ventilation'})
 
-        if self.should_deep_clean_feeders():
+        if self.should_deep_clean_feeders(check_date):
             tasks.append({'type': 'feeder_cleaning'})
 
         return tasks
 
-    def get_all_fertilization_tasks(self, weather_report: Optional[Dict] = None) -> List[Dict[str, Any]]:
+    def get_all_fertilization_tasks(self, weather_report: Optional[Dict] = None,
+                                    ctx: Optional[EvaluationContext] = None) -> List[Dict[str, Any]]:
         """جميع مهام التسميد لليوم"""
+        ctx = ctx or self.evaluation_context(weather_report)
         tasks = []
-        trees_schedule = self.config.get('trees_fertilizer_schedule', {})
 
-        for tree_key in trees_schedule.keys():
-            if self.should_fertilize_tree(tree_key, weather_report):
-                details = self.get_fertilizer_details(tree_key)
+        for tree_key in self.schedule.trees:
+            if self.should_fertilize_tree(tree_key, ctx.weather_report, ctx.check_date):
+                details = self.get_fertilizer_details(tree_key, ctx)
                 tasks.append({
                     'type': 'fertilizer',
                     'tree': tree_key,
@@ -499,12 +581,30 @@ class FarmLogic:
 
         return tasks
 
+    def get_rule_tasks(self, weather_report: Optional[Dict] = None,
+                       ctx: Optional[EvaluationContext] = None) -> List[Dict[str, Any]]:
+        """مهام قسم rules في الإعدادات المستحقة اليوم (التاريخ + المواسم + الطقس)"""
+        ctx = ctx or self.evaluation_context(weather_report)
+        tasks = []
+
+        for rule in self.schedule.config_rules.values():
+            if rule.matches(ctx.check_date, ctx.weather_report):
+                print(f"[Logic] موعد القاعدة {rule.key} اليوم")
+                tasks.append({'type': rule.key, 'rule': rule.key, **rule.details})
+
+        # المهام المشتقة من أنواع أخرى (الفيتامينات ودواء الديدان لهما مسارهما الخاص)
+        for task in ctx.derived_tasks:
+            if task['type'] not in ('vitamins', 'deworming'):
+                tasks.append({**task, 'rule': task['derived']})
+
+        return tasks
+
     def save_last_run(self):
         """حفظ وقت آخر تشغيل"""
         try:
             with open(self.last_run_file, 'w') as f:
-                f.write(datetime.now().isoformat())
-            print(f"[Logic] تم حفظ وقت آخر تشغيل: {datetime.now()}")
+                f.write(self.clock().isoformat())
+            print(f"[Logic] تم حفظ وقت آخر تشغيل: {self.clock()}")
         except Exception as e:
             print(f"⚠️ خطأ في حفظ وقت التشغيل: {e}")
 
@@ -518,12 +618,37 @@ class FarmLogic:
             print(f"⚠️ خطأ في قراءة وقت التشغيل: {e}")
         return None
 
-    def get_weather_dependent_tasks(self, weather_report: Optional[Dict] = None) -> List[Dict[str, Any]]:
+    def get_missed_events(self, now: Optional[datetime] = None) -> List[ScheduledEvent]:
+        """مواعيد الأيام الفائتة منذ آخر تشغيل ناجح حتى بداية اليوم - استعلام فترة واحد لكل الأيام"""
+        last_run = self.load_last_run()
+        if last_run is None:
+            return []
+
+        now = now or self.clock()
+        first_day = max(last_run.date() + timedelta(days=1), now.date() - timedelta(days=CATCH_UP_MAX_DAYS))
+        start = datetime.combine(first_day, time.min)
+        end = datetime.combine(now.date(), time.min)
+        if start >= end:
+            return []
+
+        try:
+            events = self.schedule.events_between(start, end)
+        except Exception as e:
+            print(f"⚠️ خطأ في حساب المهام الفائتة: {e}")
+            return []
+
+        print(f"[Logic] آخر تشغيل ناجح: {last_run} - {len(events)} مهمة فائتة من {first_day} إلى {now.date() - timedelta(days=1)}")
+        return events
+
+    def get_weather_dependent_tasks(self, weather_report: Optional[Dict] = None,
+                                    ctx: Optional[EvaluationContext] = None) -> List[Dict[str, Any]]:
         """المهام التي تعتمد على الطقس والشروط الأخرى"""
+        ctx = ctx or self.evaluation_context(weather_report)
+        weather_report = ctx.weather_report
         tasks = []
 
         # الفيتامينات (المنطق الكامل)
-        if self.should_send_vitamins(weather_report):
+        if ctx.should_send_vitamins:
             reason_ar = "دعم وقائي"
             reason_bn = "Preventive support"
 
@@ -532,9 +657,10 @@ class FarmLogic:
                 reason_ar, reason_bn = 'موجة حر', 'heat wave'
             elif weather_report and weather_report.get('cold_wave'):
                 reason_ar, reason_bn = 'موجة برد', 'cold wave'
-            elif self._was_deworming_yesterday():
-                reason_ar, reason_bn = 'دعم بعد دواء الديدان', 'post-deworming support'
-            elif self._was_feed_changed_today():
+            elif ctx.derived_vitamins:
+                reason_ar = ctx.derived_vitamins.get('reason_ar', 'دعم بعد دواء الديدان')
+                reason_bn = ctx.derived_vitamins.get('reason_bn', 'post-deworming support')
+            elif ctx.feed_changed_today:
                 reason_ar, reason_bn = 'تغيير نوع الغذاء', 'feed change'
 
             tasks.append({
@@ -544,7 +670,7 @@ class FarmLogic:
             })
 
         # الوقاية من الكوكسيديا (تتطلب بيانات طقس)
-        if weather_report and self.should_prevent_coccidiosis(weather_report):
+        if ctx.should_prevent_coccidiosis:
             tasks.append({
                 'type': 'coccidiosis',
                 'reason_ar': "رطوبة عالية",
@@ -552,7 +678,7 @@ class FarmLogic:
             })
 
         # تطهير الحظيرة (لا يتطلب طقس)
-        if self.should_sanitize_coop():
+        if self.should_sanitize_coop(ctx.check_date):
             tasks.append({
                 'type': 'sanitization'
             })
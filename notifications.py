@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""
+بناء الإشعارات من مواعيد الجدولة - مشترك بين api.py و generate_notifications.py
+Shared notification builder for the API and the static generator
+"""
+
+import hashlib
+import json
+import os
+from collections import Counter, OrderedDict
+from datetime import date, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from schedule import ScheduledEvent
+
+# الحد الافتراضي لعدد الأيام المحفوظة في الذاكرة
+DEFAULT_CACHE_SIZE = 512
+
+# عدد ملخصات الفترات المحفوظة (فترة = أول يوم + عدد الأيام)
+ROLLUP_CACHE_SIZE = 32
+
+# المهام الدورية: النوع -> (العنوان بالعربية، العنوان بالبنغالية، الأولوية، الأيقونة)
+INTERVAL_TASKS = {
+    'sanitization': ('تطهير الحظيرة', 'খামার জীবাণুমুক্তকরণ', 'medium', '🧹'),
+    'water_station': ('تنظيف محطة الماء', 'পানি স্টেশন পরিষ্কার', 'medium', '💧'),
+    'weekly_cleaning': ('التنظيف الأسبوعي', 'সাপ্তাহিক পরিষ্কার', 'medium', '🧽'),
+    'soil_turning': ('تقليب التراب', 'মাটি নাড়াচাড়া', 'low', '🌱'),
+    'ventilation': ('فحص التهوية', 'বায়ুচলাচল পরীক্ষা', 'medium', '💨'),
+    'feeder_cleaning': ('غسيل المعالف', 'খাবার পাত্র পরিষ্কার', 'medium', '🪣'),
+    'quarantine': ('الحجر الصحي', 'কোয়ারেন্টাইন', 'high', '🚧'),
+}
+
+# أسماء الأشجار
+TREE_NAMES_AR = {
+    'henna': 'الحناء', 'fig': 'التين', 'banana': 'الموز',
+    'mango_small': 'مانجو صغيرة', 'mango_large': 'مانجو كبيرة',
+    'jackfruit_young': 'جاك فروت صغير', 'mint_basil': 'النعناع والحبق',
+    'pomegranate': 'الرمان', 'acacia': 'الأكاسيا', 'bougainvillea': 'الجهنمية',
+    'grape': 'العنب', 'custard_apple': 'القشطة', 'ornamental': 'أشجار الزينة',
+    'moringa': 'المورينجا'
+}
+
+TREE_NAMES_BN = {
+    'henna': 'মেহেদি', 'fig': 'ডুমুর', 'banana': 'কলা',
+    'mango_small': 'ছোট আম', 'mango_large': 'বড় আম',
+    'jackfruit_young': 'ছোট কাঁঠাল', 'mint_basil': 'পুদিনা ও তুলসী',
+    'pomegranate': 'ডালিম', 'acacia': 'বাবলা', 'bougainvillea': 'বাগানবিলাস',
+    'grape': 'আঙ্গুর', 'custard_apple': 'আতা', 'ornamental': 'শোভাবর্ধনকারী গাছ',
+    'moringa': 'সজনে'
+}
+
+# أسماء مهام السقاية الأنبوبية
+PIPE_TASK_NAMES_AR = {
+    'change_water': 'تغيير الماء',
+    'rinse': 'شطف',
+    'sanitize': 'تعقيم',
+    'deep_clean': 'تنظيف عميق'
+}
+
+PIPE_TASK_NAMES_BN = {
+    'change_water': 'পানি পরিবর্তন',
+    'rinse': 'ধোয়া',
+    'sanitize': 'জীবাণুমুক্তকরণ',
+    'deep_clean': 'গভীর পরিষ্কার'
+}
+
+
+def build_notification(event: ScheduledEvent) -> Optional[Dict]:
+    """تحويل موعد من الجدولة إلى إشعار للعرض (datetime يبقى كائناً - التحويل لنص مسؤولية المستدعي)"""
+    check_date = event.when.date()
+    base = {
+        'date': check_date.isoformat(),
+        'time': event.when.strftime('%H:%M'),
+        'datetime': event.when,
+    }
+
+    if event.type == 'deworming':
+        drug = event.details['drug']
+        return {
+            'type': 'deworming',
+            'title_ar': f'دواء الديدان - {drug}',
+            'title_bn': f'কৃমির ঔষধ - {drug}',
+            **base,
+            'priority': 'high',
+            'icon': '🪱',
+            'drug': drug
+        }
+
+    if event.type in INTERVAL_TASKS:
+        title_ar, title_bn, priority, icon = INTERVAL_TASKS[event.type]
+        return {
+            'type': event.type,
+            'title_ar': title_ar,
+            'title_bn': title_bn,
+            **base,
+            'priority': priority,
+            'icon': icon
+        }
+
+    if event.rule_key == 'pipe_waterer':
+        task = event.details['task']
+        return {
+            'type': event.type,
+            'title_ar': f'السقاية الأنبوبية - {PIPE_TASK_NAMES_AR.get(task, task)}',
+            'title_bn': f'পাইপ ওয়াটারার - {PIPE_TASK_NAMES_BN.get(task, task)}',
+            **base,
+            'priority': 'medium',
+            'icon': '🚰'
+        }
+
+    if event.type == 'fertilizer':
+        tree_key = event.details['tree']
+        return {
+            'type': 'fertilizer',
+            'title_ar': f'تسميد {TREE_NAMES_AR.get(tree_key, tree_key)}',
+            'title_bn': f'{TREE_NAMES_BN.get(tree_key, tree_key)} সার প্রয়োগ',
+            **base,
+            'priority': 'medium',
+            'icon': '🌳',
+            'tree': tree_key,
+            'fertilizer': event.details['fertilizer'],
+            'amount_kg': event.details.get('amount_kg', 0)
+        }
+
+    if 'title_ar' in event.details:
+        # قاعدة من قسم rules أو مهمة مشتقة من derived_tasks في config.json
+        details = event.details
+        notification = {
+            'type': event.type,
+            'title_ar': details['title_ar'],
+            'title_bn': details['title_bn'],
+            **base,
+            'priority': details['priority'],
+            'icon': details['icon']
+        }
+        for key in ('reason_ar', 'reason_bn', 'derived_from'):
+            if key in details:
+                notification[key] = details[key]
+        return notification
+
+    # نوع غير معروف للعرض (مثل مهمة دورية بدون عنوان)
+    return None
+
+
+def _bucket() -> Dict:
+    return {'count': 0, 'amount_kg': 0.0, 'by_type': Counter()}
+
+
+def rollup_notifications(notifications: Iterable[Dict]) -> Dict:
+    """ملخص الإشعارات في مرور واحد: العدد حسب النوع والشجرة والسماد والأسبوع (ISO) والشهر مع مجموع الكيلوغرامات"""
+    by_type = Counter()
+    by_tree: Dict[str, Dict] = {}
+    by_fertilizer: Dict[str, Dict] = {}
+    by_week: Dict[str, Dict] = {}
+    by_month: Dict[str, Dict] = {}
+    total = 0
+    total_kg = 0.0
+
+    for notification in notifications:
+        check_date = date.fromisoformat(notification['date'])
+        iso_year, iso_week, _ = check_date.isocalendar()
+        task_type = notification['type']
+        amount_kg = notification.get('amount_kg') or 0
+
+        total += 1
+        total_kg += amount_kg
+        by_type[task_type] += 1
+        for buckets, key in ((by_week, f'{iso_year}-W{iso_week:02d}'), (by_month, check_date.strftime('%Y-%m'))):
+            bucket = buckets.setdefault(key, _bucket())
+            bucket['count'] += 1
+            bucket['amount_kg'] += amount_kg
+            bucket['by_type'][task_type] += 1
+
+        if task_type == 'fertilizer':
+            for buckets, key in ((by_tree, notification['tree']), (by_fertilizer, notification['fertilizer'])):
+                bucket = buckets.setdefault(key, {'count': 0, 'amount_kg': 0.0})
+                bucket['count'] += 1
+                bucket['amount_kg'] += amount_kg
+
+    for buckets in (by_tree, by_fertilizer, by_week, by_month):
+        for bucket in buckets.values():
+            bucket['amount_kg'] = round(bucket['amount_kg'], 3)
+            if 'by_type' in bucket:
+                bucket['by_type'] = dict(bucket['by_type'])
+
+    heaviest = max(by_week.items(), key=lambda item: (item[1]['count'], item[1]['amount_kg']), default=None)
+    return {
+        'total': total,
+        'amount_kg': round(total_kg, 3),
+        'by_type': dict(by_type),
+        'by_tree': by_tree,
+        'by_fertilizer': by_fertilizer,
+        'by_week': by_week,
+        'by_month': by_month,
+        'heaviest_week': {'week': heaviest[0], **heaviest[1]} if heaviest else None,
+    }
+
+
+def file_digest(path: str) -> str:
+    """بصمة SHA-256 لمحتوى ملف"""
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def weather_digest(weather_report: Optional[Dict]) -> str:
+    """بصمة ثابتة لتقرير الطقس (نفس القيم = نفس البصمة)"""
+    if not weather_report:
+        return 'no-weather'
+    payload = json.dumps(weather_report, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+class NotificationCache:
+    """ذاكرة LRU محدودة لإشعارات كل يوم - المفتاح: (بصمة الإعدادات، التاريخ، بصمة الطقس)"""
+
+    def __init__(self, config_path: str = 'config.json', maxsize: int = DEFAULT_CACHE_SIZE):
+        self.config_path = config_path
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.config_hash = ''
+        self._config_stat: Optional[Tuple[int, int]] = None
+        self._entries: 'OrderedDict[Tuple[str, date, str], Tuple[Dict, ...]]' = OrderedDict()
+        self._rollups: 'OrderedDict[Tuple[str, date, int, str], Dict]' = OrderedDict()
+        self.refresh()
+
+    def refresh(self) -> bool:
+        """فحص config.json - عند تغير محتواه تُمسح الذاكرة ويُعاد True"""
+        try:
+            stat = os.stat(self.config_path)
+            stat_key = (stat.st_mtime_ns, stat.st_size)
+            if stat_key == self._config_stat:
+                return False
+            self._config_stat = stat_key
+            config_hash = file_digest(self.config_path)
+        except OSError as e:
+            print(f"⚠️ تعذر قراءة {self.config_path} لحساب البصمة: {e}")
+            return False
+
+        if config_hash == self.config_hash:
+            return False
+
+        changed = bool(self.config_hash)
+        self.config_hash = config_hash
+        self._entries.clear()
+        self._rollups.clear()
+        if changed:
+            print(f"[Cache] تغير {self.config_path} - تم مسح ذاكرة الإشعارات")
+        return changed
+
+    def _key(self, check_date: date, weather_report: Optional[Dict]) -> Tuple[str, date, str]:
+        return self.config_hash, check_date, weather_digest(weather_report)
+
+    def get_or_compute(self, check_date: date, compute: Callable[[date], List[Dict]],
+                       weather_report: Optional[Dict] = None) -> List[Dict]:
+        """إشعارات يوم واحد من الذاكرة، أو حسابها وحفظها"""
+        key = self._key(check_date, weather_report)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            try:
+                self._entries.move_to_end(key)
+            except KeyError:  # أُزيل من خيط آخر بين القراءة والتحديث - القيمة المقروءة ما زالت صحيحة
+                pass
+            return list(entry)
+
+        self.misses += 1
+        entry = tuple(compute(check_date))
+        self._entries[key] = entry
+        if len(self._entries) > self.maxsize:
+            try:
+                self._entries.popitem(last=False)
+            except KeyError:
+                pass
+        return list(entry)
+
+    def get_days(self, first_day: date, days: int, compute: Callable[[date], List[Dict]],
+                 prepare: Optional[Callable[[], object]] = None,
+                 weather_report: Optional[Dict] = None) -> List[Dict]:
+        """إشعارات أيام متتالية بالترتيب؛ prepare تُستدعى مرة واحدة قبل أول يوم غير محفوظ"""
+        result = []
+        for offset in range(days):
+            check_date = first_day + timedelta(days=offset)
+            if prepare and self._key(check_date, weather_report) not in self._entries:
+                prepare()
+                prepare = None
+            result.extend(self.get_or_compute(check_date, compute, weather_report))
+        return result
+
+    def get_rollup(self, first_day: date, days: int, compute: Callable[[date], List[Dict]],
+                   prepare: Optional[Callable[[], object]] = None,
+                   weather_report: Optional[Dict] = None) -> Dict:
+        """ملخص فترة محفوظ بجانب إشعارات أيامها - يُحسب من get_days مرة واحدة لكل فترة"""
+        key = (self.config_hash, first_day, days, weather_digest(weather_report))
+        rollup = self._rollups.get(key)
+        if rollup is None:
+            rollup = rollup_notifications(self.get_days(first_day, days, compute, prepare, weather_report))
+            self._rollups[key] = rollup
+            if len(self._rollups) > ROLLUP_CACHE_SIZE:
+                try:
+                    self._rollups.popitem(last=False)
+                except KeyError:
+                    pass
+        return rollup
+
+    def stats(self) -> Dict:
+        """إحصائيات الذاكرة"""
+        return {
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'config_hash': self.config_hash[:12]
+        }
@@ -0,0 +1,1494 @@
+#!/usr/bin/env python3
+"""
+نموذج الجدولة المُجمَّع - يُبنى مرة واحدة من config.json
+Compiled schedule model - built once from config.json
+"""
+
+import copyreg
+import hashlib
+import heapq
+import json
+import os
+import pickle
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from itertools import takewhile
+from types import MappingProxyType
+from typing import Any, Callable, Collection, Dict, FrozenSet, Iterable, Iterator, List, Mapping, NamedTuple, Optional, Tuple
+
+import cronexpr
+from cronexpr import CronExpression, parse_cron
+
+try:
+    import numpy as np
+except ImportError:  # numpy اختياري - يوجد بديل بلغة Python الصرفة
+    np = None
+
+DATE_FORMAT = "%Y-%m-%d"
+TIME_FORMAT = "%H:%M"
+
+# الأوقات الافتراضية لكل نوع مهمة (يمكن تجاوزها بمفتاح "time" في الإعدادات)
+DEFAULT_TIMES = {
+    'deworming': '08:00',
+    'sanitization': '09:00',
+    'water_station': '10:00',
+    'weekly_cleaning': '11:00',
+    'soil_turning': '12:00',
+    'ventilation': '13:00',
+    'feeder_cleaning': '14:00',
+    'pipe_waterer': '15:00',
+    'fertilizer': '16:00',
+}
+FALLBACK_TIME = '09:00'
+
+# بداية كل شهر في سنة كبيسة: فهرس يوم السنة ثابت لكل السنوات (29 فبراير = 59)
+MONTH_OFFSETS = (0, 31, 60, 91, 121, 152, 182, 213, 244, 274, 305, 335)
+DAYS_IN_BITMAP = 366
+
+# أقصى مدى للبحث عن موعد قاعدة مقيدة بموسم (عشر سنوات)
+MAX_RULE_SEARCH_DAYS = 3660
+
+# القيم الافتراضية لعرض قواعد قسم rules في config.json
+DEFAULT_RULE_PRIORITY = 'medium'
+DEFAULT_RULE_ICON = '📌'
+
+# سياسات فترات التوقف (السفر، العيد، الحجر): إلغاء الموعد، أو نقله لأول يوم بعد الفترة، أو لآخر يوم قبلها
+BLACKOUT_POLICIES = ('skip', 'shift_next', 'shift_earlier')
+
+# مجموعات المهام في حقل tasks لفترات التوقف
+BLACKOUT_GROUPS = ('chicken', 'trees', 'rules', 'derived')
+
+# مفاتيح بنية المهمة المشتقة (الباقي تفاصيل عرض تُمرر كما هي)
+DERIVED_TASK_KEYS = ('after', 'offset_days', 'duration_days', 'type', 'time')
+
+# المهمة المشتقة الافتراضية عند غياب قسم derived_tasks: فيتامينات يوماً واحداً بعد دواء الديدان
+# (لإعدادات vitamins.trigger_conditions التي تحتوي post_deworming)
+DEFAULT_POST_DEWORMING_TASKS = {
+    'post_deworming_vitamins': {
+        'after': 'deworming',
+        'offset_days': 1,
+        'duration_days': 1,
+        'type': 'vitamins',
+        'time': '08:30',
+        'title_ar': 'فيتامينات وإلكتروليت - دعم بعد دواء الديدان',
+        'title_bn': 'ভিটামিন ও ইলেক্ট্রোলাইট - কৃমির ঔষধের পর সহায়তা',
+        'priority': 'medium',
+        'icon': '💊',
+        'reason_ar': 'دعم بعد دواء الديدان',
+        'reason_bn': 'কৃমির ঔষধের পর সহায়তা',
+    },
+}
+
+# امتداد ملف الجدول المُجمَّع المحفوظ بجانب ملف الإعدادات (.config.schedule.pickle)
+SCHEDULE_CACHE_SUFFIX = '.schedule.pickle'
+
+# أقصى عدد أقسام مُجمَّعة محفوظة للمشاركة بين الجداول (مزارع متعددة أو إعادة تحميل)
+SECTION_POOL_SIZE = 1024
+
+# ترتيب أولوية صيانة السقاية الأنبوبية (الأعلى أولاً)
+PIPE_WATERER_TASKS = (
+    ('deep_clean', 30),
+    ('sanitize', 15),
+    ('rinse', 7),
+    ('change_water', 3),
+)
+
+
+def parse_date(value: str) -> date:
+    """تحويل نص YYYY-MM-DD إلى تاريخ"""
+    return datetime.strptime(value, DATE_FORMAT).date()
+
+
+def parse_time(value: str) -> time:
+    """تحويل نص HH:MM إلى وقت"""
+    return datetime.strptime(value, TIME_FORMAT).time()
+
+
+def parse_month_day(value: str) -> Tuple[int, int]:
+    """تحويل نص MM-DD إلى (الشهر، اليوم) - يقبل 02-29"""
+    parsed = datetime.strptime(f"2000-{value}", DATE_FORMAT)
+    return parsed.month, parsed.day
+
+
+def day_of_year_index(month: int, day: int) -> int:
+    """فهرس اليوم في خريطة الموسم (0..365)"""
+    return MONTH_OFFSETS[month - 1] + day - 1
+
+
+def season_bitmap(ranges: Iterable[Tuple[int, int]]) -> bytes:
+    """خريطة من 366 خانة لفترات (فهرس البداية، فهرس النهاية) شاملة؛ البداية بعد النهاية تعني الالتفاف عبر رأس السنة"""
+    bits = bytearray(DAYS_IN_BITMAP)
+    for start, end in ranges:
+        if start <= end:
+            bits[start:end + 1] = b'\x01' * (end - start + 1)
+        else:
+            bits[start:] = b'\x01' * (DAYS_IN_BITMAP - start)
+            bits[:end + 1] = b'\x01' * (end + 1)
+    return bytes(bits)
+
+
+def next_multiple(start_date: date, interval_days: int, on_or_after: date) -> date:
+    """أول تاريخ من الشكل start_date + k * interval_days (k >= 0) في أو بعد on_or_after"""
+    days_diff = (on_or_after - start_date).days
+    if days_diff <= 0:
+        return start_date
+    steps = -(-days_diff // interval_days)
+    return start_date + timedelta(days=steps * interval_days)
+
+
+class DayAxis(NamedTuple):
+    """محور الأيام للتقييم المتجه (يتطلب numpy)"""
+    start: date
+    ordinals: Any   # أرقام الأيام (date.toordinal)
+    month_day: Any  # month * 100 + day لكل يوم
+    year: Any       # السنة لكل يوم
+    day_index: Any  # فهرس يوم السنة في خرائط المواسم
+
+
+def day_axis(start: date, days: int) -> DayAxis:
+    """بناء محور الأيام مرة واحدة لكل مصفوفة"""
+    dates = np.datetime64(start.isoformat(), 'D') + np.arange(days)
+    months = dates.astype('datetime64[M]')
+    month = months.astype(np.int64) % 12 + 1
+    day = (dates - months).astype(np.int64) + 1
+    return DayAxis(
+        start,
+        np.arange(days, dtype=np.int64) + start.toordinal(),
+        month * 100 + day,
+        dates.astype('datetime64[Y]').astype(np.int64) + 1970,
+        np.array(MONTH_OFFSETS, dtype=np.int64)[month - 1] + day - 1,
+    )
+
+
+def interval_mask(axis: DayAxis, start_date: date, interval_days: int):
+    """قناع الأيام التي تحقق (اليوم - البداية) % الفاصل == 0 بعد البداية"""
+    days_diff = axis.ordinals - start_date.toordinal()
+    return (days_diff >= 0) & (days_diff % interval_days == 0)
+
+
+class ScheduledEvent(NamedTuple):
+    """موعد مهمة واحدة في التدفق الزمني (الترتيب حسب الوقت ثم ترتيب القاعدة)"""
+    when: datetime
+    order: int
+    rule_key: str
+    type: str
+    details: Dict[str, Any]
+
+
+class RecurringRule:
+    """واجهة مشتركة للقواعد: الموعد التالي وتعداد المواعيد في فترة"""
+
+    def next_on_or_after(self, check_date: date) -> Optional[date]:
+        raise NotImplementedError
+
+    def describe(self, check_date: date) -> Tuple[str, Dict[str, Any]]:
+        """نوع المهمة وتفاصيلها في موعد محدد"""
+        raise NotImplementedError
+
+    def occurs_on(self, check_date: date) -> bool:
+        return self.next_on_or_after(check_date) == check_date
+
+    def mask(self, axis: DayAxis):
+        """قناع منطقي لأيام المحور التي تقع فيها القاعدة (numpy)"""
+        return np.fromiter((self.occurs_on(date.fromordinal(int(o))) for o in axis.ordinals),
+                           dtype=bool, count=len(axis.ordinals))
+
+    def events(self, start: datetime, order: int = 0) -> Iterator[ScheduledEvent]:
+        """تدفق لا نهائي (أو حتى آخر تاريخ محدد) لمواعيد القاعدة بدءاً من اللحظة start"""
+        for current in self.occurrences(start.date()):
+            when = datetime.combine(current, self.time_of_day)
+            if when >= start:
+                task_type, details = self.describe(current)
+                yield ScheduledEvent(when, order, self.key, task_type, details)
+
+    def occurrences(self, start: date, end: Optional[date] = None) -> Iterator[date]:
+        """مواعيد القاعدة في الفترة [start, end) - قفزة مباشرة بين كل موعد والتالي"""
+        current = self.next_on_or_after(start)
+        while current is not None and (end is None or current < end):
+            yield current
+            current = self.next_on_or_after(current + timedelta(days=1))
+
+    def next_occurrences(self, after: date, n: int = 1) -> List[date]:
+        """أقرب n مواعيد في أو بعد التاريخ after"""
+        result = []
+        current = self.next_on_or_after(after)
+        while current is not None and len(result) < n:
+            result.append(current)
+            current = self.next_on_or_after(current + timedelta(days=1))
+        return result
+
+
+@dataclass(frozen=True)
+class SeasonCalendar:
+    """موسم مُجمَّع: خريطة أيام سنوية متكررة مع خرائط بديلة لسنوات محددة"""
+    name: str
+    bitmap: Optional[bytes]             # None: الموسم غير متكرر (خارج السنوات المحددة)
+    year_bitmaps: Mapping[int, bytes]
+
+    def contains(self, check_date: date) -> bool:
+        """هل التاريخ داخل الموسم؟"""
+        bitmap = self.year_bitmaps.get(check_date.year, self.bitmap)
+        return bitmap is not None and bitmap[day_of_year_index(check_date.month, check_date.day)] == 1
+
+    def mask(self, axis: DayAxis):
+        """قناع منطقي لأيام المحور الواقعة داخل الموسم (numpy)"""
+        result = np.zeros(len(axis.ordinals), dtype=bool)
+        if self.bitmap is not None:
+            result = np.frombuffer(self.bitmap, dtype=np.uint8)[axis.day_index] == 1
+        for year, bitmap in self.year_bitmaps.items():
+            selected = axis.year == year
+            if selected.any():
+                result[selected] = np.frombuffer(bitmap, dtype=np.uint8)[axis.day_index[selected]] == 1
+        return result
+
+
+def window_contains(seasons: Tuple[SeasonCalendar, ...], check_date: date) -> bool:
+    """نافذة المواسم: بدون مواسم كل الأيام مسموحة، وإلا يكفي أي موسم منها"""
+    return not seasons or any(season.contains(check_date) for season in seasons)
+
+
+def window_mask(seasons: Tuple[SeasonCalendar, ...], axis: DayAxis):
+    """قناع نافذة المواسم على محور الأيام (numpy)"""
+    if not seasons:
+        return np.ones(len(axis.ordinals), dtype=bool)
+    result = np.zeros(len(axis.ordinals), dtype=bool)
+    for season in seasons:
+        result |= season.mask(axis)
+    return result
+
+
+def next_in_window(next_date: Callable[[date], Optional[date]], seasons: Tuple[SeasonCalendar, ...],
+                   check_date: date) -> Optional[date]:
+    """أول موعد للنمط في أو بعد check_date داخل نافذة المواسم (القفز من موعد إلى الذي يليه)"""
+    candidate = next_date(check_date)
+    if not seasons:
+        return candidate
+    limit = check_date + timedelta(days=MAX_RULE_SEARCH_DAYS)
+    while candidate is not None and candidate <= limit:
+        if window_contains(seasons, candidate):
+            return candidate
+        candidate = next_date(candidate + timedelta(days=1))
+    return None
+
+
+def cron_mask(expression: CronExpression, axis: DayAxis):
+    return expression.mask(axis.ordinals, axis.year, axis.month_day // 100, axis.month_day % 100)
+
+
+@dataclass(frozen=True)
+class IntervalRule(RecurringRule):
+    """مهمة دورية: كل interval_days يوم بدءاً من start_date"""
+    key: str
+    start_date: date
+    interval_days: int
+    time_of_day: time
+
+    def occurs_on(self, check_date: date) -> bool:
+        """هل تقع المهمة في هذا التاريخ؟"""
+        days_diff = (check_date - self.start_date).days
+        return days_diff >= 0 and days_diff % self.interval_days == 0
+
+    def next_on_or_after(self, check_date: date) -> Optional[date]:
+        return next_multiple(self.start_date, self.interval_days, check_date)
+
+    def mask(self, axis: DayAxis):
+        return interval_mask(axis, self.start_date, self.interval_days)
+
+    def describe(self, check_date: date) -> Tuple[str, Dict[str, Any]]:
+        return self.key, {}
+
+    @property
+    def summary(self) -> str:
+        return f"كل {self.interval_days} يوم"
+
+
+@dataclass(frozen=True)
+class CronRule(RecurringRule):
+    """مهمة بتعبير cron (مثل: الجمعة الثانية والرابعة، أول كل شهر) مع نافذة مواسم اختيارية"""
+    key: str
+    expression: CronExpression
+    seasons: Tuple[SeasonCalendar, ...]
+    time_of_day: time
+
+    def occurs_on(self, check_date: date) -> bool:
+        return self.expression.matches(check_date) and window_contains(self.seasons, check_date)
+
+    def next_on_or_after(self, check_date: date) -> Optional[date]:
+        return next_in_window(self.expression.next_on_or_after, self.seasons, check_date)
+
+    def mask(self, axis: DayAxis):
+        return cron_mask(self.expression, axis) & window_mask(self.seasons, axis)
+
+    def describe(self, check_date: date) -> Tuple[str, Dict[str, Any]]:
+        return self.key, {}
+
+    @property
+    def summary(self) -> str:
+        return f"حسب الجدول {self.expression.source}"
+
+
+@dataclass(frozen=True)
+class DewormingRule(RecurringRule):
+    """جدول دواء الديدان الموسمي (شهر-يوم -> الدواء)"""
+    schedule: Mapping[Tuple[int, int], str]
+    default_drug: str
+    time_of_day: time
+
+    key = 'deworming'
+
+    def drug_on(self, check_date: date) -> Optional[str]:
+        """الدواء المقرر في هذا التاريخ أو None"""
+        return self.schedule.get((check_date.month, check_date.day))
+
+    def occurs_on(self, check_date: date) -> bool:
+        return (check_date.month, check_date.day) in self.schedule
+
+    def mask(self, axis: DayAxis):
+        keys = np.array([month * 100 + day for month, day in self.schedule], dtype=np.int64)
+        return np.isin(axis.month_day, keys)
+
+    def next_on_or_after(self, check_date: date) -> Optional[date]:
+        # المواعيد سنوية: أول سنة صالحة لكل موعد (موعد 02-29 قد يتخطى عدة سنوات)
+        best = None
+        for month, day in self.schedule:
+            for year in range(check_date.year, check_date.year + 9):
+                try:
+                    candidate = date(year, month, day)
+                except ValueError:
+                    continue
+                if candidate >= check_date:
+                    if best is None or candidate < best:
+                        best = candidate
+                    break
+        return best
+
+    def describe(self, check_date: date) -> Tuple[str, Dict[str, Any]]:
+        return 'deworming', {'drug': self.drug_on(check_date)}
+
+
+@dataclass(frozen=True)
+class PipeWatererRule(RecurringRule):
+    """صيانة السقاية الأنبوبية: عدة فواصل مرتبة حسب الأولوية"""
+    start_date: date
+    intervals: Tuple[Tuple[str, int], ...]
+    time_of_day: time
+
+    key = 'pipe_waterer'
+
+    def task_on(self, check_date: date) -> Optional[str]:
+        """مهمة الصيانة ذات الأولوية الأعلى في هذا التاريخ أو None"""
+        days_diff = (check_date - self.start_date).days
+        if days_diff < 0:
+            return None
+        for task, interval in self.intervals:
+            if days_diff % interval == 0:
+                return task
+        return None
+
+    def occurs_on(self, check_date: date) -> bool:
+        return self.task_on(check_date) is not None
+
+    def mask(self, axis: DayAxis):
+        result = np.zeros(len(axis.ordinals), dtype=bool)
+        for _, interval in self.intervals:
+            result |= interval_mask(axis, self.start_date, interval)
+        return result
+
+    def next_on_or_after(self, check_date: date) -> Optional[date]:
+        # أقرب يوم تقع فيه أي صيانة = أصغر مضاعف تالٍ بين كل الفواصل
+        return min(next_multiple(self.start_date, interval, check_date)
+                   for _, interval in self.intervals)
+
+    def describe(self, check_date: date) -> Tuple[str, Dict[str, Any]]:
+        task = self.task_on(check_date)
+        return f'pipe_waterer_{task}', {'task': task}
+
+
+class GrowthStage(NamedTuple):
+    """مرحلة نمو للشجرة: فترة عمر لها فاصل وسماد وكمية خاصة بها"""
+    name: str
+    start: date                 # تاريخ بداية المرحلة (تاريخ الزراعة + from_age_days)
+    end: Optional[date]         # بداية المرحلة التالية (None = آخر مرحلة)
+    anchor: date                # أول موعد تسميد داخل المرحلة
+    interval_days: int
+    fertilizer: Optional[str]
+    amount_kg: Optional[float]
+
+    def contains(self, check_date: date) -> bool:
+        return self.start <= check_date and (self.end is None or check_date < self.end)
+
+    def next_on_or_after(self, check_date: date) -> Optional[date]:
+        """أول موعد في المرحلة في أو بعد check_date (حساب مباشر بدون تكرار)"""
+        candidate = next_multiple(self.anchor, self.interval_days, max(check_date, self.start))
+        return candidate if self.end is None or candidate < self.end else None
+
+    def mask(self, axis: DayAxis):
+        result = interval_mask(axis, self.anchor, self.interval_days)
+        if self.end is not None:
+            result &= axis.ordinals < self.end.toordinal()
+        return result
+
+
+@dataclass(frozen=True)
+class TreeRule(RecurringRule):
+    """جدول تسميد شجرة واحدة"""
+    key: str
+    start_date: Optional[date]
+    interval_days: Optional[int]
+    dates: Tuple[date, ...]
+    fertilizer: Optional[str]
+    fertilizers: Tuple[str, ...]
+    amount_kg: float
+    max_temp: Optional[float]
+    details: Mapping[str, Any]
+    time_of_day: time
+    cron: Optional[CronExpression] = None
+    seasons: Tuple[SeasonCalendar, ...] = ()
+    stages: Tuple[GrowthStage, ...] = ()
+
+    def occurs_on(self, check_date: date) -> bool:
+        """هل هذا التاريخ موعد تسميد الشجرة؟"""
+        return self._pattern_occurs_on(check_date) and window_contains(self.seasons, check_date)
+
+    def next_on_or_after(self, check_date: date) -> Optional[date]:
+        return next_in_window(self._pattern_next, self.seasons, check_date)
+
+    def mask(self, axis: DayAxis):
+        return self._pattern_mask(axis) & window_mask(self.seasons, axis)
+
+    def stage_on(self, check_date: date) -> Optional[GrowthStage]:
+        """مرحلة النمو في هذا التاريخ (None قبل الزراعة أو بدون مراحل)"""
+        index = bisect_right([stage.start for stage in self.stages], check_date) - 1
+        return self.stages[index] if index >= 0 else None
+
+    # النمط الزمني: مراحل النمو أو cron أو فاصل زمني أو تواريخ محددة يدوياً (Legacy)
+    def _pattern_occurs_on(self, check_date: date) -> bool:
+        if self.stages:
+            stage = self.stage_on(check_date)
+            return stage is not None and stage.next_on_or_after(check_date) == check_date
+        if self.cron is not None:
+            return self.cron.matches(check_date)
+        if self.start_date is not None and self.interval_days:
+            days_diff = (check_date - self.start_date).days
+            return days_diff >= 0 and days_diff % self.interval_days == 0
+        index = bisect_left(self.dates, check_date)
+        return index < len(self.dates) and self.dates[index] == check_date
+
+    def _pattern_next(self, check_date: date) -> Optional[date]:
+        if self.stages:
+            # القفز من مرحلة إلى التالية: عملية حسابية واحدة لكل مرحلة
+            stage = self.stage_on(check_date)
+            index = self.stages.index(stage) if stage is not None else 0
+            for stage in self.stages[index:]:
+                candidate = stage.next_on_or_after(check_date)
+                if candidate is not None:
+                    return candidate
+            return None
+        if self.cron is not None:
+            return self.cron.next_on_or_after(check_date)
+        if self.start_date is not None and self.interval_days:
+            return next_multiple(self.start_date, self.interval_days, check_date)
+        index = bisect_left(self.dates, check_date)
+        return self.dates[index] if index < len(self.dates) else None
+
+    def _pattern_mask(self, axis: DayAxis):
+        if self.stages:
+            result = np.zeros(len(axis.ordinals), dtype=bool)
+            for stage in self.stages:
+                result |= stage.mask(axis)
+            return result
+        if self.cron is not None:
+            return cron_mask(self.cron, axis)
+        if self.start_date is not None and self.interval_days:
+            return interval_mask(axis, self.start_date, self.interval_days)
+        return np.isin(axis.ordinals, np.array([d.toordinal() for d in self.dates], dtype=np.int64))
+
+    def describe(self, check_date: date) -> Tuple[str, Dict[str, Any]]:
+        stage = self.stage_on(check_date)
+        if stage is not None:
+            amount_kg = stage.amount_kg if stage.amount_kg is not None else self.amount_kg
+            return 'fertilizer', {'tree': self.key, 'fertilizer': stage.fertilizer or self.default_fertilizer,
+                                  'amount_kg': amount_kg, 'stage': stage.name}
+        return 'fertilizer', {'tree': self.key, 'fertilizer': self.default_fertilizer, 'amount_kg': self.amount_kg}
+
+    @property
+    def default_fertilizer(self) -> str:
+        """السماد الثابت أو أول سماد في القائمة الموسمية"""
+        if self.fertilizer:
+            return self.fertilizer
+        if self.fertilizers:
+            return self.fertilizers[0]
+        return 'غير محدد'
+
+
+class WeatherCondition(NamedTuple):
+    """شرط طقس لقاعدة: قيمة منطقية مطلوبة أو حدود رقمية لحقل في تقرير الطقس"""
+    field: str
+    equals: Optional[bool] = None
+    minimum: Optional[float] = None
+    maximum: Optional[float] = None
+
+    def check(self, weather_report: Mapping[str, Any]) -> bool:
+        value = weather_report.get(self.field)
+        if value is None:
+            return False
+        if self.equals is not None and bool(value) != self.equals:
+            return False
+        if self.minimum is not None and value < self.minimum:
+            return False
+        if self.maximum is not None and value > self.maximum:
+            return False
+        return True
+
+
+@dataclass(frozen=True)
+class ConfigRule(RecurringRule):
+    """مهمة معرفة بالكامل في قسم rules: فاصل زمني اختياري، نافذة مواسم، وشروط طقس"""
+    key: str
+    start_date: Optional[date]
+    interval_days: Optional[int]
+    seasons: Tuple[SeasonCalendar, ...]
+    weather: Tuple[WeatherCondition, ...]
+    details: Mapping[str, Any]
+    time_of_day: time
+    cron: Optional[CronExpression] = None
+
+    @property
+    def in_calendar(self) -> bool:
+        """القاعدة اليومية المشروطة بالطقس فقط لا تظهر في التقويم (لا يمكن معرفة الطقس مسبقاً)"""
+        return self.interval_days is not None or self.cron is not None or not self.weather
+
+    def occurs_on(self, check_date: date) -> bool:
+        if self.start_date is not None and check_date < self.start_date:
+            return False
+        if self.cron is not None:
+            date_ok = self.cron.matches(check_date)
+        elif self.interval_days:
+            date_ok = (check_date - self.start_date).days % self.interval_days == 0
+        else:
+            date_ok = True
+        return date_ok and window_contains(self.seasons, check_date)
+
+    def next_on_or_after(self, check_date: date) -> Optional[date]:
+        if not self.in_calendar:
+            return None
+        return next_in_window(self._pattern_next, self.seasons, check_date)
+
+    def _pattern_next(self, check_date: date) -> Optional[date]:
+        if self.interval_days:
+            return next_multiple(self.start_date, self.interval_days, check_date)
+        if self.start_date is not None:
+            check_date = max(check_date, self.start_date)
+        if self.cron is not None:
+            return self.cron.next_on_or_after(check_date)
+        return check_date
+
+    def mask(self, axis: DayAxis):
+        if self.interval_days:
+            result = interval_mask(axis, self.start_date, self.interval_days)
+        elif self.start_date:
+            result = axis.ordinals >= self.start_date.toordinal()
+        else:
+            result = np.ones(len(axis.ordinals), dtype=bool)
+        if self.cron is not None:
+            result &= cron_mask(self.cron, axis)
+        return result & window_mask(self.seasons, axis)
+
+    def weather_ok(self, weather_report: Optional[Mapping[str, Any]]) -> bool:
+        """شروط الطقس: بدون شروط دائماً صحيح، ومع شروط يلزم تقرير طقس يحققها كلها"""
+        if not self.weather:
+            return True
+        return bool(weather_report) and all(condition.check(weather_report) for condition in self.weather)
+
+    def matches(self, check_date: date, weather_report: Optional[Mapping[str, Any]] = None) -> bool:
+        """هل تُنفذ القاعدة في هذا التاريخ مع هذا الطقس؟"""
+        return self.occurs_on(check_date) and self.weather_ok(weather_report)
+
+    def describe(self, check_date: date) -> Tuple[str, Dict[str, Any]]:
+        return self.key, dict(self.details)
+
+
+class BlackoutWindow(NamedTuple):
+    """فترة توقف [start, end] (شاملة الطرفين) مع سياستها"""
+    start: date
+    end: date
+    policy: str
+    reason: str = ''
+
+
+@dataclass(frozen=True)
+class BlackoutCalendar:
+    """فترات توقف مدموجة ومرتبة وغير متداخلة - البحث عن فترة تاريخ ما O(log n) عبر bisect"""
+    windows: Tuple[BlackoutWindow, ...]
+    starts: Tuple[date, ...]
+
+    @classmethod
+    def build(cls, windows: Iterable[BlackoutWindow]) -> 'BlackoutCalendar':
+        """دمج الفترات المتداخلة أو المتلاصقة ذات السياسة الواحدة
+
+        الفترات المتلاصقة بسياسات مختلفة تُرفض عند تحميل الإعدادات (_compile_blackouts)، لذلك
+        لا يُدمج إلا ما له نفس السياسة؛ أي تداخل متبقٍ بين سياستين خطأ.
+        """
+        merged: List[BlackoutWindow] = []
+        for window in sorted(windows):
+            if merged and window.start <= merged[-1].end + timedelta(days=1):
+                last = merged[-1]
+                if last.policy != window.policy:
+                    if window.start <= last.end:
+                        raise ValueError(f"فترتا توقف متداخلتان بسياستين مختلفتين: {last} و {window}")
+                    merged.append(window)
+                    continue
+                reason = last.reason if window.reason in last.reason else f"{last.reason}، {window.reason}".strip('، ')
+                merged[-1] = BlackoutWindow(last.start, max(last.end, window.end), last.policy, reason)
+            else:
+                merged.append(window)
+        return cls(tuple(merged), tuple(window.start for window in merged))
+
+    def find(self, check_date: date) -> Optional[BlackoutWindow]:
+        """فترة التوقف التي تحتوي التاريخ أو None"""
+        index = bisect_right(self.starts, check_date) - 1
+        if index >= 0 and check_date <= self.windows[index].end:
+            return self.windows[index]
+        return None
+
+    def overlapping(self, first_day: date, last_day: date) -> Tuple[BlackoutWindow, ...]:
+        """الفترات المتقاطعة مع [first_day, last_day]"""
+        index = max(bisect_right(self.starts, first_day) - 1, 0)
+        stop = bisect_right(self.starts, last_day)
+        return tuple(window for window in self.windows[index:stop] if window.end >= first_day)
+
+    def mask(self, axis: DayAxis):
+        """قناع أيام المحور الواقعة داخل فترات التوقف (numpy)"""
+        result = np.zeros(len(axis.ordinals), dtype=bool)
+        if not len(axis.ordinals):
+            return result
+        first = int(axis.ordinals[0])
+        for window in self.overlapping(axis.start, axis.start + timedelta(days=len(axis.ordinals) - 1)):
+            result[max(window.start.toordinal() - first, 0):window.end.toordinal() - first + 1] = True
+        return result
+
+
+@dataclass(frozen=True)
+class BlackoutRule(RecurringRule):
+    """قاعدة مغلفة بتقويم توقف: المواعيد داخل فترة توقف تُلغى أو تُنقل حسب سياسة الفترة.
+
+    بقية الخصائص (key، time_of_day، summary، ...) تُقرأ من القاعدة الأصلية.
+    """
+    inner: RecurringRule
+    calendar: BlackoutCalendar
+
+    def __getattr__(self, name: str):
+        if name == 'inner' or name.startswith('__'):
+            raise AttributeError(name)
+        return getattr(self.inner, name)
+
+    def _first_in(self, window: BlackoutWindow) -> Optional[date]:
+        """أول موعد أصلي داخل فترة التوقف (None إذا لم يقع فيها موعد)"""
+        candidate = self.inner.next_on_or_after(window.start)
+        return candidate if candidate is not None and candidate <= window.end else None
+
+    def source_date(self, check_date: date) -> Optional[date]:
+        """التاريخ الأصلي للموعد الواقع في check_date بعد تطبيق التوقف (None = لا موعد)"""
+        if self.calendar.find(check_date) is not None:
+            return None
+        if self.inner.occurs_on(check_date):
+            return check_date
+        before = self.calendar.find(check_date - timedelta(days=1))
+        if before is not None and before.policy == 'shift_next':
+            source = self._first_in(before)
+            if source is not None:
+                return source
+        after = self.calendar.find(check_date + timedelta(days=1))
+        if after is not None and after.policy == 'shift_earlier':
+            return self._first_in(after)
+        return None
+
+    def occurs_on(self, check_date: date) -> bool:
+        return self.source_date(check_date) is not None
+
+    def next_on_or_after(self, check_date: date) -> Optional[date]:
+        # البدء من أول فترة تحتوي اليوم السابق: موعد داخلها قد يُنقل إلى check_date أو بعده
+        current = check_date
+        previous = self.calendar.find(check_date - timedelta(days=1))
+        if previous is not None:
+            current = previous.start
+        while True:
+            candidate = self.inner.next_on_or_after(current)
+            if candidate is None:
+                return None
+            window = self.calendar.find(candidate)
+            if window is None:
+                return candidate
+            if window.policy == 'shift_next' and window.end + timedelta(days=1) >= check_date:
+                return window.end + timedelta(days=1)
+            if window.policy == 'shift_earlier' and window.start - timedelta(days=1) >= check_date:
+                return window.start - timedelta(days=1)
+            current = window.end + timedelta(days=1)
+
+    def mask(self, axis: DayAxis):
+        result = self.inner.mask(axis) & ~self.calendar.mask(axis)
+        if not len(axis.ordinals):
+            return result
+        first = int(axis.ordinals[0])
+        last_day = axis.start + timedelta(days=len(axis.ordinals) - 1)
+        # الفترات التي قد يقع هدف نقلها داخل المحور (قبله أو بعده بيوم)
+        for window in self.calendar.overlapping(axis.start - timedelta(days=1), last_day + timedelta(days=1)):
+            if window.policy == 'skip' or self._first_in(window) is None:
+                continue
+            target = window.end + timedelta(days=1) if window.policy == 'shift_next' else window.start - timedelta(days=1)
+            index = target.toordinal() - first
+            if 0 <= index < len(result):
+                result[index] = True
+        return result
+
+    def describe(self, check_date: date) -> Tuple[str, Dict[str, Any]]:
+        source = self.source_date(check_date) or check_date
+        task_type, details = self.inner.describe(source)
+        if source != check_date:
+            details = {**details, 'shifted_from': source.isoformat()}
+        return task_type, details
+
+    # استعلامات خاصة بنوع القاعدة: تُجاب عن التاريخ الأصلي للموعد
+    def drug_on(self, check_date: date) -> Optional[str]:
+        source = self.source_date(check_date)
+        return self.inner.drug_on(source) if source else None
+
+    def task_on(self, check_date: date) -> Optional[str]:
+        source = self.source_date(check_date)
+        return self.inner.task_on(source) if source else None
+
+    def matches(self, check_date: date, weather_report: Optional[Mapping[str, Any]] = None) -> bool:
+        source = self.source_date(check_date)
+        return source is not None and self.inner.matches(source, weather_report)
+
+
+@dataclass(frozen=True)
+class DerivedRule(RecurringRule):
+    """مهمة مشتقة من مهمة أخرى: تبدأ بعد offset_days من كل موعد للأصل وتستمر duration_days يوماً"""
+    key: str
+    parent: RecurringRule
+    offset_days: int
+    duration_days: int
+    task_type: str
+    details: Mapping[str, Any]
+    time_of_day: time
+
+    def source_date(self, check_date: date) -> Optional[date]:
+        """موعد الأصل الذي تنتج عنه المهمة في check_date (None = لا مهمة)"""
+        source = self.parent.next_on_or_after(check_date - timedelta(days=self.offset_days + self.duration_days - 1))
+        if source is None or source > check_date - timedelta(days=self.offset_days):
+            return None
+        return source
+
+    def occurs_on(self, check_date: date) -> bool:
+        return self.source_date(check_date) is not None
+
+    def next_on_or_after(self, check_date: date) -> Optional[date]:
+        source = self.parent.next_on_or_after(check_date - timedelta(days=self.offset_days + self.duration_days - 1))
+        if source is None:
+            return None
+        return max(check_date, source + timedelta(days=self.offset_days))
+
+    def mask(self, axis: DayAxis):
+        # قناع الأصل على محور مُزاح بمقدار offset ومُمدد بمقدار duration، ثم نافذة منزلقة بالمجموع التراكمي
+        days = len(axis.ordinals)
+        lookback = self.offset_days + self.duration_days - 1
+        parent_mask = self.parent.mask(day_axis(axis.start - timedelta(days=lookback), days + self.duration_days - 1))
+        counts = np.concatenate(([0], np.cumsum(parent_mask, dtype=np.int64)))
+        return counts[self.duration_days:self.duration_days + days] - counts[:days] > 0
+
+    def describe(self, check_date: date) -> Tuple[str, Dict[str, Any]]:
+        source = self.source_date(check_date) or check_date
+        _, parent_details = self.parent.describe(source)
+        return self.task_type, {**parent_details, **self.details, 'derived_from': self.parent.key,
+                                'source_date': source.isoformat()}
+
+
+class EventHorizon(NamedTuple):
+    """مواعيد الفترة [start, end) محسوبة مرة واحدة - أي فترة داخلها تُقتطع بالبحث الثنائي"""
+    start: datetime
+    end: datetime
+    events: List[ScheduledEvent]
+    times: List[datetime]
+
+    def covers(self, start: datetime, end: datetime) -> bool:
+        return self.start <= start and end <= self.end
+
+    def between(self, start: datetime, end: datetime) -> List[ScheduledEvent]:
+        return self.events[bisect_left(self.times, start):bisect_left(self.times, end)]
+
+
+class OccurrenceMatrix(NamedTuple):
+    """مصفوفة منطقية (قواعد × أيام) مع أقنعة المواسم لنفس الأيام"""
+    start: date
+    rules: List[RecurringRule]
+    matrix: Any                 # numpy bool[len(rules), days] أو قائمة قوائم بدون numpy
+    season_masks: Dict[str, Any]
+
+    @property
+    def days(self) -> int:
+        return len(self.matrix[0]) if len(self.rules) else 0
+
+
+@dataclass(frozen=True)
+class CompiledSchedule:
+    """الجدول الكامل بعد التجميع - غير قابل للتعديل"""
+    seasons: Mapping[str, SeasonCalendar]
+    deworming: Optional[DewormingRule]
+    vitamin_triggers: FrozenSet[str]
+    coccidiosis_triggers: FrozenSet[str]
+    intervals: Mapping[str, RecurringRule]   # IntervalRule أو CronRule
+    pipe_waterer: Optional[PipeWatererRule]
+    trees: Mapping[str, TreeRule]
+    config_rules: Mapping[str, ConfigRule]
+    derived: Mapping[str, DerivedRule]             # المهام المشتقة بالترتيب الطوبولوجي
+    blackouts: Optional[BlackoutCalendar] = None   # فترات التوقف العامة (لكل المهام)
+
+    def blackout_on(self, check_date: date) -> Optional[BlackoutWindow]:
+        """فترة التوقف العامة في هذا التاريخ أو None"""
+        return self.blackouts.find(check_date) if self.blackouts else None
+
+    def in_season(self, season_name: str, check_date: date) -> bool:
+        """هل التاريخ داخل الموسم المحدد؟"""
+        season = self.seasons.get(season_name)
+        return season is not None and season.contains(check_date)
+
+    def interval_occurs_on(self, key: str, check_date: date) -> bool:
+        """هل تقع المهمة الدورية key في هذا التاريخ؟"""
+        rule = self.intervals.get(key)
+        return rule is not None and rule.occurs_on(check_date)
+
+    def rules(self) -> List[RecurringRule]:
+        """كل قواعد التقويم بترتيب العرض: دواء الديدان، المهام الدورية، السقاية، الأشجار، قواعد rules، المشتقة"""
+        rules = []
+        if self.deworming:
+            rules.append(self.deworming)
+        rules.extend(self.intervals.values())
+        if self.pipe_waterer:
+            rules.append(self.pipe_waterer)
+        rules.extend(self.trees.values())
+        rules.extend(rule for rule in self.config_rules.values() if rule.in_calendar)
+        rules.extend(self.derived.values())
+        return rules
+
+    def iter_events(self, start: datetime, keys: Optional[Collection[str]] = None) -> Iterator[ScheduledEvent]:
+        """تدفق زمني كسول لكل المهام (أو للقواعد keys فقط): دمج k تدفقات (واحد لكل قاعدة) عبر كومة"""
+        streams = [rule.events(start, order) for order, rule in enumerate(self.rules())
+                   if keys is None or rule.key in keys]
+        return heapq.merge(*streams)
+
+    def occurrence_matrix(self, start: date, days: int,
+                          rules: Optional[List[RecurringRule]] = None) -> OccurrenceMatrix:
+        """تقييم كل القواعد (أو rules فقط) والمواسم على days يوماً دفعة واحدة (متجه عند توفر numpy)"""
+        if rules is None:
+            rules = self.rules()
+
+        if np is None:
+            dates = [start + timedelta(days=i) for i in range(days)]
+            matrix = [[rule.occurs_on(d) for d in dates] for rule in rules]
+            season_masks = {name: [season.contains(d) for d in dates]
+                            for name, season in self.seasons.items()}
+            return OccurrenceMatrix(start, rules, matrix, season_masks)
+
+        axis = day_axis(start, days)
+        matrix = np.zeros((len(rules), days), dtype=bool)
+        for index, rule in enumerate(rules):
+            matrix[index] = rule.mask(axis)
+        season_masks = {name: season.mask(axis) for name, season in self.seasons.items()}
+        return OccurrenceMatrix(start, rules, matrix, season_masks)
+
+    def events_between(self, start: datetime, end: datetime,
+                       keys: Optional[Collection[str]] = None) -> List[ScheduledEvent]:
+        """كل المواعيد في الفترة [start, end) مرتبة زمنياً، محسوبة من مصفوفة المواعيد
+
+        keys تحصر الحساب في قواعد محددة، مع بقاء ترتيب كل قاعدة (order) كما في الجدول الكامل.
+        """
+        if np is None:
+            return list(takewhile(lambda event: event.when < end, self.iter_events(start, keys)))
+
+        all_rules = self.rules()
+        orders = [order for order, rule in enumerate(all_rules) if keys is None or rule.key in keys]
+        first_day = start.date()
+        result = self.occurrence_matrix(first_day, (end.date() - first_day).days + 1,
+                                        [all_rules[order] for order in orders])
+        rule_index, day_index = np.nonzero(result.matrix)
+
+        # الترتيب حسب (اليوم، وقت المهمة) ثم ترتيب القاعدة - نفس ترتيب iter_events
+        seconds = np.array([r.time_of_day.hour * 3600 + r.time_of_day.minute * 60 + r.time_of_day.second
+                            for r in result.rules], dtype=np.int64)
+        stamps = day_index * 86400 + seconds[rule_index] if len(result.rules) else day_index
+
+        events = []
+        for i in np.lexsort((rule_index, stamps)):
+            rule = result.rules[int(rule_index[i])]
+            order = orders[int(rule_index[i])]
+            check_date = first_day + timedelta(days=int(day_index[i]))
+            when = datetime.combine(check_date, rule.time_of_day)
+            if start <= when < end:
+                task_type, details = rule.describe(check_date)
+                events.append(ScheduledEvent(when, order, rule.key, task_type, details))
+        return events
+
+    def rule(self, key: str) -> Optional[RecurringRule]:
+        """إيجاد القاعدة بالاسم: deworming أو pipe_waterer أو مهمة دورية أو شجرة أو قاعدة من rules"""
+        if key == 'deworming':
+            return self.deworming
+        if key == 'pipe_waterer':
+            return self.pipe_waterer
+        if key in self.intervals:
+            return self.intervals[key]
+        if key in self.trees:
+            return self.trees[key]
+        if key in self.derived:
+            return self.derived[key]
+        return self.config_rules.get(key)
+
+
+_SECTION_POOL: Dict[Tuple[str, ...], Any] = {}
+
+
+def _canonical(value: Any) -> str:
+    """نص ثابت لقسم من الإعدادات (ترتيب المفاتيح لا يغير البصمة)"""
+    return json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+
+
+def _interned(fingerprint: Tuple[str, ...], compile_section: Callable[[], Any]) -> Any:
+    """الأقسام المتطابقة نصياً تُجمَّع مرة واحدة وتتشارك الجداول نفس الكائن (كل الأقسام غير قابلة للتعديل)"""
+    section = _SECTION_POOL.get(fingerprint)
+    if section is None:
+        section = compile_section()
+        if len(_SECTION_POOL) >= SECTION_POOL_SIZE:
+            del _SECTION_POOL[next(iter(_SECTION_POOL))]
+        _SECTION_POOL[fingerprint] = section
+    return section
+
+
+def section_pool_size() -> int:
+    """عدد الأقسام المُجمَّعة المحفوظة للمشاركة في هذه العملية"""
+    return len(_SECTION_POOL)
+
+
+def _time_for(key: str, entry: Mapping[str, Any], cron: Optional[CronExpression] = None) -> time:
+    """وقت المهمة من الإعدادات، ثم من تعبير cron، ثم القيمة الافتراضية"""
+    if entry.get('time'):
+        return parse_time(entry['time'])
+    if cron is not None and cron.time_of_day is not None:
+        return cron.time_of_day
+    return parse_time(DEFAULT_TIMES.get(key, FALLBACK_TIME))
+
+
+def _season_window(entry: Mapping[str, Any], seasons: Mapping[str, SeasonCalendar]) -> Tuple[SeasonCalendar, ...]:
+    """تحويل قائمة أسماء المواسم في المدخل إلى نافذة مواسم"""
+    windows = []
+    for season_name in entry.get('seasons', []):
+        if season_name not in seasons:
+            raise ValueError(f"الموسم {season_name} غير معرف في seasons")
+        windows.append(seasons[season_name])
+    return tuple(windows)
+
+
+def _compile_cron(entry: Mapping[str, Any]) -> Optional[CronExpression]:
+    return parse_cron(entry['cron']) if entry.get('cron') else None
+
+
+def _month_day_range(start_str: str, end_str: str) -> Tuple[int, int]:
+    return day_of_year_index(*parse_month_day(start_str)), day_of_year_index(*parse_month_day(end_str))
+
+
+def _split_by_year(start: date, end: date) -> Iterator[Tuple[int, Tuple[int, int]]]:
+    """تقسيم فترة تواريخ كاملة إلى أجزاء داخل كل سنة"""
+    for year in range(start.year, end.year + 1):
+        first = start if year == start.year else date(year, 1, 1)
+        last = end if year == end.year else date(year, 12, 31)
+        yield year, (day_of_year_index(first.month, first.day), day_of_year_index(last.month, last.day))
+
+
+def _compile_season(season_name: str, spec: Any) -> SeasonCalendar:
+    """
+    الصيغ المقبولة:
+    - [["MM-DD", "MM-DD"], ...] فترات تتكرر كل سنة
+    - {"ranges": [...], "overrides": {"YYYY": [["MM-DD", "MM-DD"], ...]}} مع استبدال فترات سنة محددة
+    - [["YYYY-MM-DD", "YYYY-MM-DD"], ...] الصيغة القديمة: تعامل كفترات خاصة بسنواتها
+    """
+    if isinstance(spec, Mapping):
+        season_ranges, overrides = spec.get('ranges', []), spec.get('overrides', {})
+    else:
+        season_ranges, overrides = spec, {}
+
+    recurring = []
+    year_ranges: Dict[int, List[Tuple[int, int]]] = {}
+
+    for start_str, end_str in season_ranges:
+        try:
+            if len(start_str) == len(end_str) == 5:
+                recurring.append(_month_day_range(start_str, end_str))
+            else:
+                for year, day_range in _split_by_year(parse_date(start_str), parse_date(end_str)):
+                    year_ranges.setdefault(year, []).append(day_range)
+        except ValueError as e:
+            print(f"⚠️ خطأ في تحليل تواريخ الموسم {season_name}: {e}")
+
+    for year_str, override_ranges in overrides.items():
+        try:
+            year_ranges[int(year_str)] = [_month_day_range(start_str, end_str)
+                                          for start_str, end_str in override_ranges]
+        except ValueError as e:
+            print(f"⚠️ خطأ في تحليل استثناءات الموسم {season_name} لسنة {year_str}: {e}")
+
+    return SeasonCalendar(
+        name=season_name,
+        bitmap=season_bitmap(recurring) if recurring else None,
+        year_bitmaps=MappingProxyType({year: season_bitmap(ranges) for year, ranges in year_ranges.items()}),
+    )
+
+
+def _compile_seasons(seasons: Mapping[str, Any]) -> Dict[str, SeasonCalendar]:
+    return {season_name: _interned(('season', season_name, _canonical(spec)),
+                                   lambda name=season_name, spec=spec: _compile_season(name, spec))
+            for season_name, spec in seasons.items()}
+
+
+def _compile_deworming(entry: Mapping[str, Any]) -> Optional[DewormingRule]:
+    seasonal_schedule = entry.get('seasonal_schedule', [])
+    schedule = {}
+    for item in seasonal_schedule:
+        month, day = (int(part) for part in item['date'].split('-'))
+        schedule[(month, day)] = item['drug']
+    default_drug = seasonal_schedule[0]['drug'] if seasonal_schedule else "Fenbendazole"
+    return DewormingRule(MappingProxyType(schedule), default_drug, _time_for('deworming', entry))
+
+
+def _compile_pipe_waterer(entry: Mapping[str, Any]) -> PipeWatererRule:
+    configured = entry.get('intervals', {})
+    intervals = tuple((task, configured.get(task, default)) for task, default in PIPE_WATERER_TASKS)
+    for task, interval in intervals:
+        if interval <= 0:
+            raise ValueError(f"الفاصل غير صالح للمهمة {task}: {interval}")
+    return PipeWatererRule(parse_date(entry['start_date']), intervals, _time_for('pipe_waterer', entry))
+
+
+def _compile_interval(key: str, entry: Mapping[str, Any],
+                      seasons: Mapping[str, SeasonCalendar]) -> RecurringRule:
+    if entry.get('cron'):
+        cron = parse_cron(entry['cron'])
+        return CronRule(key, cron, _season_window(entry, seasons), _time_for(key, entry, cron))
+    if entry['interval_days'] <= 0:
+        raise ValueError(f"interval_days غير صالح: {entry['interval_days']}")
+    return IntervalRule(key, parse_date(entry['start_date']), entry['interval_days'], _time_for(key, entry))
+
+
+def _compile_stages(entry: Mapping[str, Any]) -> Tuple[GrowthStage, ...]:
+    """مراحل النمو: كل مرحلة تبدأ عند عمر from_age_days من planted_date وتنتهي عند بداية التالية.
+
+    أول موعد في المرحلة يكمل سلسلة المرحلة السابقة (آخر تسميد + فاصلها)،
+    لذلك تُحسب نقاط الارتكاز مرة واحدة هنا ويبقى الاستعلام حساباً مباشراً.
+    """
+    specs = entry.get('stages')
+    if not specs:
+        return ()
+    if 'planted_date' not in entry:
+        raise ValueError("stages تتطلب planted_date")
+    planted = parse_date(entry['planted_date'])
+
+    ages = [spec.get('from_age_days', 0) for spec in specs]
+    if ages[0] != 0 or any(a >= b for a, b in zip(ages, ages[1:])):
+        raise ValueError("from_age_days يجب أن يبدأ من 0 ويتزايد")
+
+    stages = []
+    anchor = planted
+    for index, spec in enumerate(specs):
+        interval_days = spec['interval_days']
+        if interval_days <= 0:
+            raise ValueError(f"interval_days غير صالح في المرحلة {index + 1}")
+        start = planted + timedelta(days=ages[index])
+        end = planted + timedelta(days=ages[index + 1]) if index + 1 < len(ages) else None
+        if stages:
+            anchor = next_multiple(stages[-1].anchor, stages[-1].interval_days, start)
+        stages.append(GrowthStage(
+            name=spec.get('name', f'stage_{index + 1}'),
+            start=start,
+            end=end,
+            anchor=anchor,
+            interval_days=interval_days,
+            fertilizer=spec.get('fertilizer'),
+            amount_kg=spec.get('amount_kg'),
+        ))
+    return tuple(stages)
+
+
+def _compile_tree(key: str, entry: Mapping[str, Any], seasons: Mapping[str, SeasonCalendar]) -> TreeRule:
+    has_interval = 'start_date' in entry and 'interval_days' in entry
+    cron = _compile_cron(entry)
+    stages = _compile_stages(entry)
+    if stages and (cron or has_interval):
+        raise ValueError("stages لا تُجمع مع cron أو start_date/interval_days")
+    if has_interval and entry['interval_days'] <= 0:
+        raise ValueError(f"interval_days غير صالح: {entry['interval_days']}")
+    return TreeRule(
+        key=key,
+        start_date=parse_date(entry['start_date']) if has_interval else None,
+        interval_days=entry['interval_days'] if has_interval else None,
+        dates=tuple(sorted(parse_date(d) for d in entry.get('dates', []))),
+        fertilizer=entry.get('fertilizer'),
+        fertilizers=tuple(entry.get('fertilizers', [])),
+        amount_kg=entry.get('amount_kg', 0),
+        max_temp=entry.get('max_temp'),
+        details=MappingProxyType(dict(entry)),
+        time_of_day=_time_for('fertilizer', entry, cron),
+        cron=cron,
+        seasons=_season_window(entry, seasons),
+        stages=stages,
+    )
+
+
+def _compile_weather(conditions: Mapping[str, Any]) -> Tuple[WeatherCondition, ...]:
+    """{"heat_wave": true, "max_temp_48h": {"min": 35}} -> شروط طقس"""
+    compiled = []
+    for field, spec in conditions.items():
+        if isinstance(spec, bool):
+            compiled.append(WeatherCondition(field, equals=spec))
+        elif isinstance(spec, Mapping):
+            compiled.append(WeatherCondition(field, minimum=spec.get('min'), maximum=spec.get('max')))
+        else:
+            raise ValueError(f"شرط طقس غير مدعوم للحقل {field}: {spec}")
+    return tuple(compiled)
+
+
+def _compile_config_rule(key: str, entry: Mapping[str, Any],
+                         seasons: Mapping[str, SeasonCalendar]) -> ConfigRule:
+    interval_days = entry.get('interval_days')
+    if interval_days is not None and 'start_date' not in entry:
+        raise ValueError("interval_days يتطلب start_date")
+    if interval_days is not None and interval_days <= 0:
+        raise ValueError(f"interval_days غير صالح: {interval_days}")
+    cron = _compile_cron(entry)
+    if cron is not None and interval_days is not None:
+        raise ValueError("cron لا يُجمع مع interval_days")
+
+    return ConfigRule(
+        key=key,
+        start_date=parse_date(entry['start_date']) if 'start_date' in entry else None,
+        interval_days=interval_days,
+        seasons=_season_window(entry, seasons),
+        weather=_compile_weather(entry.get('weather', {})),
+        details=MappingProxyType({
+            'title_ar': entry.get('title_ar', key),
+            'title_bn': entry.get('title_bn', entry.get('title_ar', key)),
+            'priority': entry.get('priority', DEFAULT_RULE_PRIORITY),
+            'icon': entry.get('icon', DEFAULT_RULE_ICON),
+            'message_ar': entry.get('message_ar', ''),
+            'message_bn': entry.get('message_bn', ''),
+            'image': entry.get('image'),
+            'page': entry.get('page'),
+        }),
+        time_of_day=_time_for(key, entry, cron),
+        cron=cron,
+    )
+
+
+def _compile_blackouts(specs: Iterable[Mapping[str, Any]],
+                       groups: Mapping[str, FrozenSet[str]]) -> List[Tuple[BlackoutWindow, Optional[FrozenSet[str]]]]:
+    """قائمة blackouts -> (الفترة، أسماء المهام أو المجموعات المشمولة أو None للكل)
+
+    groups: أسماء القواعد في كل مجموعة (chicken، trees، rules، derived). فترة تتداخل أو تتلاصق
+    مع فترة سابقة بسياسة مختلفة وتشمل قاعدة مشتركة تُرفض: الدمج كان سيلغي مواعيد يجب نقلها.
+    """
+    everything = frozenset().union(*groups.values())
+
+    def covered(tasks: Optional[FrozenSet[str]]) -> FrozenSet[str]:
+        if tasks is None:
+            return everything
+        return frozenset().union(*(groups.get(name, {name}) for name in tasks))
+
+    compiled = []
+    accepted = []
+    for index, spec in enumerate(specs):
+        try:
+            start = parse_date(spec['start'])
+            end = parse_date(spec.get('end', spec['start']))
+            policy = spec.get('policy', 'skip')
+            if policy not in BLACKOUT_POLICIES:
+                raise ValueError(f"سياسة غير معروفة {policy} (المسموح: {', '.join(BLACKOUT_POLICIES)})")
+            if end < start:
+                raise ValueError("end قبل start")
+            tasks = frozenset(spec['tasks']) if spec.get('tasks') else None
+            rules = covered(tasks)
+            for other_index, other, other_rules in accepted:
+                if other.policy != policy and start <= other.end + timedelta(days=1) \
+                        and other.start <= end + timedelta(days=1) and rules & other_rules:
+                    raise ValueError(f"تتداخل أو تتلاصق مع فترة التوقف رقم {other_index + 1} "
+                                     f"بسياسة مختلفة ({other.policy}) - اجعلهما بنفس السياسة أو افصل بينهما")
+            window = BlackoutWindow(start, end, policy, spec.get('reason', ''))
+            accepted.append((index, window, rules))
+            compiled.append((window, tasks))
+        except (KeyError, ValueError) as e:
+            print(f"⚠️ خطأ في فترة التوقف رقم {index + 1}: {e}")
+    return compiled
+
+
+def _apply_blackouts(rule: Optional[RecurringRule], group: str,
+                     blackouts: List[Tuple[BlackoutWindow, Optional[FrozenSet[str]]]]) -> Optional[RecurringRule]:
+    """تغليف القاعدة بتقويم التوقف الخاص بها (بدون فترات تبقى القاعدة كما هي)"""
+    if rule is None:
+        return None
+    windows = [window for window, tasks in blackouts if tasks is None or rule.key in tasks or group in tasks]
+    return BlackoutRule(rule, BlackoutCalendar.build(windows)) if windows else rule
+
+
+def _topological_order(specs: Mapping[str, Mapping[str, Any]]) -> List[str]:
+    """ترتيب المهام المشتقة بحيث يسبق كل أصل مشتقاته (خوارزمية Kahn) - المهام الواقعة في حلقة لا تظهر في الناتج"""
+    children: Dict[str, List[str]] = {key: [] for key in specs}
+    pending = {}
+    for key, spec in specs.items():
+        parent = spec['after']
+        pending[key] = 1 if parent in specs else 0
+        if parent in specs:
+            children[parent].append(key)
+
+    ready = [key for key in specs if pending[key] == 0]
+    order = []
+    while ready:
+        key = ready.pop(0)
+        order.append(key)
+        for child in children[key]:
+            pending[child] -= 1
+            if pending[child] == 0:
+                ready.append(child)
+    return order
+
+
+def _compile_derived_rule(key: str, entry: Mapping[str, Any], parent: RecurringRule) -> DerivedRule:
+    offset_days = entry.get('offset_days', 1)
+    duration_days = entry.get('duration_days', 1)
+    if duration_days < 1:
+        raise ValueError("duration_days يجب أن يكون 1 على الأقل")
+    details = {name: value for name, value in entry.items() if name not in DERIVED_TASK_KEYS}
+    if 'title_ar' in details:
+        details.setdefault('title_bn', details['title_ar'])
+        details.setdefault('priority', DEFAULT_RULE_PRIORITY)
+        details.setdefault('icon', DEFAULT_RULE_ICON)
+    return DerivedRule(
+        key=key,
+        parent=parent,
+        offset_days=offset_days,
+        duration_days=duration_days,
+        task_type=entry.get('type', key),
+        details=MappingProxyType(details),
+        time_of_day=parse_time(entry['time']) if entry.get('time') else parent.time_of_day,
+    )
+
+
+def derived_task_specs(config: Mapping[str, Any]) -> Mapping[str, Any]:
+    """قسم derived_tasks، أو المهمة الافتراضية بعد دواء الديدان إذا غاب القسم وطلبتها شروط الفيتامينات"""
+    if 'derived_tasks' in config:
+        return config['derived_tasks']
+    chicken = config.get('chicken_schedule', {})
+    triggers = chicken.get('vitamins', {}).get('trigger_conditions', [])
+    if 'post_deworming' in triggers and 'deworming' in chicken:
+        return DEFAULT_POST_DEWORMING_TASKS
+    return {}
+
+
+def compile_schedule(config: Mapping[str, Any]) -> CompiledSchedule:
+    """تحويل ملف الإعدادات إلى جدول مُجمَّع (تحليل التواريخ مرة واحدة فقط)"""
+    chicken = config.get('chicken_schedule', {})
+    season_specs = config.get('seasons', {})
+    seasons = _compile_seasons(season_specs)
+
+    def fingerprint(kind: str, key: str, entry: Mapping[str, Any]) -> Tuple[str, ...]:
+        # المواسم المشار إليها جزء من البصمة: نفس المدخل مع مواسم مختلفة قسم مختلف
+        window = {name: season_specs.get(name) for name in entry.get('seasons', [])}
+        return kind, key, _canonical(entry), _canonical(window)
+
+    deworming = None
+    if 'deworming' in chicken:
+        try:
+            deworming = _interned(fingerprint('deworming', 'deworming', chicken['deworming']),
+                                  lambda: _compile_deworming(chicken['deworming']))
+        except (KeyError, ValueError) as e:
+            print(f"⚠️ خطأ في تجميع جدول دواء الديدان: {e}")
+
+    pipe_waterer = None
+    if chicken.get('pipe_waterer'):
+        try:
+            pipe_waterer = _interned(fingerprint('pipe_waterer', 'pipe_waterer', chicken['pipe_waterer']),
+                                     lambda: _compile_pipe_waterer(chicken['pipe_waterer']))
+        except (KeyError, ValueError) as e:
+            print(f"⚠️ خطأ في تجميع السقاية الأنبوبية: {e}")
+
+    # كل مهمة دجاج لها cron أو start_date و interval_days تصبح مهمة دورية
+    intervals = {}
+    for key, entry in chicken.items():
+        if key == 'pipe_waterer' or not isinstance(entry, dict):
+            continue
+        try:
+            if entry.get('cron') or ('start_date' in entry and 'interval_days' in entry):
+                intervals[key] = _interned(fingerprint('interval', key, entry),
+                                           lambda: _compile_interval(key, entry, seasons))
+        except (KeyError, ValueError) as e:
+            print(f"⚠️ خطأ في تجميع المهمة {key}: {e}")
+
+    trees = {}
+    for key, entry in config.get('trees_fertilizer_schedule', {}).items():
+        try:
+            trees[key] = _interned(fingerprint('tree', key, entry), lambda: _compile_tree(key, entry, seasons))
+        except (KeyError, ValueError) as e:
+            print(f"⚠️ خطأ في تجميع جدول تسميد {key}: {e}")
+
+    # قواعد معرفة بالكامل في الإعدادات (مهام جديدة بدون كود)
+    config_rules = {}
+    for key, entry in config.get('rules', {}).items():
+        if key in intervals or key in trees or key in ('deworming', 'pipe_waterer'):
+            print(f"⚠️ القاعدة {key} تحمل اسم مهمة موجودة - تم تجاهلها")
+            continue
+        try:
+            config_rules[key] = _interned(fingerprint('rule', key, entry),
+                                          lambda: _compile_config_rule(key, entry, seasons))
+        except (KeyError, ValueError) as e:
+            print(f"⚠️ خطأ في تجميع القاعدة {key}: {e}")
+
+    # فترات التوقف تُطبق بتغليف القواعد، فيراها كل من يستخدم الجدول (المنطق، API، الملف الثابت)
+    groups = {
+        'chicken': frozenset(intervals) | {'deworming', 'pipe_waterer'},
+        'trees': frozenset(trees),
+        'rules': frozenset(config_rules),
+        'derived': frozenset(derived_task_specs(config)),
+    }
+    blackouts = _compile_blackouts(config.get('blackouts', []), groups)
+    if blackouts:
+        deworming = _apply_blackouts(deworming, 'chicken', blackouts)
+        pipe_waterer = _apply_blackouts(pipe_waterer, 'chicken', blackouts)
+        intervals = {key: _apply_blackouts(rule, 'chicken', blackouts) for key, rule in intervals.items()}
+        trees = {key: _apply_blackouts(rule, 'trees', blackouts) for key, rule in trees.items()}
+        config_rules = {key: _apply_blackouts(rule, 'rules', blackouts) for key, rule in config_rules.items()}
+
+    # المهام المشتقة: تُجمَّع بالترتيب الطوبولوجي فيجد كل مشتق أصله جاهزاً (مع فترات التوقف)
+    derived = {}
+    derived_specs = derived_task_specs(config)
+    base = CompiledSchedule(MappingProxyType(seasons), deworming, frozenset(), frozenset(),
+                            MappingProxyType(intervals), pipe_waterer, MappingProxyType(trees),
+                            MappingProxyType(config_rules), MappingProxyType({}))
+    try:
+        order = _topological_order(derived_specs)
+    except KeyError as e:
+        print(f"⚠️ مهمة مشتقة بدون الحقل {e} - تم تجاهل derived_tasks")
+        derived_specs, order = {}, []
+    cycle = sorted(key for key in derived_specs if key not in order)
+    if cycle:
+        print(f"⚠️ حلقة في المهام المشتقة - تم تجاهل: {', '.join(cycle)}")
+    for key in order:
+        entry = derived_specs[key]
+        if base.rule(key) is not None:
+            print(f"⚠️ المهمة المشتقة {key} تحمل اسم مهمة موجودة - تم تجاهلها")
+            continue
+        try:
+            parent = derived.get(entry['after']) or base.rule(entry['after'])
+            if parent is None:
+                raise ValueError(f"المهمة الأصل {entry['after']} غير موجودة")
+            derived[key] = _apply_blackouts(_compile_derived_rule(key, entry, parent), 'derived', blackouts)
+        except (KeyError, ValueError) as e:
+            print(f"⚠️ خطأ في تجميع المهمة المشتقة {key}: {e}")
+
+    return CompiledSchedule(
+        seasons=MappingProxyType(seasons),
+        deworming=deworming,
+        vitamin_triggers=frozenset(chicken.get('vitamins', {}).get('trigger_conditions', [])),
+        coccidiosis_triggers=frozenset(chicken.get('coccidiosis', {}).get('trigger_conditions', [])),
+        intervals=MappingProxyType(intervals),
+        pipe_waterer=pipe_waterer,
+        trees=MappingProxyType(trees),
+        config_rules=MappingProxyType(config_rules),
+        blackouts=BlackoutCalendar.build(window for window, tasks in blackouts if tasks is None),
+        derived=MappingProxyType(derived),
+    )
+
+
+def rule_fingerprints(config: Mapping[str, Any], schedule: CompiledSchedule) -> Dict[str, str]:
+    """بصمة لكل قاعدة في التقويم من نص إعداداتها - تتغير فقط إذا أمكن أن تتغير مواعيد القاعدة.
+
+    تشمل البصمة: مدخل القاعدة، المواسم التي يشير إليها، فترات التوقف المطبقة عليه،
+    وبصمة الأصل للمهام المشتقة (تعديل الأصل يغير مواعيد مشتقاته).
+    """
+    season_specs = config.get('seasons', {})
+    blackouts = config.get('blackouts', [])
+    fingerprints = {}
+
+    for rule in schedule.rules():
+        key = rule.key
+        if key in schedule.derived:
+            group, entry = 'derived', derived_task_specs(config)[key]
+        elif key in schedule.trees:
+            group, entry = 'trees', config.get('trees_fertilizer_schedule', {})[key]
+        elif key in schedule.config_rules:
+            group, entry = 'rules', config.get('rules', {})[key]
+        else:
+            group, entry = 'chicken', config.get('chicken_schedule', {}).get(key, {})
+
+        window = {name: season_specs.get(name) for name in entry.get('seasons', [])}
+        applied = [spec for spec in blackouts
+                   if not spec.get('tasks') or key in spec['tasks'] or group in spec['tasks']]
+        parent = fingerprints.get(entry['after']) if group == 'derived' else None
+        payload = _canonical([group, key, entry, window, applied, parent])
+        fingerprints[key] = hashlib.sha1(payload.encode('utf-8')).hexdigest()
+    return fingerprints
+
+
+def _frozen_mapping(items: Dict[Any, Any]) -> Mapping[Any, Any]:
+    return MappingProxyType(items)
+
+
+def _schedule_pickler(f) -> pickle.Pickler:
+    """Pickler لملف الجدول فقط: MappingProxyType (لا يُحفظ افتراضياً) يُحفظ كقاموس ويُغلَّف من جديد
+    عند التحميل - جدول خاص بهذا الـ Pickler بدل تسجيل عام في copyreg يؤثر على كل pickle في العملية"""
+    pickler = pickle.Pickler(f, protocol=pickle.HIGHEST_PROTOCOL)
+    pickler.dispatch_table = {**copyreg.dispatch_table,
+                              MappingProxyType: lambda proxy: (_frozen_mapping, (dict(proxy),))}
+    return pickler
+
+
+def schedule_cache_path(config_path: str) -> str:
+    """مسار ملف الجدول المحفوظ لملف إعدادات: config.json -> .config.schedule.pickle في نفس المجلد"""
+    directory, name = os.path.split(config_path)
+    return os.path.join(directory, f".{os.path.splitext(name)[0]}{SCHEDULE_CACHE_SUFFIX}")
+
+
+def schedule_cache_key(config: Mapping[str, Any]) -> str:
+    """بصمة الإعدادات مع كود التجميع (schedule.py و cronexpr.py) - تغير أي منهما يبطل الملف المحفوظ"""
+    digest = hashlib.sha256(_canonical(config).encode('utf-8'))
+    for path in (__file__, cronexpr.__file__):
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def load_or_compile_schedule(config: Mapping[str, Any],
+                             cache_path: Optional[str] = None) -> Tuple[CompiledSchedule, bool]:
+    """الجدول من الملف المحفوظ إذا طابقت البصمة، وإلا تجميع كامل ثم حفظه - يعيد (الجدول، من_الملف)"""
+    if not cache_path:
+        return compile_schedule(config), False
+
+    key = schedule_cache_key(config)
+    try:
+        with open(cache_path, 'rb') as f:
+            # البصمة أولاً في الملف: لا يُقرأ الجدول إلا إذا طابقت
+            if pickle.load(f) == key:
+                return pickle.load(f), True
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"⚠️ تعذر قراءة الجدول المحفوظ {cache_path} - سيُعاد التجميع: {e}")
+
+    schedule = compile_schedule(config)
+    temp_path = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, 'wb') as f:
+            # البصمة والجدول في تسلسلين مستقلين (يُقرأ كل منهما بـ pickle.load منفصل)
+            _schedule_pickler(f).dump(key)
+            _schedule_pickler(f).dump(schedule)
+        os.replace(temp_path, cache_path)
+    except Exception as e:
+        print(f"⚠️ تعذر حفظ الجدول المُجمَّع في {cache_path}: {e}")
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return schedule, False
@@ -30,6 +30,12 @@ setup(
         "app",
         "weather", 
         "logic",
+        "schedule",
+        "cronexpr",
+        "notifications",
+        "generate_notifications",
+        "simulate",
+        "batch",
         "telegram_notifier"
     ],
     install_requires=read_requirements(),
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+محاكاة تشغيل النظام على فترة زمنية (backtest)
+Replay the full daily pipeline over a date range with an injected clock
+
+يمر على كل يوم في الفترة بنفس مسار التشغيل اليومي (تحليل الطقس ← سياق التقييم ← بناء الرسائل)
+بدون إرسال أي شيء، ثم يطبع تقريراً بعدد المهام لكل نوع وأكثر الأيام ازدحاماً
+وعمليات التسميد التي ألغاها الطقس.
+
+الطقس إما مسجَّل (ملف JSON بالشكل {"YYYY-MM-DD": رد OpenWeatherMap}) أو مُولَّد
+صناعياً من منحنى موسمي بسيط مع بذرة ثابتة لتكرار النتائج.
+
+الاستخدام:
+  python simulate.py --from 2025-01-01 --to 2025-12-31
+  python simulate.py --from 2025-03-01 --to 2025-06-30 --weather recorded.json --json
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import math
+import random
+import sys
+import time as time_module
+from collections import Counter
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, Optional
+
+from app import build_daily_tasks, get_messages_templates
+from logic import FarmLogic
+from weather import WeatherFetcher
+
+# وقت التشغيل اليومي المحاكى (تشغيل الصباح في GitHub Actions بتوقيت مكة)
+RUN_TIME = time(6, 0)
+
+# عدد نقاط التوقع في اليوم الواحد (كل 3 ساعات) ومدة التوقع بالأيام
+FORECAST_STEPS_PER_DAY = 8
+FORECAST_DAYS = 2
+
+# يوم الذروة الصيفية في السنة (منتصف يوليو)
+PEAK_DAY_OF_YEAR = 196
+
+
+class SimulatedClock:
+    """ساعة يتحكم بها المحاكي - تُمرَّر إلى FarmLogic بدل datetime.now"""
+
+    def __init__(self, start: datetime):
+        self.current = start
+
+    def __call__(self) -> datetime:
+        return self.current
+
+
+def synthetic_forecast(day: date, rng: random.Random, mean_temp: float = 24.0,
+                       amplitude: float = 9.0, daily_swing: float = 14.0,
+                       humidity: float = 40.0, rain_chance: float = 0.05) -> Dict:
+    """توقع صناعي بشكل رد OpenWeatherMap (48 ساعة كل 3 ساعات) لتاريخ معين"""
+    seasonal = mean_temp + amplitude * math.cos(2 * math.pi * (day.timetuple().tm_yday - PEAK_DAY_OF_YEAR) / 365.25)
+    start = datetime.combine(day, time(0, 0))
+    items = []
+
+    for offset in range(FORECAST_DAYS):
+        day_mean = seasonal + rng.gauss(0, 2)
+        rainy = rng.random() < rain_chance
+        for step in range(FORECAST_STEPS_PER_DAY):
+            hour = step * 3
+            # أبرد وقت قرابة الفجر وأحره بعد الظهر
+            temp = day_mean - daily_swing / 2 * math.cos(2 * math.pi * (hour - 3) / 24)
+            item = {
+                'dt': int((start + timedelta(days=offset, hours=hour)).timestamp()),
+                'main': {
+                    'temp': round(temp, 1),
+                    'temp_max': round(temp + 1, 1),
+                    'temp_min': round(temp - 1, 1),
+                    'humidity': round(min(100.0, max(5.0, humidity - 1.5 * (temp - seasonal) + rng.gauss(0, 8)))),
+                },
+            }
+            if rainy and rng.random() < 0.5:
+                item['rain'] = {'3h': round(rng.uniform(0.5, 5.0), 1)}
+            items.append(item)
+
+    return {'list': items}
+
+
+def load_recorded_weather(path: str) -> Dict[date, Dict]:
+    """تحميل طقس مسجَّل: {"YYYY-MM-DD": رد OpenWeatherMap}"""
+    with open(path, 'r', encoding='utf-8') as f:
+        raw = json.load(f)
+    return {date.fromisoformat(key): payload for key, payload in raw.items()}
+
+
+def _suppression_reason(tree, report: Optional[Dict]) -> str:
+    if not report:
+        return 'no_weather'
+    if not report.get('good_fertilizer_time', True):
+        return 'bad_weather'
+    if tree.max_temp is not None and report.get('max_temp_48h', 0) > tree.max_temp:
+        return 'max_temp'
+    return 'other'
+
+
+def run_simulation(config_path: str, start: date, end: date, weather_path: Optional[str] = None,
+                   seed: int = 42, top: int = 10) -> Dict:
+    """تشغيل المسار اليومي الكامل لكل يوم من start إلى end (شاملاً) وإرجاع التقرير"""
+    if end < start:
+        raise ValueError(f"نهاية الفترة {end} قبل بدايتها {start}")
+
+    clock = SimulatedClock(datetime.combine(start, RUN_TIME))
+    started = time_module.perf_counter()
+
+    # إخفاء مخرجات الطباعة اليومية - المحاكاة تعيد التقرير فقط
+    with contextlib.redirect_stdout(io.StringIO()):
+        logic = FarmLogic(config_path, clock=clock)
+        weather = WeatherFetcher('', logic.config['weather']['city'], logic.config['weather']['country'])
+        templates = get_messages_templates()
+        recorded = load_recorded_weather(weather_path) if weather_path else None
+        rng = random.Random(seed)
+
+        by_type = Counter()
+        weather_days = Counter()
+        per_day = []
+        suppressed = []
+
+        day = start
+        while day <= end:
+            clock.current = datetime.combine(day, RUN_TIME)
+
+            payload = recorded.get(day) if recorded is not None else synthetic_forecast(day, rng)
+            report = weather.analyze_conditions(payload)
+            if report:
+                for flag in ('heat_wave', 'cold_wave', 'high_humidity', 'rain_48h'):
+                    if report[flag]:
+                        weather_days[flag] += 1
+            else:
+                weather_days['missing'] += 1
+
+            ctx = logic.evaluation_context(report, day)
+            tasks = build_daily_tasks(logic, ctx, templates)
+            types = [task['task_type'] for task in tasks]
+            by_type.update(types)
+            per_day.append((day, types))
+
+            fertilized = {task['type'][len('fertilizer_'):] for task in tasks if task['task_type'] == 'fertilizer'}
+            for tree_key, tree in logic.schedule.trees.items():
+                if tree_key not in fertilized and tree.occurs_on(day):
+                    suppressed.append({'date': day.isoformat(), 'tree': tree_key,
+                                       'reason': _suppression_reason(tree, report)})
+
+            day += timedelta(days=1)
+
+    busiest = sorted(per_day, key=lambda item: (-len(item[1]), item[0]))[:top]
+    return {
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'days': len(per_day),
+        'weather': 'recorded' if weather_path else f'synthetic (seed={seed})',
+        'total_tasks': sum(by_type.values()),
+        'by_type': dict(by_type.most_common()),
+        'busiest_days': [{'date': d.isoformat(), 'count': len(types), 'types': dict(Counter(types))}
+                         for d, types in busiest if types],
+        'suppressed_fertilizations': suppressed,
+        'suppressed_by_reason': dict(Counter(item['reason'] for item in suppressed)),
+        'weather_days': dict(weather_days),
+        'elapsed_seconds': round(time_module.perf_counter() - started, 2),
+    }
+
+
+def print_report(report: Dict):
+    """طباعة تقرير المحاكاة بشكل مقروء"""
+    print("=" * 60)
+    print(f"🧪 محاكاة {report['from']} → {report['to']} ({report['days']} يوم، طقس {report['weather']})")
+    print(f"⏱️ المدة: {report['elapsed_seconds']} ثانية")
+    print("=" * 60)
+
+    print(f"\n📊 إجمالي الرسائل: {report['total_tasks']}")
+    for task_type, count in report['by_type'].items():
+        print(f"   - {task_type}: {count}")
+
+    print("\n📅 أكثر الأيام ازدحاماً:")
+    for item in report['busiest_days']:
+        details = '، '.join(f"{t}×{n}" for t, n in item['types'].items())
+        print(f"   - {item['date']}: {item['count']} رسالة ({details})")
+
+    print(f"\n🌦️ أيام الطقس: {report['weather_days']}")
+
+    suppressed = report['suppressed_fertilizations']
+    print(f"\n🚫 تسميد ألغاه الطقس: {len(suppressed)} {report['suppressed_by_reason']}")
+    for item in suppressed:
+        print(f"   - {item['date']}: {item['tree']} ({item['reason']})")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="محاكاة تشغيل نظام التنبيه على فترة زمنية")
+    parser.add_argument('--from', dest='start', required=True, type=date.fromisoformat, help="تاريخ البداية YYYY-MM-DD")
+    parser.add_argument('--to', dest='end', required=True, type=date.fromisoformat, help="تاريخ النهاية YYYY-MM-DD (شاملاً)")
+    parser.add_argument('--weather', help="ملف طقس مسجَّل {\"YYYY-MM-DD\": رد OpenWeatherMap}")
+    parser.add_argument('--seed', type=int, default=42, help="بذرة الطقس الصناعي")
+    parser.add_argument('--config', default='config.json', help="ملف الإعدادات")
+    parser.add_argument('--top', type=int, default=10, help="عدد الأيام الأكثر ازدحاماً في التقرير")
+    parser.add_argument('--json', action='store_true', help="طباعة التقرير بصيغة JSON")
+    args = parser.parse_args(argv)
+
+    try:
+        report = run_simulation(args.config, args.start, args.end, args.weather, args.seed, args.top)
+    except (OSError, ValueError) as e:
+        print(f"❌ خطأ في المحاكاة: {e}")
+        sys.exit(1)
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+اختبار واجهة API
+التحقق من أن المدخلات غير الصالحة تُرد بخطأ 400 وليس 500
+"""
+
+import sys
+import os
+import io
+import contextlib
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from datetime import date, datetime, timedelta, timezone
+with contextlib.redirect_stdout(io.StringIO()):
+    from api import app, scheduler, build_timeline
+
+client = app.test_client()
+
+
+def test_cursor_out_of_range():
+    """مؤشر بثوانٍ خارج مدى التواريخ يُرد بخطأ 400"""
+    for cursor in ('99999999999999999.1', '-99999999999999999.0', 'abc.1'):
+        response = client.get(f'/api/notifications/next?limit=2&cursor={cursor}')
+        assert response.status_code == 400, (cursor, response.status_code)
+        assert response.get_json()['success'] is False
+
+
+def test_query_at_calendar_edges():
+    """فترات عند أول وآخر تاريخ ممكن تُرد بخطأ 400 بدل تجاوز مدى التواريخ"""
+    for first, last in (('0001-01-01', '0001-01-05'), ('9999-12-20', '9999-12-31')):
+        response = client.get(f'/api/notifications?from={first}&to={last}')
+        assert response.status_code == 400, (first, last, response.status_code)
+        assert response.get_json()['success'] is False
+
+
+def test_listing_modified_when_event_passes():
+    """بدون from: Last-Modified يتقدم مع آخر إشعار حان، فلا يُرد 304 بقائمة قديمة"""
+    snapshot = scheduler.snapshot
+    timeline = build_timeline(snapshot.logic, date.today() - timedelta(days=30), snapshot.config_hash)
+    passed = timeline.last_event_before(datetime.now())
+    assert passed is not None, "لا يوجد إشعار سابق في الخط الزمني"
+    old = datetime(2000, 1, 1)
+    scheduler.snapshot = snapshot._replace(timeline=timeline._replace(built_at=old))
+    try:
+        response = client.get('/api/notifications', headers={
+            'If-Modified-Since': old.astimezone(timezone.utc).strftime('%a, %d %b %Y %H:%M:%S GMT')})
+    finally:
+        scheduler.snapshot = snapshot
+    assert response.status_code == 200, response.status_code
+    assert response.last_modified == passed.replace(microsecond=0).astimezone(timezone.utc)
+
+
+def main():
+    """الدالة الرئيسية"""
+    print("=== اختبار واجهة API ===\n")
+    for test in (test_cursor_out_of_range, test_query_at_calendar_edges,
+                 test_listing_modified_when_event_passes):
+        try:
+            test()
+            print(f"✅ {test.__doc__}")
+        except AssertionError as e:
+            print(f"❌ {test.__doc__}: {e}")
+
+
+if __name__ == "__main__":
+    main()
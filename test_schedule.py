@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+اختبار الجدول المُجمَّع
+التحقق من أن المحركات الثلاثة (مصفوفة المواعيد، التدفق الكسول، الحساب المباشر) تتفق
+"""
+
+import sys
+import os
+import io
+import contextlib
+from datetime import datetime, timedelta
+from itertools import takewhile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from schedule import compile_schedule
+
+START = datetime(2026, 1, 1)
+END = datetime(2027, 1, 1)
+
+
+def compile_quietly(config):
+    """تجميع الإعدادات مع التقاط التحذيرات المطبوعة"""
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        schedule = compile_schedule(config)
+    return schedule, output.getvalue()
+
+
+def engines(schedule, start=START, end=END):
+    """المواعيد (التاريخ، القاعدة) من كل محرك على حدة"""
+    matrix = [(e.when, e.rule_key) for e in schedule.events_between(start, end)]
+    stream = [(e.when, e.rule_key) for e in takewhile(lambda e: e.when < end, schedule.iter_events(start))]
+    direct = []
+    for rule in schedule.rules():
+        day = rule.next_on_or_after(start.date())
+        while day is not None and datetime.combine(day, rule.time_of_day) < end:
+            direct.append((datetime.combine(day, rule.time_of_day), rule.key))
+            day = rule.next_on_or_after(day + timedelta(days=1))
+    return matrix, stream, sorted(direct)
+
+
+def test_engines_agree_on_cron_and_interval_rules():
+    """قاعدة cron وقاعدة فاصل زمني: نفس المواعيد من المحركات الثلاثة"""
+    schedule, _ = compile_quietly({'rules': {
+        'cleaning': {'cron': '0 8 * * FRI#2,FRI#4', 'start_date': '2026-03-01'},
+        'inspection': {'start_date': '2025-12-30', 'interval_days': 3},
+    }})
+    matrix, stream, direct = engines(schedule)
+    assert matrix, "لا توجد مواعيد"
+    assert matrix == stream
+    assert sorted(matrix) == direct
+
+
+def test_cron_with_interval_rejected():
+    """cron مع interval_days في نفس القاعدة يُرفض بدل أن تختلف المحركات"""
+    schedule, output = compile_quietly({'rules': {
+        'mixed': {'cron': '0 8 * * MON', 'start_date': '2026-01-01', 'interval_days': 2},
+    }})
+    assert 'mixed' not in schedule.config_rules
+    assert 'cron لا يُجمع مع interval_days' in output
+    matrix, stream, direct = engines(schedule)
+    assert matrix == stream == direct == []
+
+
+def test_non_positive_interval_rejected():
+    """interval_days صفر أو سالب يُرفض عند التجميع بدل القسمة على صفر"""
+    for interval in (0, -3):
+        schedule, output = compile_quietly({
+            'chicken_schedule': {
+                'sanitization': {'start_date': '2026-01-01', 'interval_days': interval},
+                'pipe_waterer': {'start_date': '2026-01-01', 'intervals': {'rinse': interval}},
+            },
+            'trees_fertilizer_schedule': {'fig': {'start_date': '2026-01-01', 'interval_days': interval}},
+            'rules': {'inspection': {'start_date': '2026-01-01', 'interval_days': interval}},
+        })
+        assert not schedule.intervals and not schedule.trees and not schedule.config_rules
+        assert schedule.pipe_waterer is None
+        assert output.count('غير صالح') == 4, output
+        assert engines(schedule) == ([], [], [])
+
+
+def main():
+    """الدالة الرئيسية"""
+    print("=== اختبار الجدول المُجمَّع ===\n")
+    for test in (test_engines_agree_on_cron_and_interval_rules,
+                 test_cron_with_interval_rejected,
+                 test_non_positive_interval_rejected):
+        try:
+            test()
+            print(f"✅ {test.__doc__}")
+        except AssertionError as e:
+            print(f"❌ {test.__doc__}: {e}")
+
+
+if __name__ == "__main__":
+    main()